@@ -0,0 +1,156 @@
+"""
+Arquivo colunar de velas (Arrow IPC) para backtests e pesquisa.
+
+Layout: ``{raiz}/{SYMBOL}/{timeframe}/{YYYY-MM}.arrow``, um arquivo por mês,
+sem compressão, para que a leitura seja um memory-map: só as colunas e o
+intervalo pedidos viram arrays NumPy, sem objetos Python por linha.
+(Parquet exigiria decodificar as páginas; o formato IPC é lido direto.)
+
+Uso:
+    python archive.py export SOLUSDT 1m          # banco SQLite -> arquivo
+    python archive.py import SOLUSDT 1m          # arquivo -> banco SQLite
+    python archive.py load SOLUSDT 1m            # mede o tempo de leitura
+"""
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from database import init_db, load_candles, save_candles
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+COLUMNS = ('open_time', 'open', 'high', 'low', 'close', 'volume')
+DEFAULT_ROOT = 'archive'
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Pacote 'pyarrow' não instalado (pip install pyarrow)")
+
+
+def _month_path(root, symbol, timeframe, month):
+    return os.path.join(root, symbol, timeframe, f"{month}.arrow")
+
+
+def _month_of(ms):
+    return str(np.datetime64(int(ms), 'ms').astype('datetime64[M]'))
+
+
+def _read_table(path, columns=None):
+    """Lê um arquivo mensal via memory-map (zero cópia)"""
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    return table.select(list(columns)) if columns else table
+
+
+def write_month(root, symbol, timeframe, arrays):
+    """Grava/mescla as velas de UM mês (dict coluna -> array), sem duplicar open_time"""
+    _require_pyarrow()
+    path = _month_path(root, symbol, timeframe, _month_of(arrays['open_time'][0]))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    new = pd.DataFrame({c: arrays[c] for c in COLUMNS})
+    if os.path.exists(path):
+        old = _read_table(path).to_pandas()
+        new = pd.concat([old, new]).drop_duplicates('open_time', keep='last')
+    new = new.sort_values('open_time')
+    table = pa.table({c: pa.array(new[c].to_numpy(), type=pa.int64() if c == 'open_time' else pa.float64())
+                      for c in COLUMNS})
+    tmp = f"{path}.tmp"
+    with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=len(new) or None)  # um chunk -> leitura contígua
+    os.replace(tmp, path)
+    return len(new)
+
+
+def export_candles(conn, root, symbol, timeframe, start_ms=None, end_ms=None):
+    """Copia as velas do banco para o arquivo, particionadas por mês"""
+    df = load_candles(conn, symbol, timeframe, start_ms, end_ms)
+    if df.empty:
+        return 0
+    open_time = df['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64')
+    months = open_time.astype('datetime64[ms]').astype('datetime64[M]')
+    bounds = np.flatnonzero(months[1:] != months[:-1]) + 1
+    total = 0
+    for idx in np.split(np.arange(len(df)), bounds):
+        arrays = {'open_time': open_time[idx]}
+        arrays.update({c: df[c].to_numpy()[idx] for c in COLUMNS[1:]})
+        write_month(root, symbol, timeframe, arrays)
+        total += len(idx)
+    return total
+
+
+def load_arrays(root, symbol, timeframe, start_ms=None, end_ms=None, columns=('open_time', 'close', 'volume')):
+    """Arrays NumPy das colunas pedidas em [start_ms, end_ms), lendo só os meses necessários"""
+    _require_pyarrow()
+    columns = list(dict.fromkeys(['open_time', *columns]))
+    first = _month_of(start_ms) if start_ms is not None else None
+    last = _month_of(end_ms - 1) if end_ms is not None else None
+    parts = {c: [] for c in columns}
+    for path in sorted(glob.glob(os.path.join(root, symbol, timeframe, '*.arrow'))):
+        month = os.path.basename(path)[:-len('.arrow')]
+        if (first and month < first) or (last and month > last):
+            continue
+        table = _read_table(path, columns).combine_chunks()
+        open_time = table.column('open_time').to_numpy()
+        lo = np.searchsorted(open_time, start_ms) if start_ms is not None else 0
+        hi = np.searchsorted(open_time, end_ms) if end_ms is not None else len(open_time)
+        for c in columns:
+            parts[c].append(table.column(c).to_numpy()[lo:hi])
+    out = {}
+    for c, chunks in parts.items():
+        if not chunks:
+            out[c] = np.empty(0, dtype='int64' if c == 'open_time' else 'float64')
+        else:
+            out[c] = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+    return out
+
+
+def load_frame(root, symbol, timeframe, start_ms=None, end_ms=None, columns=COLUMNS[1:]):
+    """DataFrame no formato de klines_to_frame (timestamp + colunas pedidas)"""
+    arrays = load_arrays(root, symbol, timeframe, start_ms, end_ms, columns)
+    df = pd.DataFrame({c: arrays[c] for c in columns}, copy=False)
+    df.insert(0, 'timestamp', arrays['open_time'].astype('datetime64[ms]').astype('datetime64[ns]'))
+    return df
+
+
+def import_candles(conn, root, symbol, timeframe, start_ms=None, end_ms=None):
+    """Carrega velas do arquivo para o banco SQLite"""
+    return save_candles(conn, symbol, timeframe, load_frame(root, symbol, timeframe, start_ms, end_ms))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arquivo colunar de velas (Arrow IPC)")
+    parser.add_argument('command', choices=['export', 'import', 'load'])
+    parser.add_argument('symbol')
+    parser.add_argument('timeframe')
+    parser.add_argument('--db', default='trading_data.db')
+    parser.add_argument('--root', default=DEFAULT_ROOT)
+    args = parser.parse_args()
+
+    if args.command == 'load':
+        t0 = time.perf_counter()
+        arrays = load_arrays(args.root, args.symbol, args.timeframe, columns=COLUMNS)
+        print(f"⏱ {len(arrays['open_time'])} velas em {time.perf_counter() - t0:.3f}s")
+        return
+
+    conn = init_db(args.db)
+    try:
+        if args.command == 'export':
+            n = export_candles(conn, args.root, args.symbol, args.timeframe)
+            print(f"📦 {n} velas exportadas para '{args.root}'")
+        else:
+            n = import_candles(conn, args.root, args.symbol, args.timeframe)
+            print(f"📥 {n} velas importadas para '{args.db}'")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Backtest vetorizado das regras de strategy.py.
+
+Só as velas base (1m) são carregadas. Como no monitor/ingestor, a cada
+fechamento de 1m os timeframes maiores são a vela EM FORMAÇÃO (agregada do
+1m até aquele minuto, sem look-ahead): os indicadores dela saem do estado das
+velas já fechadas mais o close atual, tudo vetorizado. Os filtros de entrada
+viram máscaras booleanas (scan_entries) e a máquina de estados
+IDLE/LONG/SHORT salta de evento em evento.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from database import init_db, interval_ms, load_candles
+from kernels import ema
+from resampler import bucket_start
+from strategy import scan_entries
+
+def load_history(conn, symbol, interval, start, end):
+    """Velas de [start, end) a partir do banco local, baixando só o que faltar"""
+    from monitor import ensure_history
+    start_ms = int(start.timestamp() * 1000)
+    end_ms = int(end.timestamp() * 1000)
+    ensure_history(conn, symbol, interval, start_ms, end_ms)
+    return load_candles(conn, symbol, interval, start_ms, end_ms)
+
+
+def load_base(symbol, start, end, db='trading_data.db', archive_root=None, config=Config):
+    """Velas base (Config.BASE_TIMEFRAME) do arquivo colunar (se indicado) ou do banco"""
+    if archive_root:
+        from archive import load_frame
+        return load_frame(archive_root, symbol, config.BASE_TIMEFRAME,
+                          int(start.timestamp() * 1000), int(end.timestamp() * 1000))
+    conn = init_db(db)
+    try:
+        return load_history(conn, symbol, config.BASE_TIMEFRAME, start, end)
+    finally:
+        conn.close()
+
+
+# --- vela em formação de um timeframe maior, a cada vela base ---
+def forming_bars(df_base, interval):
+    """(close atual, k, closes das velas de ``interval``) na grade da vela base
+
+    ``k[i]`` é o índice da vela de ``interval`` em formação no fechamento da
+    vela base ``i`` (= quantas velas desse timeframe já fecharam antes dela).
+    Só ``bar_close[:k[i]]`` (velas fechadas) é usado junto com o close atual.
+    """
+    x = df_base['close'].to_numpy(dtype=float)
+    open_time = df_base['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64')
+    bucket = bucket_start(open_time, interval_ms(interval))
+    new = np.r_[True, bucket[1:] != bucket[:-1]] if len(x) else np.zeros(0, dtype=bool)
+    k = np.cumsum(new) - 1
+    ends = np.r_[np.flatnonzero(new)[1:], len(x)] - 1
+    return x, k, x[ends]
+
+
+def _prev(values, k):
+    """Valor da última vela fechada (k - 1) para cada vela base; NaN sem nenhuma"""
+    out = np.full(len(k), np.nan)
+    has = k > 0
+    out[has] = values[k[has] - 1]
+    return out
+
+
+def forming_ema(x, k, bar_close, span):
+    alpha = 2.0 / (span + 1.0)
+    return np.where(k > 0, (1 - alpha) * _prev(ema(bar_close, span), k) + alpha * x, x)
+
+
+def forming_macd_hist(x, k, bar_close, fast, slow, signal):
+    macd = forming_ema(x, k, bar_close, fast) - forming_ema(x, k, bar_close, slow)
+    closed = ema(bar_close, fast) - ema(bar_close, slow)
+    alpha = 2.0 / (signal + 1.0)
+    return macd - np.where(k > 0, (1 - alpha) * _prev(ema(closed, signal), k) + alpha * macd, macd)
+
+
+def forming_bbp(x, k, bar_close, length, std):
+    """%B com a janela = ``length - 1`` velas fechadas + o close atual (desvio amostral)"""
+    n = length - 1
+    if n < 1 or len(bar_close) < n:
+        return np.full(len(x), np.nan)
+    windows = np.lib.stride_tricks.sliding_window_view(bar_close, n)
+    mean = windows.mean(axis=1)
+    m2 = ((windows - mean[:, None]) ** 2).sum(axis=1)
+    idx = k - n  # janela de fechadas terminando em k - 1
+    has = idx >= 0
+    safe = np.maximum(idx, 0)
+    prev_mean = np.where(has, mean[safe], np.nan)
+    m = (n * prev_mean + x) / length
+    sd = np.sqrt((m2[safe] + n * (prev_mean - m) ** 2 + (x - m) ** 2) / n)
+    upper, lower = m + std * sd, m - std * sd
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (x - lower) / (upper - lower)
+
+
+def forming_rsi(x, k, bar_close, length):
+    """RSI de médias simples: ``length - 1`` variações fechadas + a do close atual"""
+    delta = np.diff(bar_close, prepend=bar_close[:1])  # primeira variação = 0, como no pandas
+    gains = np.r_[0.0, np.cumsum(np.maximum(delta, 0.0))]
+    losses = np.r_[0.0, np.cumsum(np.maximum(-delta, 0.0))]
+    first = k - length + 1
+    has = first >= 0
+    safe = np.maximum(first, 0)
+    now = np.where(k > 0, x - _prev(bar_close, k), 0.0)
+    gain = gains[k] - gains[safe] + np.maximum(now, 0.0)
+    loss = losses[k] - losses[safe] + np.maximum(-now, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100 - 100 / (1 + gain / loss)
+    return np.where(has, rsi, np.nan)
+
+
+def timeframe_columns(df_base, interval, config):
+    """Indicadores da vela de ``interval`` em formação a cada vela base (+ ``bars`` fechadas)"""
+    x, k, bar_close = forming_bars(df_base, interval)
+    return {
+        'close': x,
+        'EMA_6': forming_ema(x, k, bar_close, 6),
+        'EMA_99': forming_ema(x, k, bar_close, 99),
+        'MACD_hist': forming_macd_hist(x, k, bar_close, config.MACD_FAST, config.MACD_SLOW, config.MACD_SIGNAL),
+        'RSI': forming_rsi(x, k, bar_close, config.RSI_LENGTH),
+        'BBP': forming_bbp(x, k, bar_close, config.BB_LENGTH, float(config.BB_STD)),
+        'bars': k,
+    }
+
+
+def align(df_fast, config=Config, warmup=100, columns=None):
+    """Os 3 timeframes na grade da vela base, como o ao vivo os vê a cada fechamento.
+
+    Médio/lento são a vela em formação até o fechamento de cada vela base
+    (nada do futuro). ``columns`` permite passar indicadores já calculados
+    ({'fast'|'medium'|'slow': timeframe_columns(...)}). Retorna (fast,
+    medium, slow, valid) como dicts de arrays no formato de ``scan_entries``.
+    """
+    if columns is None:
+        columns = {name: timeframe_columns(df_fast, interval, config)
+                   for name, interval in config.TIMEFRAMES.items()}
+
+    fast = dict(columns['fast'])
+    vol = df_fast['volume'].to_numpy(dtype=float)
+    windows = np.full((len(vol), 3), np.nan)
+    if len(vol) >= 3:
+        windows[2:] = np.lib.stride_tricks.sliding_window_view(vol, 3)
+    fast['volume'] = windows
+
+    # Descarta o aquecimento: ``warmup`` velas fechadas em todos os timeframes
+    valid = np.ones(len(df_fast), dtype=bool)
+    for name in ('fast', 'medium', 'slow'):
+        valid &= columns[name]['bars'] >= warmup
+    return fast, columns['medium'], columns['slow'], valid
+
+
+def simulate(price, long_entry, short_entry, long_exit, short_exit, fee=0.001):
+    """Máquina de estados IDLE/LONG/SHORT, saltando direto para o próximo evento.
+
+    Igual ao monitor: em IDLE tenta LONG e depois SHORT; posicionado, só
+    avalia a saída. Uma transição por vela. ``fee`` é cobrada por lado.
+    """
+    entries = np.flatnonzero(long_entry | short_entry)
+    exits = {'LONG': np.flatnonzero(long_exit), 'SHORT': np.flatnonzero(short_exit)}
+    trades = []
+    i = 0
+    while True:
+        k = np.searchsorted(entries, i)
+        if k == len(entries):
+            break
+        entry = entries[k]
+        side = 'LONG' if long_entry[entry] else 'SHORT'
+        k = np.searchsorted(exits[side], entry + 1)
+        is_open = k == len(exits[side])
+        exit_ = len(price) - 1 if is_open else exits[side][k]
+        change = price[exit_] / price[entry] - 1
+        ret = (change if side == 'LONG' else -change) - 2 * fee
+        trades.append((side, entry, exit_, price[entry], price[exit_], ret, is_open))
+        if is_open:
+            break
+        i = exit_ + 1
+    return pd.DataFrame(trades, columns=['side', 'entry_idx', 'exit_idx', 'entry_price',
+                                         'exit_price', 'return', 'open'])
+
+
+def summarize(trades):
+    """Métricas agregadas de uma lista de trades"""
+    if trades.empty:
+        return {'trades': 0, 'win_rate': 0.0, 'total_return': 0.0, 'max_drawdown': 0.0}
+    equity = (1 + trades['return']).cumprod()
+    drawdown = 1 - equity / np.maximum.accumulate(np.concatenate([[1.0], equity.to_numpy()]))[1:]
+    return {
+        'trades': len(trades),
+        'win_rate': float((trades['return'] > 0).mean()),
+        'total_return': float(equity.iloc[-1] - 1),
+        'max_drawdown': float(drawdown.max()),
+    }
+
+
+def run_backtest(df_fast, config=Config, fee=0.001, warmup=100):
+    """Backtest completo sobre as velas base; retorna (trades, métricas)"""
+    fast, medium, slow, valid = align(df_fast, config, warmup)
+    return evaluate_aligned(df_fast, fast, medium, slow, valid, config, fee)
+
+
+def evaluate_aligned(df_fast, fast, medium, slow, valid, config=Config, fee=0.001):
+    """Filtros + simulação sobre timeframes já alinhados; retorna (trades, métricas)"""
+    res = scan_entries(fast, medium, slow, config, with_reasons=False)
+    rsi = medium['RSI']
+    trades = simulate(fast['close'], res['long_ok'] & valid, res['short_ok'] & valid,
+                      valid & (rsi > 70), valid & (rsi < 30), fee)
+    if not trades.empty:
+        ts = df_fast['timestamp'].to_numpy()
+        trades['entry_time'] = ts[trades['entry_idx']]
+        trades['exit_time'] = ts[trades['exit_idx']]
+    return trades, summarize(trades)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest das regras de strategy.py")
+    parser.add_argument('symbol', nargs='?', default=Config.SYMBOL)
+    parser.add_argument('start', nargs='?', default=None, help="YYYY-MM-DD (padrão: 90 dias atrás)")
+    parser.add_argument('end', nargs='?', default=None, help="YYYY-MM-DD (padrão: agora)")
+    parser.add_argument('--fee', type=float, default=0.001)
+    parser.add_argument('--db', default='trading_data.db')
+    parser.add_argument('--archive', default=None, help="Raiz do arquivo colunar (archive.py) em vez do banco")
+    args = parser.parse_args()
+
+    end = pd.Timestamp(args.end) if args.end else pd.Timestamp.now(tz='UTC').tz_localize(None)
+    start = pd.Timestamp(args.start) if args.start else end - pd.Timedelta(days=90)
+    print(f"🔄 Carregando {args.symbol} {start:%Y-%m-%d} → {end:%Y-%m-%d}...")
+    candles = load_base(args.symbol, start, end, args.db, args.archive)
+
+    t0 = time.perf_counter()
+    trades, stats = run_backtest(candles, Config, fee=args.fee)
+    elapsed = time.perf_counter() - t0
+
+    if not trades.empty:
+        print(trades[['side', 'entry_time', 'exit_time', 'entry_price', 'exit_price', 'return']].to_string(index=False))
+    print(f"\n📊 Trades: {stats['trades']} | Win rate: {stats['win_rate']:.1%} | "
+          f"Retorno: {stats['total_return']:.2%} | Max DD: {stats['max_drawdown']:.2%}")
+    print(f"⏱ {len(candles)} velas em {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
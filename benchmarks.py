@@ -0,0 +1,367 @@
+"""
+Benchmarks reprodutíveis dos caminhos quentes (100% offline).
+
+Velas sintéticas determinísticas (passeio aleatório OHLCV com semente fixa)
+alimentam cada componente: indicadores, filtros da estratégia, gravação no
+banco, decodificação de klines e backtest. Para cada um são medidos o tempo
+(mediana e melhor de N execuções) e o pico de memória (tracemalloc).
+
+Uso:
+    python benchmarks.py                          # roda tudo e mostra a tabela
+    python benchmarks.py --save                   # grava como baseline
+    python benchmarks.py --compare                # compara com a baseline (sai com 1 se piorar)
+    python benchmarks.py -k indicators --size 50000 --symbols 500
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+
+DEFAULT_BASELINE = 'bench_baseline.json'
+
+
+# --- dados sintéticos ---
+def random_walk(n, seed=0, start='2024-01-01', interval='1min', price=100.0, vol=0.001):
+    """DataFrame OHLCV determinístico (timestamp, open, high, low, close, volume)"""
+    rng = np.random.default_rng(seed)
+    close = price * np.cumprod(1 + rng.normal(0, vol, n))
+    open_ = np.concatenate([[price], close[:-1]])
+    spread = np.abs(rng.normal(0, vol, n)) * close
+    return pd.DataFrame({
+        'timestamp': pd.date_range(start, periods=n, freq=interval),
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume': rng.uniform(10, 1000, n),
+    })
+
+
+def random_walk_matrix(n, symbols, seed=0, vol=0.001):
+    """Velas de vários símbolos empilhadas: array (velas x símbolos x [o, h, l, c, v])"""
+    rng = np.random.default_rng(seed)
+    close = rng.uniform(1, 1000, symbols) * np.cumprod(1 + rng.normal(0, vol, (n, symbols)), axis=0)
+    open_ = np.vstack([close[:1], close[:-1]])
+    spread = np.abs(rng.normal(0, vol, (n, symbols))) * close
+    return np.stack([open_, np.maximum(open_, close) + spread, np.minimum(open_, close) - spread,
+                     close, rng.uniform(10, 1000, (n, symbols))], axis=-1)
+
+
+def kline_payload(df):
+    """Corpo de /api/v3/klines (bytes) equivalente ao DataFrame"""
+    open_time = df['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64').tolist()
+    rows = [[t, f"{o:.8f}", f"{h:.8f}", f"{l:.8f}", f"{c:.8f}", f"{v:.8f}", t + 59_999,
+             "0.0", 0, "0.0", "0.0", "0"]
+            for t, o, h, l, c, v in zip(open_time, *(df[c].tolist() for c in
+                                                      ('open', 'high', 'low', 'close', 'volume')))]
+    return json.dumps(rows, separators=(',', ':')).encode()
+
+
+# --- componentes ---
+BENCHMARKS = {}
+
+
+def bench(name):
+    """Registra um benchmark: ``setup(args)`` devolve (função medida, nº de operações)"""
+    def wrap(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return wrap
+
+
+@bench('indicators.enrich_dataframe')
+def _enrich_dataframe(args):
+    from indicators import enrich_dataframe
+    df = random_walk(args.size)
+    return lambda: enrich_dataframe(df.copy(), Config), 1
+
+
+@bench('indicators.engine_update')
+def _engine_update(args):
+    from indicators import IndicatorEngine
+    df = random_walk(args.size)
+    seed, rest = df.iloc[:100], list(df.iloc[100:].itertuples(index=False))
+
+    def run():
+        engine = IndicatorEngine(Config).seed(seed)
+        for row in rest:
+            engine.update(*row)
+    return run, len(rest)
+
+
+@bench('indicators.enrich_matrix')
+def _enrich_matrix(args):
+    from indicators import enrich_matrix
+    close = random_walk_matrix(150, args.symbols)[:, :, 3]
+    return lambda: enrich_matrix(close, Config), args.symbols
+
+
+@bench('indicators.enrich_matrix_pandas')
+def _enrich_matrix_pandas(args):
+    from indicators import enrich_matrix
+    close = random_walk_matrix(150, args.symbols)[:, :, 3]
+    return lambda: enrich_matrix(close, Config, backend='pandas'), args.symbols
+
+
+def _enriched_frames(args):
+    from indicators import enrich_dataframe
+    fast = random_walk(150, seed=1)
+    return (enrich_dataframe(fast, Config),
+            enrich_dataframe(random_walk(150, seed=2, interval='5min'), Config),
+            enrich_dataframe(random_walk(150, seed=3, interval='1h'), Config))
+
+
+@bench('strategy.check_entries')
+def _check_entries(args):
+    from strategy import check_long_entry, check_short_entry
+    frames = _enriched_frames(args)
+    loops = 200
+
+    def run():
+        for _ in range(loops):
+            check_long_entry(*frames, Config)
+            check_short_entry(*frames, Config)
+    return run, loops
+
+
+@bench('strategy.runtime')
+def _strategy_runtime(args):
+    from resampler import TimeframeSet
+    from strategy import StrategyRuntime
+    df = random_walk(args.size)
+    # Metade da série aquece os motores, até 500 velas seguintes são medidas
+    split = len(df) // 2
+    timeframes = TimeframeSet('BENCH', Config).seed(df.iloc[:split])
+    # Entradas de velas consecutivas: só parte das regras muda de uma para a outra
+    # avaliadas no fechamento de cada vela de 1m, como no ingestor
+    inputs = []
+    for row in df.iloc[split:split + 500].itertuples(index=False):
+        open_time = int(row.timestamp.value // 1_000_000)
+        timeframes.update(open_time, *row[1:])
+        inputs.append((timeframes.rows(), open_time + 60_000))
+
+    def run():
+        runtime = StrategyRuntime(Config)
+        for rows, now_ms in inputs:
+            runtime.check('LONG', rows, now_ms=now_ms)
+            runtime.check('SHORT', rows, now_ms=now_ms)
+    return run, len(inputs)
+
+
+@bench('strategy.scan_entries')
+def _scan_entries(args):
+    from indicators import enrich_matrix
+    from strategy import scan_entries
+    snaps = []
+    for seed in (1, 2, 3):
+        ohlcv = random_walk_matrix(150, args.symbols, seed=seed)
+        snap = {k: v[-1] for k, v in enrich_matrix(ohlcv[:, :, 3], Config).items()}
+        snap['volume'] = ohlcv[-3:, :, 4].T
+        snaps.append(snap)
+    return lambda: scan_entries(*snaps, Config), args.symbols
+
+
+def _temp_db(args):
+    from database import init_db
+    path = os.path.join(args.tmpdir, f"bench_{len(os.listdir(args.tmpdir))}.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        return init_db(path), path
+
+
+@bench('database.save_data')
+def _save_data(args):
+    from database import save_data
+    conn, _ = _temp_db(args)
+    loops = 200
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(loops):
+                save_data(conn, 100.0 + i, 50.0)
+    return run, loops
+
+
+@bench('database.save_candles')
+def _save_candles(args):
+    from database import save_candles
+    conn, _ = _temp_db(args)
+    df = random_walk(args.size)
+    return lambda: save_candles(conn, 'BENCH', '1m', df), args.size
+
+
+@bench('database.batch_writer')
+def _batch_writer(args):
+    from database import BatchWriter
+    _, path = _temp_db(args)
+    df = random_walk(args.size)
+    open_time = df['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64')
+    rows = list(zip(open_time.tolist(), *(df[c].tolist() for c in ('open', 'high', 'low', 'close', 'volume'))))
+
+    def run():
+        writer = BatchWriter(path)
+        for row in rows:
+            writer.save_candle('BENCH', '1m', *row)
+        writer.close()
+    return run, len(rows)
+
+
+@bench('resampler.update')
+def _resampler_update(args):
+    from resampler import Resampler
+    df = random_walk(args.size)
+    open_time = df['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64').tolist()
+    rows = list(zip(open_time, *(df[c].tolist() for c in ('open', 'high', 'low', 'close', 'volume'))))
+
+    def run():
+        resampler = Resampler(Config.TIMEFRAMES.values(), Config.BASE_TIMEFRAME)
+        for row in rows:
+            resampler.update(*row)
+    return run, len(rows)
+
+
+@bench('parse.decode_klines')
+def _decode_klines(args):
+    from klines import decode_klines
+    raw = kline_payload(random_walk(args.size))
+    return lambda: decode_klines(raw), args.size
+
+
+@bench('parse.klines_to_frame')
+def _klines_to_frame(args):
+    from monitor import klines_to_frame
+    raw = kline_payload(random_walk(args.size))
+    return lambda: klines_to_frame(raw), args.size
+
+
+@bench('backtest.run_backtest')
+def _run_backtest(args):
+    from backtest import run_backtest
+    fast = random_walk(args.size * 10)
+    return lambda: run_backtest(fast, Config), len(fast)
+
+
+# --- medição ---
+def measure(fn, repeat):
+    """Tempos (s) de ``repeat`` execuções após um aquecimento + pico de memória (bytes)"""
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return times, peak
+
+
+def run(args):
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if args.k and not any(k in name for k in args.k):
+            continue
+        fn, ops = setup(args)
+        times, peak = measure(fn, args.repeat)
+        results[name] = {
+            'median': statistics.median(times),
+            'best': min(times),
+            'ops': ops,
+            'peak_bytes': peak,
+        }
+        print(f"  ✓ {name}", file=sys.stderr)
+    return results
+
+
+def environment(args):
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': f"{platform.system()} {platform.machine()}",
+        'size': args.size,
+        'symbols': args.symbols,
+        'repeat': args.repeat,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Lista de (nome, variação relativa) dos componentes que ficaram mais lentos que o limite"""
+    slower = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if base:
+            change = res['median'] / base['median'] - 1
+            res['change'] = change
+            if change > threshold:
+                slower.append((name, change))
+    return slower
+
+
+def report(results):
+    print(f"\n{'componente':<30} {'mediana':>10} {'melhor':>10} {'por op':>10} {'pico mem':>10} {'Δ base':>8}")
+    for name, r in results.items():
+        change = f"{r['change']:+.0%}" if 'change' in r else ''
+        if not r['ops']:
+            print(f"{name:<30} {'sem operações (aumente --size)':>52}")
+            continue
+        print(f"{name:<30} {r['median'] * 1e3:8.2f}ms {r['best'] * 1e3:8.2f}ms "
+              f"{r['median'] / r['ops'] * 1e6:8.2f}µs {r['peak_bytes'] / 2**20:8.2f}MB {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks offline dos componentes do monitor")
+    parser.add_argument('-k', action='append', help="Só benchmarks cujo nome contenha o texto (repetível)")
+    parser.add_argument('--size', type=int, default=10_000, help="Velas por série sintética")
+    parser.add_argument('--symbols', type=int, default=300, help="Símbolos nos benchmarks vetorizados")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save', action='store_true', help="Grava o resultado como baseline")
+    parser.add_argument('--compare', action='store_true', help="Compara com a baseline gravada")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Lentidão tolerada (0.25 = +25%%)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as args.tmpdir:
+        results = run(args)
+
+    slower = []
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            parser.error(f"baseline '{args.baseline}' não encontrada (rode com --save antes)")
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        if saved['environment']['size'] != args.size or saved['environment']['symbols'] != args.symbols:
+            print("⚠️ Baseline gravada com outro --size/--symbols; a comparação não é direta")
+        slower = compare(results, saved['results'], args.threshold)
+    report(results)
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            saved = {name: {k: v for k, v in r.items() if k != 'change'} for name, r in results.items()}
+            json.dump({'environment': environment(args), 'results': saved}, f, indent=2)
+        print(f"\n💾 Baseline gravada em '{args.baseline}'")
+    if slower:
+        print(f"\n🐢 Mais lentos que a baseline (> +{args.threshold:.0%}):")
+        for name, change in slower:
+            print(f"  {name}: {change:+.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
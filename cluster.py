@@ -0,0 +1,511 @@
+"""
+Monitor distribuído: vários processos de trabalho, cada um dono de uma fatia dos símbolos.
+
+Coordenador (processo principal):
+  - faz o backfill via REST e assina os streams de kline base de todos os
+    símbolos (conexões combinadas), gravando as velas (BatchWriter);
+  - reparte os símbolos entre os workers por hash consistente e encaminha
+    as velas de cada símbolo, em lotes, para a fila do worker dono;
+  - recebe as decisões dos workers: grava no livro de sinais e envia os
+    alertas (um só lugar fala com o banco e com o Telegram);
+  - acompanha os heartbeats; worker morto ou calado tem seus símbolos
+    redistribuídos e é reiniciado (os símbolos dele voltam quando sobe).
+
+Worker: um TimeframeSet por símbolo atribuído (o estado de um símbolo vive
+num só processo) e a estratégia a cada fechamento do timeframe rápido.
+
+Quando um símbolo muda de dono com o antigo vivo, o antigo termina o que
+já recebeu e confirma a liberação; só então o novo carrega o histórico do
+banco e passa a receber as velas (as que chegaram no meio ficam retidas).
+
+Uso:
+    SYMBOLS=BTCUSDT,ETHUSDT,SOLUSDT python cluster.py --workers 4
+"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import logging
+import math
+import multiprocessing as mp
+import os
+import queue
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from config import Config
+from database import (BatchWriter, init_db, interval_ms, last_open_time, latest_signals,
+                      load_candles, signal_row)
+from klines import loads
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 0.05   # segundos entre envios de lotes de velas aos workers
+STARTUP_GRACE = 30.0    # segundos para um worker novo dar o primeiro sinal de vida
+RESTART_DELAY = 1.0     # espera antes de reiniciar um worker morto
+
+
+class HashRing:
+    """Hash consistente: tirar ou pôr um nó só move os símbolos dele"""
+
+    def __init__(self, nodes=(), replicas=64):
+        self.replicas = replicas
+        self._keys = []
+        self._nodes = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+    @property
+    def nodes(self):
+        return set(self._nodes)
+
+    def add(self, node):
+        if node in self._nodes:
+            return
+        for i in range(self.replicas):
+            h = self._hash(f"{node}#{i}")
+            idx = bisect.bisect(self._keys, h)
+            self._keys.insert(idx, h)
+            self._nodes.insert(idx, node)
+
+    def remove(self, node):
+        kept = [(k, n) for k, n in zip(self._keys, self._nodes) if n != node]
+        self._keys = [k for k, _ in kept]
+        self._nodes = [n for _, n in kept]
+
+    def node(self, key):
+        """Nó dono de ``key`` (None se o anel estiver vazio)"""
+        if not self._keys:
+            return None
+        return self._nodes[bisect.bisect(self._keys, self._hash(key)) % len(self._keys)]
+
+
+# --- worker ---
+class _Symbol:
+    """Estado de um símbolo dentro do worker"""
+
+    def __init__(self, timeframes, last):
+        self.timeframes = timeframes
+        self.last = last  # última linha do livro de sinais (preço de entrada, posição)
+        self.pos = last['state'] if last else 'IDLE'
+
+
+class Worker:
+    def __init__(self, worker_id, outbox, db_path, config=Config, bars=150):
+        self.worker_id = worker_id
+        self.outbox = outbox
+        self.db_path = db_path
+        self.config = config
+        self.bars = bars
+        self.conn = None
+        self.symbols = {}
+        self.stats = {'klines': 0, 'evaluations': 0, 'busy': 0.0}
+
+    def assign(self, symbol, last, until=None):
+        """Assume o símbolo: histórico do banco (velas com open_time < ``until``)"""
+        from indicators import IndicatorEngine, register_engine
+        from resampler import TimeframeSet, history_start
+
+        timeframes = TimeframeSet(symbol, self.config)
+        for interval in timeframes.intervals:
+            register_engine(symbol, interval, IndicatorEngine(self.config, timeframes.maxlen))
+        if self.conn is None:
+            self.conn = init_db(self.db_path)
+        start = history_start(int(time.time() * 1000), timeframes.intervals, self.bars)
+        timeframes.seed(load_candles(self.conn, symbol, timeframes.base, start_ms=start, end_ms=until))
+        self.symbols[symbol] = _Symbol(timeframes, last)
+
+    def release(self, symbol):
+        from indicators import drop_engines
+        from monitor import runtime
+        state = self.symbols.pop(symbol, None)
+        drop_engines(symbol)
+        runtime.forget(symbol)
+        self.outbox.put(('released', self.worker_id, symbol, state.last if state else None))
+
+    def klines(self, batch):
+        fast = self.config.TIMEFRAMES['fast']
+        for symbol, open_time, o, h, l, c, v, closed in batch:
+            state = self.symbols.get(symbol)
+            if state is None:
+                continue
+            timeframes = state.timeframes
+            last = timeframes.last_open_time
+            if last is not None and open_time < last:
+                continue  # já veio do banco
+            timeframes.update(open_time, o, h, l, c, v)
+            self.stats['klines'] += 1
+            if closed and fast in timeframes.closing(open_time):
+                self.evaluate(symbol, state)
+
+    def evaluate(self, symbol, state):
+        from monitor import decide, indicator_snapshot, signal_time
+
+        rows = state.timeframes.rows()
+        new_pos, reason, alert = decide(rows, state.pos, symbol)
+        state.last = signal_row(symbol, signal_time(rows), state.pos, new_pos, rows['fast'][-1]['close'],
+                                reason, indicator_snapshot(rows), prev=state.last)
+        state.pos = new_pos
+        self.stats['evaluations'] += 1
+        self.outbox.put(('signal', self.worker_id, state.last, alert))
+
+    def heartbeat(self):
+        self.outbox.put(('heartbeat', self.worker_id, {'symbols': len(self.symbols), **self.stats}))
+
+    def run(self, inbox, interval):
+        self.heartbeat()
+        next_beat = time.monotonic() + interval
+        while True:
+            try:
+                item = inbox.get(timeout=max(next_beat - time.monotonic(), 0))
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                start = time.perf_counter()
+                kind, *args = item
+                if kind == 'klines':
+                    self.klines(*args)
+                elif kind == 'assign':
+                    self.assign(*args)
+                elif kind == 'release':
+                    self.release(*args)
+                self.stats['busy'] += time.perf_counter() - start
+            if time.monotonic() >= next_beat:
+                self.heartbeat()
+                next_beat = time.monotonic() + interval
+        if self.conn is not None:
+            self.conn.close()
+
+
+def worker_main(worker_id, inbox, outbox, db_path, heartbeat, setup=None):
+    """Ponto de entrada do processo de trabalho
+
+    ``setup`` (picklable, sem argumentos) roda antes do Worker; os testes o
+    usam para o processo seguir o mesmo relógio falso do coordenador.
+    """
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s [w{worker_id}] %(message)s')
+    if setup is not None:
+        setup()
+    try:
+        Worker(worker_id, outbox, db_path).run(inbox, heartbeat)
+    except KeyboardInterrupt:
+        pass
+
+
+# --- coordenador ---
+class Coordinator:
+    def __init__(self, symbols, workers=None, config=Config, db_path='trading_data.db', bars=150,
+                 heartbeat=None, worker_setup=None):
+        self.symbols = list(dict.fromkeys(symbols))
+        self.config = config
+        self.db_path = db_path
+        self.bars = bars
+        self.base = config.BASE_TIMEFRAME
+        self.heartbeat = heartbeat or config.CLUSTER_HEARTBEAT
+        self.worker_setup = worker_setup  # ver worker_main
+        self.worker_ids = list(range(workers or config.CLUSTER_WORKERS or os.cpu_count() or 1))
+        self.ctx = mp.get_context('spawn')  # processo limpo, sem herdar threads/sockets
+        self.outbox = self.ctx.Queue()
+        self.procs = {}
+        self.inboxes = {}
+        self.seen = {}        # worker -> último sinal de vida (monotonic)
+        self.ring = HashRing()
+        self.owner = {}       # símbolo -> worker
+        self.moving = {}      # símbolo -> (novo dono, velas retidas) aguardando liberação
+        self.pending = defaultdict(list)
+        self.last = {}        # símbolo -> última linha do livro de sinais
+        self.last_kline = {}  # símbolo -> open_time da última vela recebida
+        self.stats = {}
+        self.writer = None
+        self.running = False
+
+    # --- processos ---
+    def _spawn(self, wid):
+        inbox = self.ctx.Queue()
+        proc = self.ctx.Process(target=worker_main, name=f"worker-{wid}", daemon=True,
+                                args=(wid, inbox, self.outbox, self.db_path, self.heartbeat, self.worker_setup))
+        proc.start()
+        self.procs[wid], self.inboxes[wid] = proc, inbox
+        self.seen[wid] = time.monotonic() + STARTUP_GRACE
+        self.ring.add(wid)
+        logger.info(f"⚙️ Worker {wid} iniciado (pid {proc.pid})")
+
+    def _alive(self, wid):
+        return wid in self.procs and self.procs[wid].is_alive()
+
+    def check_health(self):
+        """Worker que morreu ou parou de mandar heartbeat sai do anel e é reiniciado"""
+        now = time.monotonic()
+        for wid in list(self.procs):
+            if self._alive(wid) and now - self.seen[wid] <= 3 * self.heartbeat:
+                continue
+            proc = self.procs.pop(wid)
+            self.inboxes.pop(wid)
+            self.pending.pop(wid, None)
+            if proc.is_alive():
+                proc.terminate()
+            self.ring.remove(wid)
+            for symbol in [s for s, w in self.owner.items() if w == wid]:
+                # O estado morreu com o processo; o próximo dono parte do banco
+                del self.owner[symbol]
+                self.moving.pop(symbol, None)
+            metrics.inc('cluster_worker_restarts')
+            logger.warning(f"💀 Worker {wid} sem resposta (exit {proc.exitcode}); redistribuindo")
+            self.rebalance()
+            if self.running:
+                asyncio.get_running_loop().call_later(RESTART_DELAY, self._restart, wid)
+
+    def _restart(self, wid):
+        if self.running and wid not in self.procs:
+            self._spawn(wid)
+            self.rebalance()
+
+    # --- distribuição ---
+    def rebalance(self):
+        """Leva cada símbolo ao dono indicado pelo anel"""
+        self.flush()
+        self.writer.flush()  # o novo dono carrega do banco tudo o que já foi encaminhado
+        for symbol in self.symbols:
+            target = self.ring.node(symbol)
+            if symbol in self.moving:
+                self.moving[symbol] = (target, self.moving[symbol][1])
+                continue
+            current = self.owner.get(symbol)
+            if target == current or target is None:
+                continue
+            if current is not None and self._alive(current):
+                # Dono antigo termina o que já recebeu antes de soltar o símbolo
+                self.moving[symbol] = (target, [])
+                self.inboxes[current].put(('release', symbol))
+            else:
+                self._assign(symbol, target)
+
+    def _assign(self, symbol, wid, held=()):
+        # Histórico do banco só até o que já foi encaminhado; o resto chega pela fila
+        last = self.last_kline.get(symbol)
+        until = held[0][1] if held else last + 1 if last is not None else None
+        self.owner[symbol] = wid
+        self.inboxes[wid].put(('assign', symbol, self.last.get(symbol), until))
+        if held:
+            self.inboxes[wid].put(('klines', list(held)))
+        metrics.inc('cluster_assignments')
+
+    def released(self, wid, symbol, last):
+        if last is not None:
+            self.last[symbol] = last
+        target, held = self.moving.pop(symbol, (None, []))
+        if target is None or not self._alive(target):
+            self.owner.pop(symbol, None)
+            self.rebalance()
+            return
+        self.writer.flush()
+        self._assign(symbol, target, held)
+
+    def route(self, symbol, open_time, o, h, l, c, v, closed):
+        """Encaminha uma vela base ao worker dono (e grava)"""
+        kline = (symbol, open_time, o, h, l, c, v, closed)
+        self.writer.save_candle(symbol, self.base, open_time, o, h, l, c, v)
+        self.last_kline[symbol] = open_time
+        if symbol in self.moving:
+            self.moving[symbol][1].append(kline)
+        elif symbol in self.owner:
+            self.pending[self.owner[symbol]].append(kline)
+
+    def flush(self):
+        """Envia os lotes acumulados (uma mensagem por worker)"""
+        for wid, batch in self.pending.items():
+            if batch and wid in self.inboxes:
+                self.inboxes[wid].put(('klines', batch))
+        self.pending = defaultdict(list)
+
+    # --- resultados ---
+    def drain(self):
+        """Processa o que os workers mandaram (sinais, heartbeats, liberações)"""
+        while True:
+            try:
+                kind, wid, *args = self.outbox.get_nowait()
+            except queue.Empty:
+                return
+            if kind == 'heartbeat':
+                self.seen[wid] = time.monotonic()
+                self.stats[wid] = args[0]
+                metrics.set_gauge('cluster_worker_symbols', args[0]['symbols'], worker=wid)
+            elif kind == 'signal':
+                self.on_signal(wid, *args)
+            elif kind == 'released':
+                self.released(wid, *args)
+
+    def on_signal(self, wid, row, alert):
+        symbol = row['symbol']
+        if self.owner.get(symbol) != wid:
+            return  # símbolo já redistribuído; o novo dono reavalia a partir do banco
+        self.last[symbol] = row
+        self.writer.save_signal(row)
+        metrics.inc('cluster_evaluations')
+        if alert:
+            from monitor import signal
+            side, msg = alert
+            signal(side, f"*{symbol}* {msg}")
+
+    # --- entrada de velas ---
+    def backfill(self):
+        """Garante o histórico de todos os símbolos no banco (REST, com limite de peso)"""
+        from monitor import ensure_history, kline_weight, sync_candles
+        from resampler import history_start
+        from scanner import WeightBudget
+
+        budget = WeightBudget(self.config.API_WEIGHT_LIMIT)
+        now_ms = int(time.time() * 1000)
+        start = history_start(now_ms, self.config.TIMEFRAMES.values(), self.bars)
+        step = interval_ms(self.base)
+
+        def one(symbol):
+            conn = init_db(self.db_path)
+            try:
+                last = last_open_time(conn, symbol, self.base)
+                pages = math.ceil((now_ms - max(last or start, start)) / step / 1000) + 1
+                budget.acquire(pages * kline_weight(1000))
+                ensure_history(conn, symbol, self.base, start, last if last and last >= start else now_ms)
+                sync_candles(conn, symbol, self.base)
+            except Exception as e:
+                logger.warning(f"⚠️ Backfill {symbol}: {e}")
+            finally:
+                conn.close()
+
+        with ThreadPoolExecutor(max_workers=self.config.SCAN_MAX_WORKERS) as pool:
+            list(pool.map(one, self.symbols))
+
+    def catch_up(self, symbols):
+        """Velas perdidas durante uma queda do stream, pela REST (roda numa thread)"""
+        from monitor import iter_klines
+
+        now_ms = int(time.time() * 1000)
+        out = []
+        for symbol in symbols:
+            start = self.last_kline.get(symbol)
+            if start is None:
+                continue
+            try:
+                for page in iter_klines(symbol, self.base, start, now_ms + interval_ms(self.base)):
+                    closed = page['open_time'] + interval_ms(self.base) <= now_ms
+                    out.extend((symbol, int(t), float(o), float(h), float(l), float(c), float(v), bool(x))
+                               for t, o, h, l, c, v, x in zip(page['open_time'], page['open'], page['high'],
+                                                              page['low'], page['close'], page['volume'], closed))
+            except Exception as e:
+                logger.warning(f"⚠️ Reposição {symbol}: {e}")
+        return out
+
+    def handle_message(self, raw):
+        msg = loads(raw)
+        k = msg.get('data', msg).get('k')
+        if not k or k.get('i') != self.base:
+            return
+        self.route(k['s'], int(k['t']), float(k['o']), float(k['h']), float(k['l']),
+                   float(k['c']), float(k['v']), bool(k.get('x')))
+
+    async def stream(self, symbols):
+        """Uma conexão combinada para um grupo de símbolos, com reconexão"""
+        streams = '/'.join(f"{s.lower()}@kline_{self.base}" for s in symbols)
+        url = f"{self.config.WS_URL}/stream?streams={streams}"
+        backoff = 1
+        while self.running:
+            try:
+                async with websockets.connect(url, max_size=None) as ws:
+                    backoff = 1
+                    logger.info(f"🔌 Stream conectado ({len(symbols)} símbolos)")
+                    async for raw in ws:
+                        self.handle_message(raw)
+            except (OSError, websockets.ConnectionClosed) as e:
+                logger.warning(f"⚠️ Stream caiu ({e}), reconectando em {backoff}s")
+            if not self.running:
+                break
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+            for kline in await asyncio.to_thread(self.catch_up, symbols):
+                self.route(*kline)
+
+    # --- laço principal ---
+    async def supervise(self):
+        next_check = time.monotonic() + self.heartbeat
+        while self.running:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            self.flush()
+            self.drain()
+            if time.monotonic() >= next_check:
+                self.check_health()
+                next_check = time.monotonic() + self.heartbeat
+
+    def start(self):
+        """Backfill, processos e distribuição inicial"""
+        self.writer = BatchWriter(self.db_path)
+        self.backfill()
+        conn = init_db(self.db_path)
+        self.last = {row['symbol']: row for row in latest_signals(conn).to_dict('records')}
+        for symbol in self.symbols:
+            self.last_kline[symbol] = last_open_time(conn, symbol, self.base)
+        conn.close()
+        self.running = True
+        for wid in self.worker_ids:
+            self._spawn(wid)
+        self.rebalance()
+
+    def stop(self):
+        self.running = False
+        self.flush()
+        for inbox in self.inboxes.values():
+            inbox.put(None)
+        # Os workers terminam a fila antes de sair; os resultados continuam chegando
+        deadline = time.monotonic() + 5
+        while any(p.is_alive() for p in self.procs.values()) and time.monotonic() < deadline:
+            self.drain()
+            time.sleep(FLUSH_INTERVAL)
+        for proc in self.procs.values():
+            if proc.is_alive():
+                proc.terminate()
+        self.drain()
+        if self.writer:
+            self.writer.close()
+
+    async def run(self):
+        if websockets is None:
+            raise RuntimeError("Pacote 'websockets' não instalado (pip install websockets)")
+        self.start()
+        size = self.config.WS_MAX_STREAMS
+        groups = [self.symbols[i:i + size] for i in range(0, len(self.symbols), size)]
+        try:
+            await asyncio.gather(self.supervise(), *(self.stream(g) for g in groups))
+        finally:
+            self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor multi-símbolo em vários processos")
+    parser.add_argument('--workers', type=int, default=None, help="Processos de trabalho (padrão: núcleos)")
+    parser.add_argument('--symbols', nargs='+', default=None, help="Símbolos (padrão: Config.SYMBOLS)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    symbols = args.symbols or Config.SYMBOLS or [Config.SYMBOL]
+    if Config.METRICS_PORT:
+        metrics.serve(Config.METRICS_PORT)
+    try:
+        asyncio.run(Coordinator(symbols, args.workers).run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
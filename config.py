@@ -14,16 +14,35 @@ except ImportError:
 class Config:
     SYMBOL = "SOLUSDT"  # Formato padrão API direta
     
+    # Scanner multi-símbolo (SYMBOLS vazio = top pares USDT por volume)
+    SYMBOLS = [s for s in os.getenv("SYMBOLS", "").split(",") if s]
+    SCAN_TOP_N = int(os.getenv("SCAN_TOP_N", "200"))
+    SCAN_MAX_WORKERS = 16
+    SCAN_TIME_BUDGET = 20.0      # segundos por ciclo
+    API_WEIGHT_LIMIT = 5000      # peso/minuto (limite da Binance: 6000)
+    
+    # Monitor distribuído (cluster.py)
+    CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", "0"))  # 0 = um por núcleo
+    CLUSTER_HEARTBEAT = 2.0      # segundos entre heartbeats dos workers
+    WS_MAX_STREAMS = 200         # streams por conexão combinada (limite da Binance: 1024)
+    
     # API (Obrigatório para o futuro, mas o monitor roda público agora)
     API_KEY = os.getenv("BINANCE_API_KEY", "")
     API_SECRET = os.getenv("BINANCE_API_SECRET", "")
     SANDBOX_MODE = os.getenv("SANDBOX_MODE", "true").lower() == "true"
     
+    # Endpoints (sobrescrevíveis para testar contra servidor local)
+    REST_URL = os.getenv("BINANCE_REST_URL", "https://api.binance.com")
+    WS_URL = os.getenv("BINANCE_WS_URL", "wss://stream.binance.com:9443")
+    
     TIMEFRAMES = {
         'fast': '1m',    # Timing
         'medium': '5m',  # Confirmação
         'slow': '1h'     # Tendência
     }
+    BASE_TIMEFRAME = '1m'  # único fluxo baixado; os TIMEFRAMES maiores são agregados dele
+    # Estado dos motores entre execuções do monitor.py ("" desliga)
+    SNAPSHOT_FILE = os.getenv("SNAPSHOT_FILE", "engine_state.json")
     
     # Indicadores
     BB_LENGTH = 20
@@ -36,6 +55,31 @@ class Config:
     MACD_SLOW = 26
     MACD_SIGNAL = 9
     
+    # Backend do cálculo vetorizado (kernels.py): pandas | numpy | numba
+    INDICATOR_BACKEND = os.getenv("INDICATOR_BACKEND", "numpy")
+    
+    # Filtros de entrada (strategy.py)
+    EMA6_DISTANCE = 0.002  # distância máxima do preço à EMA6 (fração)
+    BBP_UPPER = 0.95       # LONG bloqueado acima disso
+    BBP_LOWER = 0.05       # SHORT bloqueado abaixo disso
+    
+    # Métricas (porta 0 = sem endpoint HTTP)
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+    METRICS_FILE = os.getenv("METRICS_FILE")
+    
+    # Backend do dashboard (server.py)
+    SERVER_HOST = os.getenv("DASHBOARD_HOST", "127.0.0.1")
+    SERVER_PORT = int(os.getenv("DASHBOARD_PORT", "8765"))
+    SERVER_PUSH_INTERVAL = 0.25   # segundos entre atualizações enviadas aos clientes
+    
     # Telegram
     TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
     TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+    TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+    TELEGRAM_RATE = 1.0        # mensagens/segundo por chat
+    TELEGRAM_BURST = 3         # rajada máxima por chat
+    TELEGRAM_QUEUE_SIZE = 1000
+    
+    @classmethod
+    def is_telegram_enabled(cls):
+        return bool(cls.TELEGRAM_BOT_TOKEN and cls.TELEGRAM_CHAT_ID)
@@ -1,12 +1,19 @@
 import tkinter as tk
 from tkinter import ttk
+import numpy as np
 import pandas as pd
-import requests
+import queue
 import threading
 import time
 from datetime import datetime
 from config import Config
-from indicators import enrich_dataframe
+from database import interval_ms
+from monitor import iter_klines, klines_to_frame
+from resampler import TimeframeSet, history_start
+
+CHART_CANDLES = 300   # velas no gráfico
+REFRESH_SECONDS = 10  # intervalo entre buscas na API
+POLL_MS = 100         # UI confere a fila de atualizações
 
 class TradingDashboard:
     def __init__(self, root):
@@ -22,8 +29,12 @@ class TradingDashboard:
         self.rsi_medium = 0  
         self.rsi_slow = 0
         self.running = True
+        self.stop_event = threading.Event()
+        self.updates = queue.Queue(maxsize=1)  # thread de dados -> UI (só o mais recente)
+        self.timeframes = TimeframeSet(Config.SYMBOL, Config, maxlen=CHART_CANDLES)
         
         self.setup_ui()
+        self.chart = CandleChart(self.canvas)
         self.start_monitoring()
     
     def setup_ui(self):
@@ -89,55 +100,66 @@ class TradingDashboard:
                                          bg='#2d2d2d', fg='#ffffff')
             self.tf_labels[tf].pack(anchor='w')
     
-    def fetch_real_data(self, interval):
-        """Busca dados REAIS da Binance - igual monitor.py"""
+    # --- thread de dados (nunca toca no Tk) ---
+    def fetch_real_data(self):
+        """Busca dados REAIS da Binance - igual monitor.py (só 1m; 5m/1h agregados dele)"""
         try:
-            url = "https://api.binance.com/api/v3/klines"
-            params = {
-                'symbol': Config.SYMBOL, 
-                'interval': interval, 
-                'limit': 100
-            }
-            data = requests.get(url, params=params, timeout=10).json()
-            
-            df = pd.DataFrame(data, columns=[
-                'timestamp', 'open', 'high', 'low', 'close', 'volume',
-                'close_time', 'quote_volume', 'trades', 'taker_buy_base', 
-                'taker_buy_quote', 'ignore'
-            ])
-            
-            # Converte para float
-            for col in ['open', 'high', 'low', 'close', 'volume']:
-                df[col] = pd.to_numeric(df[col])
-            
-            df = df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].copy()
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+            timeframes = self.timeframes
+            now_ms = int(time.time() * 1000)
+            # Primeira vez: histórico para 100 velas de 1h; depois só as velas novas
+            start = timeframes.last_open_time
+            if start is None:
+                start = history_start(now_ms, Config.TIMEFRAMES.values(), 100)
+            pages = list(iter_klines(Config.SYMBOL, Config.BASE_TIMEFRAME, start,
+                                     now_ms + interval_ms(Config.BASE_TIMEFRAME)))
+            if pages:
+                timeframes.seed(pd.concat([klines_to_frame(p) for p in pages], ignore_index=True))
+            frames = timeframes.frames()
             
-            # Calcula indicadores REAIS
-            df_enriched = enrich_dataframe(df, Config)
-            return df_enriched
+            # Só arrays prontos para desenhar atravessam para a thread da UI
+            fast = frames['fast'].tail(CHART_CANDLES)
+            return {
+                'price': fast['close'].iloc[-1],
+                'rsi': {Config.TIMEFRAMES[name]: df['RSI'].iloc[-1] for name, df in frames.items()},
+                'chart': {col: fast[col].to_numpy() for col in CandleChart.COLUMNS},
+            }
             
         except Exception as e:
-            print(f"Erro {interval}: {e}")
-            return pd.DataFrame()
+            print(f"Erro: {e}")
+            return None
+    
+    def fetch_loop(self):
+        """Busca a cada REFRESH_SECONDS e entrega só o resultado mais recente"""
+        while not self.stop_event.is_set():
+            payload = self.fetch_real_data()
+            if payload is not None:
+                try:
+                    self.updates.get_nowait()  # descarta o que a UI ainda não consumiu
+                except queue.Empty:
+                    pass
+                self.updates.put_nowait(payload)
+            self.stop_event.wait(REFRESH_SECONDS)
     
-    def update_display(self):
-        """Atualiza TODOS os dados reais"""
+    # --- thread da UI ---
+    def poll_updates(self):
+        """Aplica o último resultado da fila, sem bloquear o loop do Tk"""
         try:
-            # Busca 3 timeframes REAIS
-            df_fast = self.fetch_real_data('1m')
-            df_medium = self.fetch_real_data('5m') 
-            df_slow = self.fetch_real_data('1h')
-            
-            if not df_fast.empty:
-                self.price = df_fast['close'].iloc[-1]
-                self.rsi_fast = df_fast['RSI'].iloc[-1]
-                
-            if not df_medium.empty:
-                self.rsi_medium = df_medium['RSI'].iloc[-1]
-                
-            if not df_slow.empty:
-                self.rsi_slow = df_slow['RSI'].iloc[-1]
+            payload = self.updates.get_nowait()
+        except queue.Empty:
+            payload = None
+        if payload is not None:
+            self.update_display(payload)
+        if not self.stop_event.is_set():
+            self.root.after(POLL_MS, self.poll_updates)
+    
+    def update_display(self, payload):
+        """Atualiza labels e gráfico com dados já buscados"""
+        try:
+            rsi = payload['rsi']
+            self.price = payload['price']
+            self.rsi_fast = rsi.get(Config.TIMEFRAMES['fast'], self.rsi_fast)
+            self.rsi_medium = rsi.get(Config.TIMEFRAMES['medium'], self.rsi_medium)
+            self.rsi_slow = rsi.get(Config.TIMEFRAMES['slow'], self.rsi_slow)
             
             # Atualiza labels
             self.price_label.config(text=f"${self.price:.4f}")
@@ -149,12 +171,12 @@ class TradingDashboard:
             self.pos_label.config(text=pos_text[self.current_pos], fg=color[self.current_pos])
             
             # Timeframes RSI
-            self.tf_labels['1m'].config(text=f"{self.rsi_fast:.1f}", fg=self.get_rsi_color(self.rsi_fast))
-            self.tf_labels['5m'].config(text=f"{self.rsi_medium:.1f}", fg=self.get_rsi_color(self.rsi_medium))
-            self.tf_labels['1h'].config(text=f"{self.rsi_slow:.1f}", fg=self.get_rsi_color(self.rsi_slow))
+            for tf, label in self.tf_labels.items():
+                if tf in rsi:
+                    label.config(text=f"{rsi[tf]:.1f}", fg=self.get_rsi_color(rsi[tf]))
             
-            # Gráfico real
-            self.draw_real_chart(df_fast)
+            # Gráfico real (só o que mudou é redesenhado)
+            self.chart.update(payload['chart'])
             
         except Exception as e:
             print(f"Erro update: {e}")
@@ -165,71 +187,145 @@ class TradingDashboard:
         elif rsi < 30: return '#00ff88'  # Sobrevendido  
         else: return '#ffaa00'  # Neutro
     
-    def draw_real_chart(self, df):
-        """Gráfico candlestick REAL dos últimos 30 candles"""
-        self.canvas.delete("all")
-        w, h = 880, 420
-        
-        if df.empty:
-            self.canvas.create_text(w//2, h//2, text="Carregando...", fill='#666', font=('Arial', 16))
-            return
-        
-        # Grid
-        for x in range(50, w, 35):
-            self.canvas.create_line(x, 20, x, h-20, fill='#333', width=1)
-        for y in range(50, h, 25):
-            self.canvas.create_line(20, y, w-20, y, fill='#333', width=1)
-        
-        # Normaliza preços
-        prices = df['close'].tail(30).values
-        min_p, max_p = prices.min(), prices.max()
-        price_range = max_p - min_p if max_p > min_p else 1
-        
-        # Desenha candles
-        bar_width = 25
-        for i, (idx, row) in enumerate(df.tail(30).iterrows()):
-            x = 50 + i * 35
-            
-            # Normaliza Y
-            high_y = h - 50 - ((row['high'] - min_p) / price_range) * 300
-            low_y = h - 50 - ((row['low'] - min_p) / price_range) * 300  
-            close_y = h - 50 - ((row['close'] - min_p) / price_range) * 300
-            
-            # Cor do candle
-            color = '#00ff88' if row['close'] >= row['open'] else '#ff4444'
-            
-            # Corpo do candle
-            body_top = min(close_y, h-50 - ((row['open'] - min_p) / price_range) * 300)
-            body_bottom = max(close_y, h-50 - ((row['open'] - min_p) / price_range) * 300)
-            self.canvas.create_rectangle(x, body_top, x+bar_width, body_bottom, 
-                                       fill=color, outline='#555', width=1)
-            
-            # Pavios
-            self.canvas.create_line(x+12, high_y, x+12, body_top, fill=color, width=2)
-            self.canvas.create_line(x+12, body_bottom, x+12, low_y, fill=color, width=2)
-        
-        # Labels eixo Y
-        for i, p in enumerate([min_p, (min_p+max_p)/2, max_p]):
-            y = h - 50 - (i * 150)
-            self.canvas.create_text(35, y, text=f"${p:.2f}", anchor='w', 
-                                  fill='#888', font=('Arial', 10))
-    
-    def monitor_loop(self):
-        """Atualiza a cada 10 segundos"""
-        while self.running:
-            self.root.after(0, self.update_display)  # Thread safe
-            time.sleep(10)
-    
     def start_monitoring(self):
-        """Inicia monitoramento"""
-        thread = threading.Thread(target=self.monitor_loop, daemon=True)
-        thread.start()
-        self.update_display()  # Primeira execução
+        """Inicia monitoramento (rede numa thread, UI lendo a fila)"""
+        threading.Thread(target=self.fetch_loop, daemon=True).start()
+        self.root.after(POLL_MS, self.poll_updates)
     
     def on_closing(self):
         self.running = False
+        self.stop_event.set()
         self.root.destroy()
 
+
+class CandleChart:
+    """Candles + BB/EMA6 num Canvas, reaproveitando os itens entre atualizações.
+
+    Os itens (grade, corpos, pavios, linhas) são criados uma vez e movidos
+    com ``coords``/``itemconfig``. Se só a última vela mudou e o preço
+    continua dentro da escala, só ela (e a ponta das linhas) é redesenhada.
+    """
+    COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'BBU', 'BBL', 'EMA_6')
+    OVERLAYS = {'BBU': dict(fill='#ff4444', dash=(4, 2)),
+                'BBL': dict(fill='#4444ff', dash=(4, 2)),
+                'EMA_6': dict(fill='#00ff88', width=2)}
+    UP, DOWN = '#00ff88', '#ff4444'
+    LEFT, RIGHT, TOP, BOTTOM = 70, 15, 20, 30
+    GRID_X, GRID_Y = 12, 8
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.grid = [canvas.create_line(0, 0, 0, 0, fill='#333') for _ in range(self.GRID_X + self.GRID_Y)]
+        self.overlays = {name: canvas.create_line(0, 0, 0, 0, state='hidden', tags='overlay', **opts)
+                         for name, opts in self.OVERLAYS.items()}
+        self.axis = [canvas.create_text(0, 0, anchor='w', fill='#888', font=('Arial', 10)) for _ in range(3)]
+        self.loading = canvas.create_text(0, 0, text="Carregando...", fill='#666', font=('Arial', 16))
+        self.bodies, self.wicks, self.colors = [], [], []
+        self.size = None       # (largura, altura) usada no último layout
+        self.scale = None      # (mínimo, máximo) de preço da escala atual
+        self.first = None      # timestamp da primeira vela desenhada
+        self.count = 0
+        self.data = None
+        canvas.bind('<Configure>', lambda e: self.data is not None and self.update(self.data, force=True))
+
+    # --- geometria ---
+    def _y(self, price):
+        lo, hi = self.scale
+        h = self.size[1]
+        return self.TOP + (hi - price) / (hi - lo) * (h - self.TOP - self.BOTTOM)
+
+    def _x(self, n):
+        """Centros das velas e largura do corpo"""
+        step = (self.size[0] - self.LEFT - self.RIGHT) / max(n, 1)
+        return self.LEFT + (np.arange(n) + 0.5) * step, max(step * 0.7, 1)
+
+    def _fit_scale(self, low, high):
+        """Mantém a escala enquanto o preço couber nela (evita redesenhar tudo a cada tick)"""
+        lo, hi = float(np.nanmin(low)), float(np.nanmax(high))
+        if self.scale is not None:
+            cur_lo, cur_hi = self.scale
+            inside = lo >= cur_lo and hi <= cur_hi
+            if inside and (hi - lo) > 0.5 * (cur_hi - cur_lo):
+                return False
+        pad = (hi - lo) * 0.05 or abs(hi) * 0.001 or 1
+        self.scale = (lo - pad, hi + pad)
+        return True
+
+    def _items(self, n):
+        """Garante ``n`` velas no canvas (cria só as que faltam; esconde as sobrando)"""
+        if len(self.bodies) < n:
+            while len(self.bodies) < n:
+                self.wicks.append(self.canvas.create_line(0, 0, 0, 0, width=2))
+                self.bodies.append(self.canvas.create_rectangle(0, 0, 0, 0, outline='#555'))
+                self.colors.append(None)
+            self.canvas.tag_raise('overlay')  # linhas BB/EMA sempre sobre as velas
+        for i in range(len(self.bodies)):
+            state = 'normal' if i < n else 'hidden'
+            self.canvas.itemconfig(self.bodies[i], state=state)
+            self.canvas.itemconfig(self.wicks[i], state=state)
+
+    # --- desenho ---
+    def _draw_candle(self, i, x, half, o, h, l, c):
+        y_o, y_c, y_h, y_l = self._y(o), self._y(c), self._y(h), self._y(l)
+        top, bottom = min(y_o, y_c), max(y_o, y_c, min(y_o, y_c) + 1)
+        self.canvas.coords(self.bodies[i], x - half, top, x + half, bottom)
+        self.canvas.coords(self.wicks[i], x, y_h, x, y_l)
+        color = self.UP if c >= o else self.DOWN
+        if self.colors[i] != color:
+            self.canvas.itemconfig(self.bodies[i], fill=color)
+            self.canvas.itemconfig(self.wicks[i], fill=color)
+            self.colors[i] = color
+
+    def _draw_overlays(self, data, xs):
+        for name, item in self.overlays.items():
+            values = data[name]
+            ok = ~np.isnan(values)
+            if ok.sum() < 2:
+                self.canvas.itemconfig(item, state='hidden')
+                continue
+            ys = self._y(values[ok])
+            self.canvas.coords(item, *np.column_stack([xs[ok], ys]).ravel().tolist())
+            self.canvas.itemconfig(item, state='normal')
+
+    def _draw_frame(self):
+        w, h = self.size
+        for i, item in enumerate(self.grid[:self.GRID_X]):
+            x = self.LEFT + (w - self.LEFT - self.RIGHT) * i / (self.GRID_X - 1)
+            self.canvas.coords(item, x, self.TOP, x, h - self.BOTTOM)
+        for i, item in enumerate(self.grid[self.GRID_X:]):
+            y = self.TOP + (h - self.TOP - self.BOTTOM) * i / (self.GRID_Y - 1)
+            self.canvas.coords(item, self.LEFT, y, w - self.RIGHT, y)
+        lo, hi = self.scale
+        for item, price in zip(self.axis, (hi, (lo + hi) / 2, lo)):
+            self.canvas.coords(item, 5, self._y(price))
+            self.canvas.itemconfig(item, text=f"${price:.2f}")
+
+    def update(self, data, force=False):
+        """Desenha as velas de ``data`` (dict coluna -> array), mexendo só no necessário"""
+        self.data = data
+        n = len(data['close'])
+        self.canvas.itemconfig(self.loading, state='hidden' if n else 'normal')
+        size = (self.canvas.winfo_width(), self.canvas.winfo_height())
+        if not n or min(size) < 50:
+            self.canvas.coords(self.loading, size[0] // 2, size[1] // 2)
+            return
+
+        rescaled = self._fit_scale(np.r_[data['low'], data['BBL']], np.r_[data['high'], data['BBU']])
+        full = (force or rescaled or size != self.size or n != self.count
+                or data['timestamp'][0] != self.first)
+        self.size, self.count, self.first = size, n, data['timestamp'][0]
+        xs, width = self._x(n)
+        cols = [data[c] for c in ('open', 'high', 'low', 'close')]
+        if full:
+            # Nova vela, nova escala ou novo tamanho: reposiciona tudo (sem recriar itens)
+            self._items(n)
+            self._draw_frame()
+            for i in range(n):
+                self._draw_candle(i, xs[i], width / 2, *(col[i] for col in cols))
+        else:
+            self._draw_candle(n - 1, xs[-1], width / 2, *(col[-1] for col in cols))
+        self._draw_overlays(data, xs)
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = TradingDashboard(root)
@@ -1,46 +1,140 @@
-import sqlite3
+import atexit
+import json
+import math
 import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime, timezone
+
 import pandas as pd
 
-def init_db(db_path='trading_data.db'):
-    """Cria banco SQLite LIMPO sempre - solução 100% confiável"""
-    
-    # Remove arquivo existente (evita corrupção)
-    if os.path.exists(db_path):
-        os.remove(db_path)
-        print(f"🗑️  Arquivo '{db_path}' removido (evitando corrupção)")
-    
-    # Cria banco NOVO
-    conn = sqlite3.connect(db_path)
+import metrics
+
+INTERVAL_MS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+
+# Cada item leva o banco da versão i para i+1 (PRAGMA user_version)
+MIGRATIONS = [
+    # v1: esquema original
+    """
+    CREATE TABLE IF NOT EXISTS history (
+        timestamp DATETIME PRIMARY KEY,
+        price REAL,
+        rsi REAL
+    );
+    CREATE TABLE IF NOT EXISTS state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """,
+    # v2: velas OHLCV persistentes
+    """
+    CREATE TABLE IF NOT EXISTS candles (
+        symbol TEXT NOT NULL,
+        timeframe TEXT NOT NULL,
+        open_time INTEGER NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume REAL,
+        PRIMARY KEY (symbol, timeframe, open_time)
+    ) WITHOUT ROWID;
+    """,
+    # v3: livro de sinais/operações (só inserção; uma linha por decisão)
+    """
+    CREATE TABLE IF NOT EXISTS signals (
+        id INTEGER PRIMARY KEY,
+        symbol TEXT NOT NULL,
+        time INTEGER NOT NULL,
+        action TEXT NOT NULL,
+        side TEXT,
+        state TEXT NOT NULL,
+        price REAL,
+        entry_price REAL,
+        pnl REAL,
+        reason TEXT,
+        indicators TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_signals_symbol_time ON signals (symbol, time);
+    CREATE INDEX IF NOT EXISTS idx_signals_symbol_state ON signals (symbol, state);
+    CREATE INDEX IF NOT EXISTS idx_signals_exits ON signals (symbol, time, pnl) WHERE action = 'EXIT';
+    """,
+]
+
+SIGNAL_FIELDS = ('symbol', 'time', 'action', 'side', 'state', 'price', 'entry_price', 'pnl', 'reason', 'indicators')
+SIGNAL_SQL = (f"INSERT INTO signals ({', '.join(SIGNAL_FIELDS)}) "
+              f"VALUES ({', '.join(':' + f for f in SIGNAL_FIELDS)})")
+
+def interval_ms(interval):
+    """'1m' -> 60000, '1h' -> 3600000..."""
+    return int(interval[:-1]) * INTERVAL_MS[interval[-1]]
+
+def migrate(conn):
+    """Aplica as migrações pendentes, sem apagar dados"""
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for i in range(version, len(MIGRATIONS)):
+        conn.executescript(MIGRATIONS[i])
+        conn.execute(f'PRAGMA user_version = {i + 1}')
+        conn.commit()
+        print(f"🔧 Banco migrado para v{i + 1}")
+    return conn
+
+BUSY_TIMEOUT = 30.0  # segundos esperando o lock de outro processo/thread antes de desistir
+CORRUPTION_MESSAGES = ('file is not a database', 'database disk image is malformed')
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
     conn.execute('PRAGMA journal_mode=WAL')  # Modo robusto
-    
-    # Tabela histórico
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS history (
-            timestamp DATETIME PRIMARY KEY,
-            price REAL,
-            rsi REAL
-        )
-    ''')
-    
-    # Tabela estado
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS state (
-            key TEXT PRIMARY KEY,
-            value TEXT
-        )
-    ''')
-    
-    conn.commit()
-    print(f"✅ Banco '{db_path}' criado do zero")
     return conn
 
+def _is_corrupt(db_path, error):
+    """Arquivo realmente corrompido? Lock ("database is locked"), disco cheio etc. não contam"""
+    if any(m in str(error).lower() for m in CORRUPTION_MESSAGES):
+        return True
+    if isinstance(error, sqlite3.OperationalError):
+        return False
+    try:
+        with closing(sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)) as conn:
+            return conn.execute('PRAGMA integrity_check').fetchone()[0] != 'ok'
+    except sqlite3.OperationalError:
+        return False
+    except sqlite3.DatabaseError:
+        return True
+
+def init_db(db_path='trading_data.db'):
+    """Abre (ou cria) o banco e aplica as migrações pendentes
+
+    Erros de lock/IO sobem para quem chamou; só um arquivo corrompido é
+    posto de lado (``.corrupt``, junto com o WAL) e recriado vazio.
+    """
+    conn = None
+    try:
+        conn = _connect(db_path)
+        return migrate(conn)
+    except sqlite3.DatabaseError as e:
+        if conn:
+            conn.close()
+        if not _is_corrupt(db_path, e):
+            raise
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.replace(db_path + suffix, f"{db_path}.corrupt{suffix}")
+        print(f"⚠️  Banco '{db_path}' corrompido ({e}); cópia em '{db_path}.corrupt'")
+        return migrate(_connect(db_path))
+
+def _now_timestamp():
+    """Chave do histórico com microssegundos (CURRENT_TIMESTAMP colidia dentro do mesmo segundo)"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+
 def save_data(conn, price, rsi):
     """Salva preço e RSI no histórico"""
     cursor = conn.cursor()
     cursor.execute(
-        'INSERT OR REPLACE INTO history (timestamp, price, rsi) VALUES (CURRENT_TIMESTAMP, ?, ?)', 
-        (price, rsi)
+        'INSERT OR REPLACE INTO history (timestamp, price, rsi) VALUES (?, ?, ?)', 
+        (_now_timestamp(), price, rsi)
     )
     conn.commit()
     print(f"💾 Dados salvos: ${price:.4f}, RSI: {rsi:.1f}")
@@ -54,12 +148,13 @@ def get_last_rsi(conn):
 
 def set_order_state(conn, status):
     """Salva estado da posição"""
-    cursor = conn.cursor()
-    cursor.execute(
-        'INSERT OR REPLACE INTO state (key, value) VALUES ("pos", ?)', 
-        (status,)
-    )
-    conn.commit()
+    with metrics.span('db'):
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT OR REPLACE INTO state (key, value) VALUES ("pos", ?)', 
+            (status,)
+        )
+        conn.commit()
     print(f"📊 Posição salva: {status}")
 
 def get_order_state(conn, default="IDLE"):
@@ -68,3 +163,301 @@ def get_order_state(conn, default="IDLE"):
     cursor.execute('SELECT value FROM state WHERE key="pos"')
     result = cursor.fetchone()
     return result[0] if result else default
+
+def save_candles(conn, symbol, timeframe, df):
+    """Grava (ou atualiza) velas OHLCV; ``df`` no formato de klines_to_frame"""
+    if df.empty:
+        return 0
+    open_time = df['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64')
+    rows = zip([symbol] * len(df), [timeframe] * len(df), open_time.tolist(),
+               df['open'].tolist(), df['high'].tolist(), df['low'].tolist(),
+               df['close'].tolist(), df['volume'].tolist())
+    with metrics.span('db'):
+        conn.executemany(
+            'INSERT OR REPLACE INTO candles (symbol, timeframe, open_time, open, high, low, close, volume) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        conn.commit()
+    metrics.inc('db_rows_written', len(df))
+    return len(df)
+
+def load_candles(conn, symbol, timeframe, start_ms=None, end_ms=None, limit=None):
+    """Carrega velas (ordem crescente); com ``limit`` pega as últimas N"""
+    query = 'SELECT open_time, open, high, low, close, volume FROM candles WHERE symbol = ? AND timeframe = ?'
+    params = [symbol, timeframe]
+    if start_ms is not None:
+        query += ' AND open_time >= ?'
+        params.append(start_ms)
+    if end_ms is not None:
+        query += ' AND open_time < ?'
+        params.append(end_ms)
+    query += ' ORDER BY open_time DESC' if limit else ' ORDER BY open_time'
+    if limit:
+        query += ' LIMIT ?'
+        params.append(limit)
+    df = pd.read_sql_query(query, conn, params=params)
+    if limit:
+        df = df.iloc[::-1].reset_index(drop=True)
+    df.insert(0, 'timestamp', pd.to_datetime(df.pop('open_time'), unit='ms'))
+    return df
+
+def last_open_time(conn, symbol, timeframe):
+    """open_time (ms) da vela mais recente guardada, ou None"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT MAX(open_time) FROM candles WHERE symbol = ? AND timeframe = ?',
+                   (symbol, timeframe))
+    return cursor.fetchone()[0]
+
+def find_gaps(conn, symbol, timeframe, start_ms=None, end_ms=None):
+    """Intervalos [início, fim) sem velas dentro do período guardado"""
+    step = interval_ms(timeframe)
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT prev + ?, open_time FROM ('
+        '  SELECT open_time, LAG(open_time) OVER (ORDER BY open_time) AS prev FROM candles'
+        '  WHERE symbol = ? AND timeframe = ? AND open_time >= ? AND open_time < ?'
+        ') WHERE open_time - prev > ?',
+        (step, symbol, timeframe, start_ms or 0, end_ms or 2**62, step))
+    return cursor.fetchall()
+
+def _clean(value):
+    """Float puro para o JSON do snapshot (NaN -> null)"""
+    value = float(value)
+    return None if math.isnan(value) else value
+
+def signal_row(symbol, time_ms, pos, new_pos, price, reason=None, indicators=None, prev=None):
+    """Linha do livro de sinais para uma decisão ``pos`` -> ``new_pos``
+
+    ``prev`` é a última linha do símbolo (ver last_signal): dela vem o preço
+    de entrada da posição aberta, para o PnL da saída.
+    """
+    if new_pos != pos:
+        action = 'ENTRY' if new_pos != 'IDLE' else 'EXIT'
+    else:
+        action = 'REJECT' if pos == 'IDLE' else 'HOLD'
+    side = new_pos if new_pos != 'IDLE' else pos if pos != 'IDLE' else None
+    entry_price, pnl = None, None
+    if action == 'ENTRY':
+        entry_price = price
+    elif side and prev and prev['side'] == side and prev['state'] != 'IDLE':
+        entry_price = prev['entry_price']
+        if action == 'EXIT' and entry_price:
+            pnl = (price / entry_price - 1) * (1 if side == 'LONG' else -1)
+    if indicators is not None:
+        indicators = json.dumps({k: _clean(v) for k, v in indicators.items()}, separators=(',', ':'))
+    return {'symbol': symbol, 'time': int(time_ms), 'action': action, 'side': side, 'state': new_pos,
+            'price': float(price), 'entry_price': entry_price, 'pnl': pnl, 'reason': reason,
+            'indicators': indicators}
+
+def last_signal(conn, symbol):
+    """Última linha do livro para o símbolo (dict) ou None"""
+    cursor = conn.execute(
+        f"SELECT {', '.join(SIGNAL_FIELDS)} FROM signals WHERE symbol = ? ORDER BY time DESC, id DESC LIMIT 1",
+        (symbol,))
+    row = cursor.fetchone()
+    return dict(zip(SIGNAL_FIELDS, row)) if row else None
+
+def record_signal(conn, symbol, time_ms, pos, new_pos, price, reason=None, indicators=None):
+    """Acrescenta a decisão ao livro de sinais e retorna a linha gravada"""
+    with metrics.span('db'):
+        row = signal_row(symbol, time_ms, pos, new_pos, price, reason, indicators,
+                         prev=last_signal(conn, symbol))
+        conn.execute(SIGNAL_SQL, row)
+        conn.commit()
+    return row
+
+def load_signals(conn, symbol, start_ms=None, end_ms=None, state=None, action=None, limit=None):
+    """Linhas do livro de um símbolo (ordem crescente); com ``limit`` as últimas N"""
+    query = f"SELECT id, {', '.join(SIGNAL_FIELDS)} FROM signals WHERE symbol = ?"
+    params = [symbol]
+    for clause, value in (('state = ?', state), ('action = ?', action),
+                          ('time >= ?', start_ms), ('time < ?', end_ms)):
+        if value is not None:
+            query += f' AND {clause}'
+            params.append(value)
+    query += ' ORDER BY time DESC, id DESC' if limit else ' ORDER BY time, id'
+    if limit:
+        query += ' LIMIT ?'
+        params.append(limit)
+    df = pd.read_sql_query(query, conn, params=params)
+    if limit:
+        df = df.iloc[::-1].reset_index(drop=True)
+    return df
+
+def latest_signals(conn):
+    """Última linha de cada símbolo (posição atual de todos)
+
+    Pula de símbolo em símbolo pelo índice (symbol, time) em vez de agrupar a
+    tabela inteira: custo proporcional ao número de símbolos, não de linhas.
+    """
+    return pd.read_sql_query(
+        'WITH RECURSIVE symbols(symbol) AS ('
+        '  SELECT MIN(symbol) FROM signals'
+        '  UNION ALL'
+        '  SELECT (SELECT MIN(symbol) FROM signals WHERE symbol > symbols.symbol)'
+        '  FROM symbols WHERE symbol IS NOT NULL'
+        f') SELECT s.id, {", ".join("s." + f for f in SIGNAL_FIELDS)} FROM symbols JOIN signals s ON s.id = ('
+        '  SELECT id FROM signals WHERE symbol = symbols.symbol ORDER BY time DESC, id DESC LIMIT 1'
+        ') ORDER BY s.symbol', conn)
+
+def trade_stats(conn, symbol=None, start_ms=None, end_ms=None):
+    """Operações fechadas, taxa de acerto e PnL (retornos somados) no período"""
+    query = "SELECT COUNT(pnl), SUM(pnl > 0), SUM(pnl), AVG(pnl), MIN(pnl), MAX(pnl) FROM signals WHERE action = 'EXIT'"
+    params = []
+    for clause, value in (('symbol = ?', symbol), ('time >= ?', start_ms), ('time < ?', end_ms)):
+        if value is not None:
+            query += f' AND {clause}'
+            params.append(value)
+    trades, wins, total, avg, worst, best = conn.execute(query, params).fetchone()
+    return {'trades': trades, 'wins': wins or 0, 'win_rate': (wins or 0) / trades if trades else None,
+            'pnl': total or 0.0, 'avg_pnl': avg, 'worst': worst, 'best': best}
+
+class BatchWriter:
+    """Escritas enfileiradas e gravadas em lote (uma transação por flush).
+
+    Uma thread própria (com conexão própria) drena a fila e grava quando
+    acumula ``max_rows`` linhas ou passa ``max_delay`` segundos. Escritas
+    repetidas na mesma chave (estado, vela em formação) são coalescidas e
+    quem enfileira nunca espera pelo disco.
+    """
+    HISTORY_SQL = 'INSERT OR REPLACE INTO history (timestamp, price, rsi) VALUES (?, ?, ?)'
+    STATE_SQL = 'INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)'
+    CANDLE_SQL = ('INSERT OR REPLACE INTO candles (symbol, timeframe, open_time, open, high, low, close, volume) '
+                  'VALUES (?, ?, ?, ?, ?, ?, ?, ?)')
+
+    def __init__(self, db_path='trading_data.db', max_rows=5000, max_delay=1.0):
+        self.db_path = db_path
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self.rows_written = 0
+        self.flushes = 0
+        self.flush_time = 0.0
+        self._pending = {}   # sql -> lista de parâmetros (ou dict chave -> parâmetros)
+        self._count = 0
+        self._ready = threading.Event()
+        self._error = None  # erro ao abrir o banco na thread (relançado aqui)
+        self._thread = threading.Thread(target=self._run, name='BatchWriter', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            self._thread.join()
+            raise self._error
+        atexit.register(self.close)
+
+    # --- API (thread-safe, não bloqueia) ---
+    def add(self, sql, params, key=None):
+        """Enfileira um comando; com ``key`` só a última escrita da chave é gravada"""
+        self.queue.put((sql, params, key))
+
+    def save_history(self, price, rsi, timestamp=None):
+        # Timestamp do momento do enfileiramento (com microssegundos, sem colisão)
+        timestamp = timestamp or _now_timestamp()
+        self.add(self.HISTORY_SQL, (timestamp, price, rsi))
+
+    def set_state(self, key, value):
+        self.add(self.STATE_SQL, (key, value), key=key)
+
+    def set_order_state(self, status):
+        self.set_state('pos', status)
+
+    def save_signal(self, row):
+        """Enfileira uma linha de signal_row (o chamador guarda a anterior do símbolo)"""
+        self.add(SIGNAL_SQL, row)
+
+    def save_candle(self, symbol, timeframe, open_time, open_, high, low, close, volume):
+        row = (symbol, timeframe, open_time, open_, high, low, close, volume)
+        self.add(self.CANDLE_SQL, row, key=row[:3])
+
+    def flush(self, timeout=None):
+        """Grava tudo o que está na fila e espera terminar"""
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """Hook de desligamento: grava o pendente e encerra a thread"""
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join()
+
+    def stats(self):
+        rate = self.rows_written / self.flush_time if self.flush_time else 0.0
+        return {'rows_written': self.rows_written, 'flushes': self.flushes,
+                'pending': self.queue.qsize() + self._count, 'rows_per_sec': rate}
+
+    # --- thread de escrita ---
+    def _run(self):
+        try:
+            conn = init_db(self.db_path)
+            conn.execute('PRAGMA synchronous=NORMAL')  # WAL + NORMAL: sem fsync por commit
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute('PRAGMA cache_size=-20000')
+        except Exception as e:
+            self._error = e
+            return
+        finally:
+            self._ready.set()  # __init__ nunca fica esperando, nem com o banco travado
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = ()  # estourou max_delay
+                if item is None:
+                    break
+                if isinstance(item, threading.Event):
+                    self._flush(conn)
+                    item.set()
+                    deadline = self._retry_deadline()
+                    continue
+                if item:
+                    self._enqueue(*item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.max_delay
+                if self._count >= self.max_rows or (deadline and time.monotonic() >= deadline):
+                    self._flush(conn)
+                    deadline = self._retry_deadline()
+        finally:
+            if not self._flush(conn):
+                print(f"❌ {self._count} linhas não gravadas ao encerrar")
+            conn.close()
+
+    def _retry_deadline(self):
+        """Lote que falhou continua pendente: nova tentativa após ``max_delay``"""
+        return time.monotonic() + self.max_delay if self._count else None
+
+    def _enqueue(self, sql, params, key):
+        if key is None:
+            self._pending.setdefault(sql, []).append(params)
+            self._count += 1
+        else:
+            rows = self._pending.setdefault(sql, {})
+            if key not in rows:
+                self._count += 1
+            rows[key] = params
+
+    def _flush(self, conn):
+        """Grava o lote numa transação; se falhar, as linhas ficam para o próximo flush"""
+        if not self._count:
+            return True
+        start = time.perf_counter()
+        try:
+            with conn:  # Uma transação para o lote inteiro
+                for sql, rows in self._pending.items():
+                    conn.executemany(sql, rows.values() if isinstance(rows, dict) else rows)
+        except sqlite3.Error as e:
+            metrics.inc('errors', stage='db_flush')
+            print(f"❌ Erro ao gravar lote ({self._count} linhas, mantidas para nova tentativa): {e}")
+            return False
+        finally:
+            elapsed = time.perf_counter() - start
+            self.flush_time += elapsed
+            metrics.observe('stage_seconds', elapsed, stage='db_flush')
+        self.rows_written += self._count
+        self.flushes += 1
+        metrics.inc('db_rows_written', self._count)
+        self._pending = {}
+        self._count = 0
+        return True
@@ -1,8 +1,25 @@
+import math
+from collections import deque
+
+import numpy as np
 import pandas as pd
 
-def enrich_dataframe(df: pd.DataFrame, config) -> pd.DataFrame:
-    """Calcula indicadores usando apenas Pandas nativo."""
+from kernels import ffill_bfill, get_kernel, params
+
+
+def _backend(config, backend):
+    return backend or getattr(config, 'INDICATOR_BACKEND', 'pandas')
+
+
+def enrich_dataframe(df: pd.DataFrame, config, backend=None) -> pd.DataFrame:
+    """Calcula indicadores (pandas nativo ou kernel de ``Config.INDICATOR_BACKEND``)."""
     df_out = df.copy()
+    kernel = get_kernel(_backend(config, backend))
+    close = df_out['close'].to_numpy(dtype=np.float64)
+    if kernel is not None and not np.isnan(close).any():
+        for col, values in kernel(close[:, None], *params(config)).items():
+            df_out[col] = values[:, 0]
+        return df_out.ffill().bfill().tail(100)
     
     # Bollinger Bands
     df_out['BBM'] = df_out['close'].rolling(window=config.BB_LENGTH).mean()
@@ -30,3 +47,293 @@ def enrich_dataframe(df: pd.DataFrame, config) -> pd.DataFrame:
     df_out['RSI'] = 100 - (100 / (1 + rs))
     
     return df_out.ffill().bfill().tail(100)
+
+
+COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume',
+           'BBM', 'BBU', 'BBL', 'BBP', 'EMA_6', 'EMA_99',
+           'MACD', 'MACD_signal', 'MACD_hist', 'RSI']
+CURRENT_EXTRA = ['_ema_fast', '_ema_slow', '_macd_signal', '_gain', '_loss']  # só na vela em formação
+
+
+def _div(a, b):
+    """Divisão com a mesma semântica do pandas (x/0 -> inf, 0/0 -> NaN)."""
+    if b == 0:
+        if a == 0 or math.isnan(a):
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+class _Ema:
+    """EMA com adjust=False, mesma fórmula do pandas (igual dentro da tolerância de ponto flutuante)."""
+
+    def __init__(self, span):
+        self.alpha = 2.0 / (span + 1.0)
+        self.beta = 1.0 - self.alpha
+        self.value = None  # valor confirmado (última vela fechada)
+
+    def peek(self, x):
+        if self.value is None:
+            return x
+        return (self.beta * self.value + self.alpha * x) / (self.beta + self.alpha)
+
+
+class IndicatorEngine:
+    """Motor incremental: atualiza os indicadores vela a vela, sem recalcular o histórico.
+
+    Mantém o estado das EMAs (O(1) por vela) e janelas circulares para BB/RSI;
+    estas são somadas com ``math.fsum`` a cada vela, O(BB_LENGTH + RSI_LENGTH)
+    (janelas curtas; somas correntes acumulariam erro). Uma vela com
+    o mesmo timestamp da última substitui a vela em formação; um timestamp
+    novo confirma a anterior. Os valores batem com ``enrich_dataframe``
+    dentro da tolerância de ponto flutuante (diferenças da ordem de 1e-14).
+    """
+
+    EMAS = ('ema_6', 'ema_99', 'ema_fast', 'ema_slow', 'macd_signal')
+
+    def __init__(self, config, maxlen=100):
+        self.config = config
+        self.bb_length = config.BB_LENGTH
+        self.bb_std = config.BB_STD
+        self.rsi_length = config.RSI_LENGTH
+
+        self.ema_6 = _Ema(6)
+        self.ema_99 = _Ema(99)
+        self.ema_fast = _Ema(config.MACD_FAST)
+        self.ema_slow = _Ema(config.MACD_SLOW)
+        self.macd_signal = _Ema(config.MACD_SIGNAL)
+
+        # Janelas com as velas confirmadas (a vela atual entra só no cálculo)
+        self.closes = deque(maxlen=max(self.bb_length - 1, 1))
+        self.gains = deque(maxlen=max(self.rsi_length - 1, 1))
+        self.losses = deque(maxlen=max(self.rsi_length - 1, 1))
+        self.prev_close = None
+
+        self.rows = deque(maxlen=maxlen)
+        self.last_valid = {}   # equivalente ao ffill
+        self.current = None    # vela em formação (ainda não confirmada)
+        self.updates = 0       # velas processadas (métricas)
+
+    @property
+    def last_timestamp(self):
+        return self.current['timestamp'] if self.current else None
+
+    def _commit(self):
+        """Confirma a vela atual no estado das EMAs e janelas."""
+        row = self.current
+        close = row['close']
+        self.ema_6.value = row['EMA_6']
+        self.ema_99.value = row['EMA_99']
+        self.ema_fast.value = row['_ema_fast']
+        self.ema_slow.value = row['_ema_slow']
+        self.macd_signal.value = row['_macd_signal']
+        if self.bb_length > 1:
+            self.closes.append(close)
+        if self.rsi_length > 1:
+            self.gains.append(row['_gain'])
+            self.losses.append(row['_loss'])
+        self.prev_close = close
+        for col in COLUMNS[6:]:
+            if not math.isnan(row[col]):
+                self.last_valid[col] = row[col]
+
+    def _window(self, committed, value, length):
+        if length == 1:
+            return [value]
+        if len(committed) < length - 1:
+            return None
+        return list(committed) + [value]
+
+    def update(self, timestamp, open_, high, low, close, volume):
+        """Processa uma vela (fechada ou em formação) e retorna a linha calculada."""
+        if self.current is not None:
+            if timestamp == self.current['timestamp']:
+                self.rows.pop()
+            elif timestamp > self.current['timestamp']:
+                self._commit()
+            else:
+                raise ValueError(f"Vela fora de ordem: {timestamp}")
+
+        self.updates += 1
+        close = float(close)
+        row = {'timestamp': timestamp, 'open': float(open_), 'high': float(high),
+               'low': float(low), 'close': close, 'volume': float(volume)}
+
+        # Bollinger Bands
+        window = self._window(self.closes, close, self.bb_length)
+        if window is None:
+            bbm = bbu = bbl = bbp = math.nan
+        else:
+            n = len(window)
+            bbm = math.fsum(window) / n
+            std = math.sqrt(math.fsum((x - bbm) ** 2 for x in window) / (n - 1)) if n > 1 else math.nan
+            bbu = bbm + self.bb_std * std
+            bbl = bbm - self.bb_std * std
+            bbp = _div(close - bbl, bbu - bbl)
+        row.update(BBM=bbm, BBU=bbu, BBL=bbl, BBP=bbp)
+
+        # EMAs
+        row['EMA_6'] = self.ema_6.peek(close)
+        row['EMA_99'] = self.ema_99.peek(close)
+
+        # MACD
+        row['_ema_fast'] = self.ema_fast.peek(close)
+        row['_ema_slow'] = self.ema_slow.peek(close)
+        macd = row['_ema_fast'] - row['_ema_slow']
+        row['_macd_signal'] = self.macd_signal.peek(macd)
+        row['MACD'] = macd
+        row['MACD_signal'] = row['_macd_signal']
+        row['MACD_hist'] = macd - row['_macd_signal']
+
+        # RSI (primeira vela tem delta NaN, que o pandas trata como 0)
+        delta = 0.0 if self.prev_close is None else close - self.prev_close
+        row['_gain'] = delta if delta > 0 else 0.0
+        row['_loss'] = -delta if delta < 0 else 0.0
+        gains = self._window(self.gains, row['_gain'], self.rsi_length)
+        losses = self._window(self.losses, row['_loss'], self.rsi_length)
+        if gains is None:
+            row['RSI'] = math.nan
+        else:
+            rs = _div(math.fsum(gains) / len(gains), math.fsum(losses) / len(losses))
+            row['RSI'] = 100 - _div(100, 1 + rs)
+
+        self.current = row
+        self.rows.append(self._filled(row))
+        return self.rows[-1]
+
+    def _filled(self, row):
+        out = {col: row[col] for col in COLUMNS}
+        for col in COLUMNS[6:]:
+            if math.isnan(out[col]) and col in self.last_valid:
+                out[col] = self.last_valid[col]
+        return out
+
+    def seed(self, df):
+        """Alimenta o motor com as velas de um DataFrame OHLCV (ordem crescente)."""
+        last = self.last_timestamp
+        cols = [df[c].tolist() for c in ('timestamp', 'open', 'high', 'low', 'close', 'volume')]
+        for values in zip(*cols):
+            if last is None or values[0] >= last:
+                self.update(*values)
+        return self
+
+    def latest(self):
+        """Última linha calculada (dict) sem montar DataFrame."""
+        return self.rows[-1] if self.rows else None
+
+    def to_frame(self):
+        """DataFrame no mesmo formato de ``enrich_dataframe``."""
+        df = pd.DataFrame(list(self.rows), columns=COLUMNS)
+        return df.bfill()
+
+    # --- estado explícito (tipos simples, serializável em JSON) ---
+    def state(self):
+        """EMAs confirmadas, janelas, últimas linhas e vela em formação (timestamps em ns)."""
+        def plain(row):
+            return {**row, 'timestamp': row['timestamp'].value}
+        return {
+            'emas': {name: getattr(self, name).value for name in self.EMAS},
+            'closes': list(self.closes), 'gains': list(self.gains), 'losses': list(self.losses),
+            'prev_close': self.prev_close,
+            'rows': [plain(row) for row in self.rows],
+            'last_valid': dict(self.last_valid),
+            'current': plain(self.current) if self.current else None,
+            'updates': self.updates,
+        }
+
+    @classmethod
+    def from_state(cls, config, state, maxlen=100):
+        """Motor novo com o estado de ``state()``; KeyError/TypeError/ValueError se estiver malformado."""
+        def row(values, keys):
+            if set(values) != set(keys):
+                raise ValueError(f"Linha com colunas inesperadas: {sorted(values)}")
+            return {k: pd.Timestamp(int(values[k])) if k == 'timestamp' else float(values[k]) for k in keys}
+
+        engine = cls(config, maxlen)
+        for name in cls.EMAS:
+            value = state['emas'][name]
+            getattr(engine, name).value = None if value is None else float(value)
+        for name in ('closes', 'gains', 'losses'):
+            getattr(engine, name).extend(float(x) for x in state[name])
+        engine.prev_close = None if state['prev_close'] is None else float(state['prev_close'])
+        engine.rows.extend(row(r, COLUMNS) for r in state['rows'])
+        engine.last_valid = {col: float(state['last_valid'][col]) for col in state['last_valid']
+                             if col in COLUMNS[6:]}
+        if state['current'] is not None:
+            engine.current = row(state['current'], COLUMNS + CURRENT_EXTRA)
+        engine.updates = int(state['updates'])
+        return engine
+
+
+_engines = {}
+
+
+def get_engine(symbol, interval, config, maxlen=100):
+    """Retorna (criando se preciso) o motor de um par símbolo/timeframe."""
+    key = (symbol, interval)
+    if key not in _engines:
+        _engines[key] = IndicatorEngine(config, maxlen)
+    return _engines[key]
+
+
+def register_engine(symbol, interval, engine):
+    """Instala um motor já pronto (ex.: restaurado de um snapshot)."""
+    _engines[(symbol, interval)] = engine
+
+
+def drop_engines(symbol):
+    """Descarta os motores de um símbolo (ex.: passou para outro processo)."""
+    for key in [k for k in _engines if k[0] == symbol]:
+        del _engines[key]
+
+
+def bollinger_matrix(c, length, std_mult):
+    """BBM/BBU/BBL/BBP sobre um DataFrame (velas x símbolos)"""
+    bbm = c.rolling(window=length).mean()
+    std = c.rolling(window=length).std()
+    bbu = bbm + (std_mult * std)
+    bbl = bbm - (std_mult * std)
+    return {'BBM': bbm, 'BBU': bbu, 'BBL': bbl, 'BBP': (c - bbl) / (bbu - bbl)}
+
+
+def ema_matrix(c):
+    """EMA_6/EMA_99 sobre um DataFrame (velas x símbolos)"""
+    return {'EMA_6': c.ewm(span=6, adjust=False).mean(),
+            'EMA_99': c.ewm(span=99, adjust=False).mean()}
+
+
+def macd_matrix(c, fast, slow, signal):
+    """MACD/MACD_signal/MACD_hist sobre um DataFrame (velas x símbolos)"""
+    macd = c.ewm(span=fast, adjust=False).mean() - c.ewm(span=slow, adjust=False).mean()
+    macd_signal = macd.ewm(span=signal, adjust=False).mean()
+    return {'MACD': macd, 'MACD_signal': macd_signal, 'MACD_hist': macd - macd_signal}
+
+
+def rsi_matrix(c, length):
+    """RSI (médias simples de ganhos/perdas) sobre um DataFrame (velas x símbolos)"""
+    delta = c.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=length).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=length).mean()
+    return {'RSI': 100 - (100 / (1 + gain / loss))}
+
+
+def enrich_matrix(close, config, backend=None):
+    """Indicadores para vários símbolos de uma vez.
+
+    ``close`` é uma matriz (velas x símbolos). Cada indicador roda uma única
+    vez sobre a matriz empilhada, em vez de um ``enrich_dataframe`` por
+    símbolo. Retorna dict coluna -> matriz, com o mesmo ffill/bfill.
+    Closes com NaN seguem pelo pandas (os kernels assumem séries completas).
+    """
+    kernel = get_kernel(_backend(config, backend))
+    close = np.asarray(close, dtype=np.float64)
+    if kernel is not None and not np.isnan(close).any():
+        out = {k: ffill_bfill(v) for k, v in kernel(close, *params(config)).items()}
+        return {'close': close, **out}
+    c = pd.DataFrame(close)
+    out = {'close': c}
+    out.update(bollinger_matrix(c, config.BB_LENGTH, config.BB_STD))
+    out.update(ema_matrix(c))
+    out.update(macd_matrix(c, config.MACD_FAST, config.MACD_SLOW, config.MACD_SIGNAL))
+    out.update(rsi_matrix(c, config.RSI_LENGTH))
+    return {k: v.ffill().bfill().to_numpy() for k, v in out.items()}
@@ -0,0 +1,192 @@
+"""
+Ingestão contínua de klines (asyncio) - substitui o polling REST por execução.
+
+Faz o backfill UMA vez via REST e depois consome um único stream de kline
+da Binance (Config.BASE_TIMEFRAME); os demais Config.TIMEFRAMES são
+agregados dele (resampler.py), mantendo as velas em memória (motores
+incrementais de indicators.py). A estratégia roda a cada fechamento de
+vela do timeframe rápido.
+
+Para testes, aponte BINANCE_REST_URL / BINANCE_WS_URL para um servidor local.
+"""
+import asyncio
+import inspect
+import logging
+import time
+
+import pandas as pd
+import requests
+
+import metrics
+from config import Config
+from database import interval_ms
+from klines import FIELDS, loads
+from resampler import TimeframeSet, history_start
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+logger = logging.getLogger(__name__)
+
+
+class KlineIngestor:
+    def __init__(self, config=Config, symbol=None, on_close=None, limit=150, writer=None, on_tick=None):
+        self.config = config
+        self.symbol = symbol or config.SYMBOL
+        self.timeframes = TimeframeSet(self.symbol, config)
+        self.base = self.timeframes.base
+        self.intervals = self.timeframes.intervals
+        self.on_close = on_close
+        self.on_tick = on_tick  # chamado a cada vela base aplicada (inclusive em formação)
+        self.limit = limit  # velas do maior timeframe na carga inicial
+        self.writer = writer  # database.BatchWriter opcional: persiste cada vela base
+        self.running = False
+        self.ws = None
+
+    def engine(self, interval):
+        return self.timeframes.engine(interval)
+
+    def frames(self):
+        """Snapshot atual de cada timeframe (mesmo formato de enrich_dataframe)"""
+        return self.timeframes.frames()
+
+    def rows(self):
+        """Últimas linhas de cada timeframe, sem montar DataFrames (entrada da estratégia)"""
+        return self.timeframes.rows()
+
+    def _backfill(self):
+        from monitor import iter_klines, klines_to_frame
+        now_ms = int(time.time() * 1000)
+        start = self.timeframes.last_open_time
+        if start is None:
+            start = history_start(now_ms, self.intervals, self.limit)
+        pages = list(iter_klines(self.symbol, self.base, start, now_ms + interval_ms(self.base)))
+        if not pages:
+            return
+        self.timeframes.seed(pd.concat([klines_to_frame(page) for page in pages], ignore_index=True))
+        if self.writer:
+            for page in pages:
+                for row in zip(*(page[f].tolist() for f in FIELDS)):
+                    self.writer.save_candle(self.symbol, self.base, *row)
+
+    async def backfill(self):
+        """Carga inicial (e reposição de lacunas após reconexão) via REST"""
+        await asyncio.to_thread(self._backfill)
+        if self.on_tick:
+            self.on_tick(self)
+        logger.info(f"📥 Backfill {self.symbol}: {self.base} → {', '.join(self.intervals)}")
+
+    def stream_url(self):
+        return f"{self.config.WS_URL}/stream?streams={self.symbol.lower()}@kline_{self.base}"
+
+    def handle_message(self, raw):
+        """Aplica uma mensagem de kline base; retorna os timeframes cuja vela fechou"""
+        msg = loads(raw)
+        k = msg.get('data', msg).get('k')
+        if not k or k.get('i') != self.base:
+            return []
+        with metrics.span('indicators'):
+            bars = self.timeframes.update(k['t'], k['o'], k['h'], k['l'], k['c'], k['v'])
+        for interval in bars:
+            metrics.inc('candles_processed', timeframe=interval)
+        if self.writer:
+            self.writer.save_candle(self.symbol, self.base, k['t'], float(k['o']), float(k['h']),
+                                    float(k['l']), float(k['c']), float(k['v']))
+        if self.on_tick:
+            self.on_tick(self)
+        return self.timeframes.closing(k['t']) if k.get('x') else []
+
+    async def _dispatch(self, interval):
+        if not self.on_close:
+            return
+        result = self.on_close(interval, self)
+        if inspect.isawaitable(result):
+            await result
+
+    async def run(self):
+        if websockets is None:
+            raise RuntimeError("Pacote 'websockets' não instalado (pip install websockets)")
+        self.running = True
+        await self.backfill()
+        backoff = 1
+        while self.running:
+            try:
+                async with websockets.connect(self.stream_url()) as ws:
+                    self.ws = ws
+                    backoff = 1
+                    logger.info(f"🔌 Stream conectado: {self.stream_url()}")
+                    async for raw in ws:
+                        for interval in self.handle_message(raw):
+                            await self._dispatch(interval)
+            except (OSError, websockets.ConnectionClosed) as e:
+                logger.warning(f"⚠️ Stream caiu ({e}), reconectando em {backoff}s")
+            finally:
+                self.ws = None
+            if not self.running:
+                break
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+            try:
+                await self.backfill()  # Repõe velas perdidas durante a queda
+            except requests.RequestException as e:
+                logger.warning(f"⚠️ Backfill falhou: {e}")
+
+    async def stop(self):
+        self.running = False
+        if self.ws is not None:
+            await self.ws.close()
+
+
+async def run_until(ingestor, stop):
+    """Roda o ingestor até ``stop`` (threading.Event) ser sinalizado (ou o ingestor falhar)"""
+    task = asyncio.ensure_future(ingestor.run())
+    waiter = asyncio.ensure_future(asyncio.to_thread(stop.wait))
+    await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+    if not task.done():
+        await ingestor.stop()
+    await task
+
+
+def main(stop=None):
+    """Ingestão contínua com a estratégia; ``stop`` (threading.Event) encerra (ver replay.py)"""
+    from database import BatchWriter, init_db, get_order_state, last_signal, signal_row
+    from monitor import evaluate, indicator_snapshot, signal_time
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    conn = init_db()
+    state = {'pos': get_order_state(conn), 'last': last_signal(conn, Config.SYMBOL)}
+    conn.close()
+    writer = BatchWriter()
+    if Config.METRICS_PORT:
+        metrics.serve(Config.METRICS_PORT)
+        logger.info(f"📈 Métricas em http://127.0.0.1:{Config.METRICS_PORT}/metrics")
+
+    def on_close(interval, ingestor):
+        # Avalia a estratégia a cada fechamento do timeframe rápido
+        if interval != Config.TIMEFRAMES['fast']:
+            return
+        rows = ingestor.rows()
+        new_pos, reason = evaluate(rows, state['pos'], ingestor.symbol)
+        # Última linha do livro fica em memória: a gravação segue em lote
+        state['last'] = signal_row(ingestor.symbol, signal_time(rows), state['pos'], new_pos,
+                                   rows['fast'][-1]['close'], reason, indicator_snapshot(rows),
+                                   prev=state['last'])
+        writer.save_signal(state['last'])
+        if new_pos != state['pos']:
+            writer.set_order_state(new_pos)
+            state['pos'] = new_pos
+
+    try:
+        ingestor = KlineIngestor(Config, on_close=on_close, writer=writer)
+        asyncio.run(ingestor.run() if stop is None else run_until(ingestor, stop))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+        logger.info(f"💾 Escritas: {writer.stats()}")
+
+
+if __name__ == "__main__":
+    main()
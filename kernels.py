@@ -0,0 +1,308 @@
+"""
+Kernels numéricos dos indicadores (alternativas ao caminho pandas).
+
+``enrich_matrix``/``enrich_dataframe`` (indicators.py) escolhem o backend
+por ``Config.INDICATOR_BACKEND``:
+
+    pandas  cada indicador como operações do pandas (implementação original)
+    numpy   um kernel NumPy para a matriz (velas x símbolos) inteira: EMAs em
+            blocos vetorizados, janelas de BB/RSI somadas por fatias
+    numba   um único laço compilado por símbolo que calcula todas as colunas
+            de uma vez (só se o numba estiver instalado; senão usa numpy)
+
+Os kernels recebem closes sem NaN e devolvem as colunas ainda sem o
+ffill/bfill; quem chama aplica o preenchimento (``ffill_bfill``).
+
+Uso:
+    python kernels.py           # confere equivalência com o pandas e mede
+    pytest tests/test_kernels.py
+"""
+import argparse
+import importlib.util
+import logging
+import math
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ('BBM', 'BBU', 'BBL', 'BBP', 'EMA_6', 'EMA_99', 'MACD', 'MACD_signal', 'MACD_hist', 'RSI')
+EMA_BLOCK = 4096  # máximo de velas por bloco na EMA vetorizada
+
+
+def params(config):
+    """Parâmetros dos kernels tirados da config"""
+    return (config.BB_LENGTH, float(config.BB_STD), config.MACD_FAST, config.MACD_SLOW,
+            config.MACD_SIGNAL, config.RSI_LENGTH)
+
+
+def ffill_bfill(a):
+    """ffill().bfill() ao longo das velas (eixo 0), como no pandas"""
+    n = len(a)
+    nan = np.isnan(a)
+    if not n or not nan.any():
+        return a
+    # Caso comum: NaN só no aquecimento (início) -> repete o primeiro valor válido
+    lead = (~nan).argmax(axis=0)
+    if (nan.sum(axis=0) == lead).all():
+        first = np.take_along_axis(a, lead[None], axis=0)
+        return np.where(np.arange(n).reshape((-1,) + (1,) * (a.ndim - 1)) < lead, first, a)
+    idx = np.where(nan, 0, np.arange(n)[:, None])
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    a = np.take_along_axis(a, idx, axis=0)
+    idx = np.where(np.isnan(a), n - 1, np.arange(n)[:, None])
+    idx = np.minimum.accumulate(idx[::-1], axis=0)[::-1]
+    return np.take_along_axis(a, idx, axis=0)
+
+
+# --- numpy ---
+def ema(x, span):
+    """EMA adjust=False ao longo do eixo 0 de uma matriz (velas x símbolos)
+
+    A recorrência y[t] = b*y[t-1] + a*x[t] é resolvida em blocos: dentro de
+    cada bloco y = b^j * (y0 + a * cumsum(x / b^i)), sem laço por vela.
+    """
+    alpha = 2.0 / (span + 1.0)
+    beta = 1.0 - alpha
+    out = np.empty_like(x)
+    if not len(x):
+        return out
+    if beta <= 0:
+        out[:] = x
+        return out
+    # b^-bloco (vezes o preço, somado no bloco) precisa caber num float64
+    block = min(EMA_BLOCK, max(1, int(200 / -math.log10(beta)))) if beta < 1 else EMA_BLOCK
+    powers = beta ** np.arange(1, min(block, len(x)) + 1)
+    if x.ndim > 1:
+        powers = powers.reshape((-1,) + (1,) * (x.ndim - 1))
+    out[0] = x[0]
+    for start in range(1, len(x), block):
+        chunk = x[start:start + block]
+        p = powers[:len(chunk)]
+        acc = np.cumsum(chunk / p, axis=0)
+        out[start:start + len(chunk)] = p * (out[start - 1] + alpha * acc)
+    return out
+
+
+def _rolling(x, length, with_std=False):
+    """Média (e desvio amostral) em janelas de ``length`` velas; NaN antes de completar
+
+    Soma as ``length`` fatias deslocadas (contíguas) em vez de reduzir uma
+    visão em janelas; o desvio é em duas passadas, sem cancelamento.
+    """
+    mean = np.full_like(x, np.nan)
+    std = np.full_like(x, np.nan) if with_std else None
+    count = len(x) - length + 1
+    if count > 0:
+        acc = x[:count].copy()
+        for k in range(1, length):
+            acc += x[k:k + count]
+        acc /= length
+        mean[length - 1:] = acc
+        if with_std and length > 1:
+            sq = np.zeros_like(acc)
+            d = np.empty_like(acc)
+            for k in range(length):
+                np.subtract(x[k:k + count], acc, out=d)
+                np.multiply(d, d, out=d)
+                sq += d
+            std[length - 1:] = np.sqrt(sq / (length - 1))
+    return mean, std
+
+
+def numpy_indicators(close, bb_length, bb_std, macd_fast, macd_slow, macd_signal, rsi_length):
+    """Todas as colunas de indicadores para uma matriz de closes (velas x símbolos)"""
+    close = np.asarray(close, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bbm, std = _rolling(close, bb_length, with_std=True)
+        bbu = bbm + bb_std * std
+        bbl = bbm - bb_std * std
+        out = {'BBM': bbm, 'BBU': bbu, 'BBL': bbl, 'BBP': (close - bbl) / (bbu - bbl)}
+
+        out['EMA_6'] = ema(close, 6)
+        out['EMA_99'] = ema(close, 99)
+        macd = ema(close, macd_fast) - ema(close, macd_slow)
+        signal = ema(macd, macd_signal)
+        out.update(MACD=macd, MACD_signal=signal, MACD_hist=macd - signal)
+
+        # Primeira vela tem delta NaN, que o pandas trata como 0
+        delta = np.zeros_like(close)
+        np.subtract(close[1:], close[:-1], out=delta[1:])
+        gain, _ = _rolling(np.maximum(delta, 0.0), rsi_length)
+        loss, _ = _rolling(np.maximum(-delta, 0.0), rsi_length)
+        out['RSI'] = 100 - 100 / (1 + gain / loss)
+    return out
+
+
+# --- numba (um laço só, todas as colunas) ---
+def _div(a, b):
+    """Divisão com a semântica do pandas (x/0 -> ±inf, 0/0 -> NaN)"""
+    if b == 0.0:
+        if a == 0.0 or a != a:
+            return np.nan
+        return math.copysign(np.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+def _make_fused(div):
+    """Laço de todas as colunas usando ``div`` (no numba, a versão compilada de _div)"""
+    def fused(close, bb_length, bb_std, macd_fast, macd_slow, macd_signal, rsi_length, out):
+        """Preenche ``out`` (colunas x velas x símbolos, ordem de COLUMNS) vela a vela"""
+        n, m = close.shape
+        a6, a99 = 2.0 / 7.0, 2.0 / 100.0
+        af, aslow, asig = 2.0 / (macd_fast + 1.0), 2.0 / (macd_slow + 1.0), 2.0 / (macd_signal + 1.0)
+        for j in range(m):
+            e6 = e99 = ef = es = sig = 0.0
+            for t in range(n):
+                x = close[t, j]
+                # Bollinger (duas passadas na janela, como o desvio do pandas)
+                if t + 1 >= bb_length:
+                    s = 0.0
+                    for k in range(t + 1 - bb_length, t + 1):
+                        s += close[k, j]
+                    mean = s / bb_length
+                    if bb_length > 1:
+                        sq = 0.0
+                        for k in range(t + 1 - bb_length, t + 1):
+                            d = close[k, j] - mean
+                            sq += d * d
+                        std = math.sqrt(sq / (bb_length - 1))
+                    else:
+                        std = np.nan
+                    upper, lower = mean + bb_std * std, mean - bb_std * std
+                    out[0, t, j], out[1, t, j], out[2, t, j] = mean, upper, lower
+                    out[3, t, j] = div(x - lower, upper - lower)
+                else:
+                    out[0, t, j] = out[1, t, j] = out[2, t, j] = out[3, t, j] = np.nan
+                # EMAs / MACD
+                if t == 0:
+                    e6 = e99 = ef = es = x
+                    sig = 0.0
+                else:
+                    e6 = (1 - a6) * e6 + a6 * x
+                    e99 = (1 - a99) * e99 + a99 * x
+                    ef = (1 - af) * ef + af * x
+                    es = (1 - aslow) * es + aslow * x
+                macd = ef - es
+                sig = macd if t == 0 else (1 - asig) * sig + asig * macd
+                out[4, t, j], out[5, t, j] = e6, e99
+                out[6, t, j], out[7, t, j], out[8, t, j] = macd, sig, macd - sig
+                # RSI (médias simples de ganhos/perdas)
+                if t + 1 >= rsi_length:
+                    g = l = 0.0
+                    for k in range(t + 1 - rsi_length, t + 1):
+                        d = close[k, j] - close[k - 1, j] if k > 0 else 0.0
+                        if d > 0:
+                            g += d
+                        elif d < 0:
+                            l -= d
+                    out[9, t, j] = 100.0 - div(100.0, 1.0 + div(g / rsi_length, l / rsi_length))
+                else:
+                    out[9, t, j] = np.nan
+
+    return fused
+
+
+_fused = _make_fused(_div)  # versão Python (referência; lenta)
+
+
+_compiled = None
+
+
+def numba_indicators(close, bb_length, bb_std, macd_fast, macd_slow, macd_signal, rsi_length):
+    """Mesmo resultado de numpy_indicators, via laço compilado (compila no primeiro uso)"""
+    global _compiled
+    if _compiled is None:
+        import numba  # só importado (e o kernel compilado) se o backend for usado
+        _compiled = numba.njit(_make_fused(numba.njit(_div)))
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    out = np.empty((len(COLUMNS),) + close.shape)
+    _compiled(close, bb_length, bb_std, macd_fast, macd_slow, macd_signal, rsi_length, out)
+    return dict(zip(COLUMNS, out))
+
+
+BACKENDS = {'numpy': numpy_indicators}
+if importlib.util.find_spec('numba') is not None:
+    BACKENDS['numba'] = numba_indicators
+
+
+_warned = set()
+
+
+def get_kernel(name):
+    """Kernel do backend ``name``; None para 'pandas' (caminho original)"""
+    if name == 'pandas':
+        return None
+    if name == 'numba' and name not in BACKENDS:
+        if 'numba' not in _warned:
+            logger.warning("⚠️ numba não instalado; indicadores no backend numpy")
+            _warned.add('numba')
+        name = 'numpy'
+    if name not in BACKENDS:
+        raise ValueError(f"Backend de indicadores desconhecido: {name} (pandas, numpy, numba)")
+    return BACKENDS[name]
+
+
+# --- equivalência / micro-benchmark ---
+def check(kernel, close, config, rtol=1e-9, atol=1e-9):
+    """Compara um kernel (com ffill/bfill) ao pandas; retorna {coluna: maior erro}
+
+    O desvio móvel do pandas é calculado de forma incremental e, com janelas
+    quase constantes, acumula erro da ordem de 1e-8 do preço (o kernel
+    recalcula cada janela). Por isso as bandas têm tolerância relativa ao
+    preço, propagada ao BBP pela largura da banda, e o BBP só é comparado
+    onde essa largura supera o ruído.
+    """
+    from indicators import enrich_matrix
+    expected = enrich_matrix(close, config, backend='pandas')
+    got = {k: ffill_bfill(v) for k, v in kernel(close, *params(config)).items()}
+    scale = np.abs(close)
+    width = expected['BBU'] - expected['BBL']
+    errors = {}
+    for col in COLUMNS:
+        a, b = expected[col], got[col]
+        tol = atol + rtol * np.abs(a)
+        if col in ('BBM', 'BBU', 'BBL'):
+            tol = tol + 1e-6 * scale
+        elif col == 'BBP':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                tol = tol + 1e-6 * scale / np.abs(width)
+        err = np.abs(a - b)
+        bad = ~((err <= tol) | (np.isnan(a) & np.isnan(b)))
+        if col == 'BBP':
+            bad &= width > 1e-4 * scale
+        if bad.any():
+            errors[col] = float(np.nanmax(np.where(bad, err, np.nan)))
+    return errors
+
+
+def main():
+    from benchmarks import random_walk_matrix
+    from config import Config
+    from indicators import enrich_matrix
+
+    parser = argparse.ArgumentParser(description="Equivalência e tempo dos backends de indicadores")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    cases = {'scanner (150 x 500)': (150, 500), 'backtest (100000 x 1)': (100_000, 1),
+             'poucas velas (10 x 3)': (10, 3)}
+    for label, (n, symbols) in cases.items():
+        close = random_walk_matrix(n, symbols)[:, :, 3]
+        print(f"\n{label}")
+        for name in ('pandas', *BACKENDS):
+            # Também com preços arredondados (janelas constantes, bandas nulas)
+            errors = {} if name == 'pandas' else {
+                k: v for data in (close, np.round(close, 1)) for k, v in check(BACKENDS[name], data, Config).items()}
+            enrich_matrix(close, Config, backend=name)  # aquecimento (e compilação do numba)
+            best = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                enrich_matrix(close, Config, backend=name)
+                best = min(best, time.perf_counter() - start)
+            print(f"  {name:<8} {best * 1e3:9.2f} ms" + (f"  ⚠️ diverge do pandas: {errors}" if errors else ''))
+
+
+if __name__ == "__main__":
+    main()
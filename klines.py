@@ -0,0 +1,146 @@
+"""
+Decodificação rápida da resposta de /api/v3/klines.
+
+A Binance devolve cada vela como uma lista de 12 campos, quase todos
+strings. Em vez de montar um DataFrame de objetos e converter coluna a
+coluna, os bytes da resposta viram direto arrays contíguos (int64 para
+open_time, float64 para OHLCV): os separadores JSON são trocados por
+espaços e o NumPy lê todos os números de uma vez.
+
+Se o corpo não tiver o formato esperado, cai no parser JSON (orjson quando
+instalado, senão o json da biblioteca padrão).
+
+Uso:
+    python klines.py            # micro-benchmark contra o caminho antigo
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    orjson = None
+    loads = json.loads
+
+FIELDS = ('open_time', 'open', 'high', 'low', 'close', 'volume')
+ROW_WIDTH = 12  # campos por vela na resposta da Binance
+_STRIP = bytes.maketrans(b'[]"', b'   ')
+
+
+def _from_rows(rows):
+    """Caminho genérico: lista de velas já decodificada do JSON"""
+    n = len(rows)
+    out = {'open_time': np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)}
+    values = np.array([r[1:6] for r in rows], dtype=np.float64).reshape(n, 5)
+    for i, field in enumerate(FIELDS[1:]):
+        out[field] = np.ascontiguousarray(values[:, i])
+    return out
+
+
+def _from_bytes(raw):
+    """Caminho rápido: lê os números direto do texto; None se o formato não bater"""
+    rows = raw.count(b'[') - 1
+    if rows <= 0:
+        return None
+    try:
+        flat = np.fromstring(raw.translate(_STRIP), sep=',')
+    except ValueError:
+        return None
+    if flat.size != rows * ROW_WIDTH:
+        return None
+    table = flat.reshape(rows, ROW_WIDTH)
+    out = {'open_time': table[:, 0].astype(np.int64)}
+    for i, field in enumerate(FIELDS[1:], start=1):
+        out[field] = np.ascontiguousarray(table[:, i])
+    return out
+
+
+def decode_klines(payload):
+    """Arrays {open_time, open, high, low, close, volume} a partir dos bytes da resposta
+
+    Aceita também str ou a lista já decodificada (ex.: ``resp.json()``).
+    """
+    if isinstance(payload, str):
+        payload = payload.encode()
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        out = _from_bytes(bytes(payload))
+        if out is not None:
+            return out
+        payload = loads(payload)
+    if not payload:
+        return {f: np.empty(0, dtype=np.int64 if f == 'open_time' else np.float64) for f in FIELDS}
+    return _from_rows(payload)
+
+
+def to_frame(arrays):
+    """DataFrame OHLCV (timestamp datetime64) no formato usado pelos indicadores"""
+    df = pd.DataFrame({f: arrays[f] for f in FIELDS[1:]}, copy=False)
+    df.insert(0, 'timestamp', pd.to_datetime(arrays['open_time'], unit='ms'))
+    return df
+
+
+# --- micro-benchmark ---
+def _sample_payload(n, start=1_700_000_000_000, step=60_000):
+    rng = np.random.default_rng(0)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.001, n))
+    rows = [[start + i * step, f"{c:.8f}", f"{c * 1.001:.8f}", f"{c * 0.999:.8f}", f"{c:.8f}",
+             f"{v:.8f}", start + (i + 1) * step - 1, "0.0", 0, "0.0", "0.0", "0"]
+            for i, (c, v) in enumerate(zip(close, rng.uniform(10, 1000, n)))]
+    return json.dumps(rows, separators=(',', ':')).encode()
+
+
+def _legacy(raw):
+    """Caminho antigo de monitor.fetch_data"""
+    df = pd.DataFrame(json.loads(raw), columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_volume', 'trades', 'taker_buy_base', 'taker_buy_quote', 'ignore'])
+    df = df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].astype(float)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return df
+
+
+def _best(fn, arg, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(sizes=(1_000, 100_000), repeat=5):
+    """Tempo (melhor de ``repeat``) de cada caminho, em segundos, por tamanho"""
+    cases = {
+        'legacy (json + DataFrame + astype)': _legacy,
+        'decode_klines (bytes)': decode_klines,
+        f"decode_klines (lista via {'orjson' if orjson else 'json'})": lambda raw: decode_klines(loads(raw)),
+        'decode_klines + to_frame': lambda raw: to_frame(decode_klines(raw)),
+    }
+    results = {}
+    for n in sizes:
+        raw = _sample_payload(n)
+        expected = _legacy(raw)
+        got = to_frame(decode_klines(raw))
+        assert expected.equals(got), "decodificação diverge do caminho antigo"
+        results[n] = {name: _best(fn, raw, repeat) for name, fn in cases.items()}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark do decodificador de klines")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for n, timings in benchmark(args.sizes, args.repeat).items():
+        base = timings['legacy (json + DataFrame + astype)']
+        print(f"\n{n} velas")
+        for name, t in timings.items():
+            print(f"  {name:<40} {t * 1e3:9.2f} ms  {base / t:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Métricas do pipeline: tempo por etapa (p50/p95/p99) e contadores.
+
+    with span('fetch'):            # mede uma etapa
+        ...
+    inc('signals', side='LONG')    # contador com labels
+
+Exposto em formato Prometheus (``serve(porta)`` -> /metrics e
+/metrics.json) e exportável em JSON (``dump(caminho)``).
+"""
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = 'sol_monitor'
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+class Summary:
+    """Contagem/soma totais + janela das últimas amostras para os quantis"""
+
+    def __init__(self, window=4096):
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: math.nan for q in QUANTILES}
+        return {q: ordered[min(int(q * len(ordered)), len(ordered) - 1)] for q in QUANTILES}
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.summaries = {}
+        self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            summary = self.summaries.get(key)
+            if summary is None:
+                summary = self.summaries[key] = Summary()
+            summary.observe(value)
+
+    @contextmanager
+    def span(self, stage):
+        """Mede a duração de uma etapa do pipeline"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=stage)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.summaries.clear()
+
+    # --- exportação ---
+    def snapshot(self):
+        def fmt(name, labels):
+            return name + ('{' + ','.join(f'{k}={v}' for k, v in labels) + '}' if labels else '')
+
+        with self.lock:
+            return {
+                'uptime_seconds': time.time() - self.started,
+                'counters': {fmt(*k): v for k, v in self.counters.items()},
+                'gauges': {fmt(*k): v for k, v in self.gauges.items()},
+                'latency': {fmt(*k): {'count': s.count, 'sum': s.sum,
+                                      **{f'p{int(q * 100)}': v for q, v in s.quantiles().items()}}
+                            for k, s in self.summaries.items()},
+            }
+
+    def render_prometheus(self):
+        lines = []
+        with self.lock:
+            for kind, metrics, suffix in (('counter', self.counters, '_total'), ('gauge', self.gauges, '')):
+                seen = set()
+                for (name, labels), value in sorted(metrics.items()):
+                    full = f'{PREFIX}_{name}{suffix}'
+                    if full not in seen:
+                        lines.append(f'# TYPE {full} {kind}')
+                        seen.add(full)
+                    lines.append(f'{full}{_labels(labels)} {value}')
+            seen = set()
+            for (name, labels), s in sorted(self.summaries.items()):
+                full = f'{PREFIX}_{name}'
+                if full not in seen:
+                    lines.append(f'# TYPE {full} summary')
+                    seen.add(full)
+                for q, v in s.quantiles().items():
+                    lines.append(f'{full}{_labels(labels, [("quantile", q)])} {v}')
+                lines.append(f'{full}_sum{_labels(labels)} {s.sum}')
+                lines.append(f'{full}_count{_labels(labels)} {s.count}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2, ensure_ascii=False)
+
+    def serve(self, port, host='127.0.0.1'):
+        """Sobe o endpoint HTTP (/metrics e /metrics.json) numa thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics.json'):
+                    body = json.dumps(registry.snapshot(), ensure_ascii=False).encode()
+                    ctype = 'application/json'
+                elif self.path.startswith('/metrics'):
+                    body = registry.render_prometheus().encode()
+                    ctype = 'text/plain; version=0.0.4; charset=utf-8'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+        return server
+
+
+registry = Registry()
+inc = registry.inc
+set_gauge = registry.set
+observe = registry.observe
+span = registry.span
+dump = registry.dump
+serve = registry.serve
@@ -1,27 +1,198 @@
 import os
 import sqlite3
+import time
 import pandas as pd
 import requests
 from config import Config
-from indicators import enrich_dataframe
-from strategy import check_long_entry, check_short_entry
-from database import init_db, save_data, get_last_rsi, set_order_state  # ← Use funções do database.py
+import metrics
+from klines import decode_klines, to_frame
+from resampler import discard_state, drop_timeframes, get_timeframes, history_start
+from strategy import StrategyRuntime, reason_key
+from database import (init_db, save_data, get_last_rsi, get_order_state, set_order_state,  # ← Use funções do database.py
+                      save_candles, load_candles, last_open_time, find_gaps, interval_ms, record_signal)
 
 def send_telegram(msg):
     if not Config.TELEGRAM_BOT_TOKEN: 
         print(f"📱 Telegram: {msg}")  # Debug local
         return
-    url = f"https://api.telegram.org/bot{Config.TELEGRAM_BOT_TOKEN}/sendMessage"
-    requests.post(url, json={"chat_id": Config.TELEGRAM_CHAT_ID, "text": msg, "parse_mode": "Markdown"})
-
-def fetch_data(interval):
-    url = "https://api.binance.com/api/v3/klines"
-    params = {'symbol': Config.SYMBOL, 'interval': interval, 'limit': 150}
-    data = requests.get(url, params=params).json()
-    df = pd.DataFrame(data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_volume', 'trades', 'taker_buy_base', 'taker_buy_quote', 'ignore'])
-    df = df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].astype(float)
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    return enrich_dataframe(df, Config)
+    # Só enfileira: o envio (com limite e retentativas) roda em outra thread
+    from telegram_alerts import get_dispatcher  # só carregado quando há alerta a enviar
+    get_dispatcher().send(msg, parse_mode="Markdown")
+
+session = requests.Session()  # Reaproveita conexões entre requisições
+
+def kline_weight(limit):
+    """Peso de /api/v3/klines conforme o limit pedido"""
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+def record_api_usage(resp, weight):
+    """Contabiliza requisição/peso e o peso do minuto informado pela Binance"""
+    metrics.inc('api_requests')
+    metrics.inc('api_weight', weight)
+    used = resp.headers.get('X-MBX-USED-WEIGHT-1M')
+    if used is not None:
+        metrics.set_gauge('api_weight_used_1m', int(used))
+
+def klines_to_frame(data):
+    """Converte a resposta de /api/v3/klines (bytes, lista ou arrays decodificados) em DataFrame OHLCV"""
+    with metrics.span('parse'):
+        return to_frame(data if isinstance(data, dict) else decode_klines(data))
+
+def fetch_klines(symbol, interval, limit=150, start_ms=None, end_ms=None):
+    """Chamada a /api/v3/klines, já decodificada em arrays (ver klines.decode_klines)"""
+    params = {'symbol': symbol, 'interval': interval, 'limit': limit}
+    if start_ms is not None:
+        params['startTime'] = start_ms
+    if end_ms is not None:
+        params['endTime'] = end_ms - 1
+    with metrics.span('fetch'):
+        resp = session.get(f"{Config.REST_URL}/api/v3/klines", params=params, timeout=10)
+        record_api_usage(resp, kline_weight(limit))
+        resp.raise_for_status()
+    with metrics.span('parse'):
+        return decode_klines(resp.content)
+
+def iter_klines(symbol, interval, start_ms, end_ms):
+    """Páginas (até 1000 velas, arrays decodificados) de [start_ms, end_ms)"""
+    while start_ms < end_ms:
+        limit = min(1000, (end_ms - start_ms) // interval_ms(interval) + 1)
+        data = fetch_klines(symbol, interval, limit, start_ms, end_ms)
+        rows = len(data['open_time'])
+        if not rows:
+            break
+        yield data
+        if rows < limit:
+            break
+        start_ms = int(data['open_time'][-1]) + 1
+
+def backfill_range(conn, symbol, interval, start_ms, end_ms):
+    """Baixa (paginado, 1000 por vez) e grava as velas de [start_ms, end_ms)"""
+    return sum(save_candles(conn, symbol, interval, klines_to_frame(page))
+               for page in iter_klines(symbol, interval, start_ms, end_ms))
+
+def sync_candles(conn, symbol, interval, limit=150):
+    """Atualiza o banco buscando só as velas desde a última guardada"""
+    last = last_open_time(conn, symbol, interval)
+    now_ms = int(time.time() * 1000)
+    if last is None:
+        data = fetch_klines(symbol, interval, limit)
+        return save_candles(conn, symbol, interval, klines_to_frame(data))
+    # A última vela pode ter sido salva ainda em formação: rebusca a partir dela
+    return backfill_range(conn, symbol, interval, last, now_ms + interval_ms(interval))
+
+def ensure_history(conn, symbol, interval, start_ms, end_ms):
+    """Garante [start_ms, end_ms) no banco, baixando só o que falta (bordas e lacunas)"""
+    step = interval_ms(interval)
+    cursor = conn.execute('SELECT MIN(open_time), MAX(open_time) FROM candles '
+                          'WHERE symbol = ? AND timeframe = ? AND open_time >= ? AND open_time < ?',
+                          (symbol, interval, start_ms, end_ms))
+    first, last = cursor.fetchone()
+    if first is None:
+        missing = [(start_ms, end_ms)]
+    else:
+        missing = find_gaps(conn, symbol, interval, start_ms, end_ms)
+        if first - start_ms >= step:
+            missing.append((start_ms, first))
+        if end_ms - last > step:
+            missing.append((last + step, end_ms))
+    return sum(backfill_range(conn, symbol, interval, a, b) for a, b in missing)
+
+def restore_timeframes(symbol, start_ms):
+    """TimeframeSet do símbolo, retomado do snapshot da rodada anterior quando possível"""
+    timeframes = get_timeframes(symbol, Config)
+    if timeframes.last_open_time is None and Config.SNAPSHOT_FILE:
+        restored = timeframes.load_state(Config.SNAPSHOT_FILE, min_open_time=start_ms)
+        metrics.inc('snapshot', status='restored' if restored else 'cold')
+    return timeframes
+
+def fetch_rows(conn, symbol=Config.SYMBOL, bars=150):
+    """Últimas linhas de todos os Config.TIMEFRAMES derivados das velas base (um só download)"""
+    # Banco local é a fonte: só as velas base novas (e lacunas) vêm da API
+    base = Config.BASE_TIMEFRAME
+    now_ms = int(time.time() * 1000)
+    start = history_start(now_ms, Config.TIMEFRAMES.values(), bars)
+    timeframes = restore_timeframes(symbol, start)
+    # Com estado restaurado, só interessa o que veio depois da última vela processada
+    if timeframes.last_open_time is not None:
+        start = timeframes.last_open_time
+    last = last_open_time(conn, symbol, base)
+    ensure_history(conn, symbol, base, start, last if last is not None and last >= start else now_ms)
+    sync_candles(conn, symbol, base)  # rebusca a vela em formação
+    with metrics.span('db'):
+        df = load_candles(conn, symbol, base, start_ms=start)
+    # 5m/1h agregados do 1m: as últimas velas de todos os frames são o mesmo instante
+    with metrics.span('indicators'):
+        before = {i: timeframes.engine(i).updates for i in timeframes.intervals}
+        timeframes.seed(df)
+    for interval, count in before.items():
+        metrics.inc('candles_processed', timeframes.engine(interval).updates - count, timeframe=interval)
+    return timeframes.rows()
+
+# Valores lidos pelos filtros, guardados com cada decisão no livro de sinais
+SNAPSHOT_COLUMNS = {
+    'fast': ('close', 'EMA_6', 'volume'),
+    'medium': ('close', 'EMA_6', 'RSI', 'BBP'),
+    'slow': ('close', 'EMA_99', 'MACD_hist'),
+}
+
+def indicator_snapshot(rows):
+    """{'medium_RSI': 48.2, ...} da última vela de cada timeframe (ver TimeframeSet.rows)"""
+    return {f"{name}_{col}": rows[name][-1][col]
+            for name, cols in SNAPSHOT_COLUMNS.items() for col in cols}
+
+def signal_time(rows):
+    """open_time (ms) da vela rápida avaliada"""
+    return int(pd.Timestamp(rows['fast'][-1]['timestamp']).value // 1_000_000)
+
+runtime = StrategyRuntime(Config)  # cache das regras e ordem dos filtros (todos os símbolos do processo)
+
+def evaluate(rows, current_pos, symbol=Config.SYMBOL):
+    """Aplica a máquina de estados IDLE/LONG/SHORT; retorna (nova posição, motivo)"""
+    with metrics.span('strategy'):
+        new_pos, reason, alert = decide(rows, current_pos, symbol)
+    if alert:
+        signal(*alert)
+    return new_pos, reason
+
+def signal(side, msg):
+    metrics.inc('signals', side=side)
+    send_telegram(msg)
+
+def decide(rows, current_pos, symbol=Config.SYMBOL):
+    """Só a decisão, sem enviar nada: (nova posição, motivo, (lado, alerta) ou None)
+
+    ``rows`` = últimas linhas de cada timeframe (TimeframeSet.rows ou strategy.frame_rows).
+    """
+    price = rows['fast'][-1]['close']
+    rsi_5m = rows['medium'][-1]['RSI']
+
+    new_pos, reason, alert = current_pos, None, None
+    if current_pos == "IDLE":
+        ok_l, msg_l = runtime.check('LONG', rows, symbol)
+        if ok_l:
+            alert = ("LONG", f"🚀 *SINAL LONG*\n{msg_l}")
+            new_pos, reason = "LONG", msg_l
+        else:
+            metrics.inc('filter_rejections', side='long', reason=reason_key(msg_l))
+            ok_s, msg_s = runtime.check('SHORT', rows, symbol)
+            if ok_s:
+                alert = ("SHORT", f"🔴 *SINAL SHORT*\n{msg_s}")
+                new_pos, reason = "SHORT", msg_s
+            else:
+                metrics.inc('filter_rejections', side='short', reason=reason_key(msg_s))
+                reason = f"L {msg_l} | S {msg_s}"
+    
+    # Saída por RSI extremo
+    elif (current_pos == "LONG" and rsi_5m > 70) or (current_pos == "SHORT" and rsi_5m < 30):
+        alert = ("EXIT", f"🏁 *FECHANDO POSIÇÃO* em ${price:.4f}")
+        new_pos, reason = "IDLE", f"RSI 5m {rsi_5m:.1f}"
+    return new_pos, reason, alert
 
 def main():
     conn = None
@@ -29,49 +200,39 @@ def main():
         conn = init_db()  # ← Usa import correto
         
         # Pega posição atual
-        cursor = conn.cursor()
-        cursor.execute('SELECT value FROM state WHERE key="pos"')
-        row = cursor.fetchone()
-        current_pos = row[0] if row else "IDLE"
+        current_pos = get_order_state(conn)
         
         # Busca dados
         print("🔄 Buscando dados...")
-        df_f = fetch_data(Config.TIMEFRAMES['fast'])
-        df_m = fetch_data(Config.TIMEFRAMES['medium'])
-        df_s = fetch_data(Config.TIMEFRAMES['slow'])
+        rows = fetch_rows(conn)
         
-        price = df_f['close'].iloc[-1]
-        rsi_5m = df_m['RSI'].iloc[-1]
+        price = rows['fast'][-1]['close']
+        rsi_5m = rows['medium'][-1]['RSI']
         
         print(f"SOL: ${price:.4f} | RSI 5m: {rsi_5m:.1f} | Pos: {current_pos}")
 
-        new_pos = current_pos
-        if current_pos == "IDLE":
-            ok_l, msg_l = check_long_entry(df_f, df_m, df_s, Config)
-            if ok_l:
-                send_telegram(f"🚀 *SINAL LONG*\\n{msg_l}")
-                new_pos = "LONG"
-            else:
-                ok_s, msg_s = check_short_entry(df_f, df_m, df_s, Config)
-                if ok_s:
-                    send_telegram(f"🔴 *SINAL SHORT*\\n{msg_s}")
-                    new_pos = "SHORT"
-        
-        # Saída por RSI extremo
-        elif (current_pos == "LONG" and rsi_5m > 70) or (current_pos == "SHORT" and rsi_5m < 30):
-            send_telegram(f"🏁 *FECHANDO POSIÇÃO* em ${price:.4f}")
-            new_pos = "IDLE"
-
-        # Salva novo estado
-        cursor.execute('INSERT OR REPLACE INTO state (key, value) VALUES ("pos", ?)', (new_pos,))
-        conn.commit()
-        print(f"✅ Estado salvo: {new_pos}")
+        new_pos, reason = evaluate(rows, current_pos)
+
+        # Salva novo estado e a decisão no livro de sinais
+        set_order_state(conn, new_pos)
+        record_signal(conn, Config.SYMBOL, signal_time(rows), current_pos, new_pos, price, reason,
+                      indicator_snapshot(rows))
+        if Config.SNAPSHOT_FILE:
+            # Próxima rodada retoma daqui (só as velas novas são buscadas e processadas)
+            get_timeframes(Config.SYMBOL, Config).save_state(Config.SNAPSHOT_FILE)
         
     except Exception as e:
+        metrics.inc('errors', stage='main')
         print(f"❌ Erro: {e}")
+        if Config.SNAPSHOT_FILE:
+            # O estado restaurado pode ser a causa: a próxima rodada recalcula do zero
+            discard_state(Config.SNAPSHOT_FILE)
+            drop_timeframes(Config.SYMBOL)
     finally:
         if conn:
             conn.close()
+        if Config.METRICS_FILE:
+            metrics.dump(Config.METRICS_FILE)
 
 if __name__ == "__main__":
     main()
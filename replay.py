@@ -0,0 +1,254 @@
+"""
+Replay determinístico do pipeline ao vivo com velas gravadas (sem rede).
+
+As velas base de um período (banco local, arquivo colunar ou CSV) passam
+pelo código de produção sem alterações: a API REST e o stream de klines
+são stubs locais (stubs.py), o Telegram é o TelegramStub e o relógio é
+falso (time.time anda com as velas reproduzidas, em velocidade acelerada).
+Banco, snapshot e livro de sinais ficam num diretório de trabalho próprio.
+
+Modos:
+    monitor   uma rodada de monitor.main por vela base (como o cron)
+    ingestor  ingestor.main: backfill REST e depois uma kline por vela no stream
+
+Ao final: vazão, latência por etapa (p50/p95/p99), sinais/alertas e um
+resumo (hash) do livro de sinais; mesmo dado + mesma configuração = mesmo
+hash, o que permite reproduzir um incidente e conferir uma correção.
+
+Uso:
+    python replay.py SOLUSDT 2024-03-01 2024-03-02 --speed 1000
+    python replay.py SOLUSDT 2024-03-01 2024-03-08 --mode ingestor --speed 0 --archive archive
+    python replay.py SOLUSDT 2024-03-01 2024-03-02 --csv incidente.csv --workdir replay_out
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+import metrics
+from config import Config
+from database import SIGNAL_FIELDS, init_db, interval_ms, load_candles, trade_stats
+from resampler import drop_timeframes, history_start
+from stubs import BinanceStub, FakeClock, KlineStreamStub, TelegramStub
+
+
+def load_recorded(symbol, start_ms, end_ms, bars=150, db='trading_data.db', archive_root=None, csv=None,
+                  config=Config):
+    """Velas base de [início do histórico necessário, end_ms) - nada é baixado"""
+    base = config.BASE_TIMEFRAME
+    first = history_start(start_ms, config.TIMEFRAMES.values(), bars)
+    if csv:
+        df = pd.read_csv(csv, float_precision='round_trip')  # mesmos floats do banco, mesmo replay
+        ts = df['timestamp']
+        df['timestamp'] = (pd.to_datetime(ts, unit='ms') if pd.api.types.is_numeric_dtype(ts)
+                           else pd.to_datetime(ts))
+        open_time = df['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64')
+        return df[(open_time >= first) & (open_time < end_ms)].reset_index(drop=True)
+    if archive_root:
+        from archive import load_frame
+        return load_frame(archive_root, symbol, base, first, end_ms)
+    conn = init_db(db)
+    try:
+        return load_candles(conn, symbol, base, start_ms=first, end_ms=end_ms)
+    finally:
+        conn.close()
+
+
+def ledger_digest(conn):
+    """Hash das decisões gravadas (mesmas decisões, mesmo hash)"""
+    digest = hashlib.sha256()
+    for row in conn.execute(f'SELECT {", ".join(SIGNAL_FIELDS)} FROM signals ORDER BY symbol, time, id'):
+        digest.update(repr(row).encode())
+    return digest.hexdigest()[:16]
+
+
+class Replay:
+    def __init__(self, symbol, candles, start_ms, speed=1000.0, config=Config, verbose=False):
+        self.symbol = symbol
+        self.config = config
+        self.base = config.BASE_TIMEFRAME
+        self.step = interval_ms(self.base)
+        self.speed = speed
+        self.verbose = verbose
+        self.candles = candles
+        self.open_time = candles['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64')
+        self.first = int(self.open_time.searchsorted(start_ms))  # primeira vela reproduzida
+        self.clock = FakeClock(self.open_time[self.first] if self.first < len(candles) else start_ms)
+        self.rest = BinanceStub(self.clock).add(symbol, self.base, candles)
+        self.telegram = TelegramStub()
+        self.stream = None
+        self.played = 0
+        self.wall = 0.0
+
+    # Atributos da Config trocados durante o replay (restaurados ao final)
+    OVERRIDES = ('SYMBOL', 'REST_URL', 'WS_URL', 'TELEGRAM_API_URL', 'TELEGRAM_BOT_TOKEN', 'TELEGRAM_CHAT_ID',
+                 'TELEGRAM_RATE', 'TELEGRAM_BURST')
+
+    @contextlib.contextmanager
+    def _configure(self):
+        """Aponta a Config para os stubs enquanto o replay roda; depois devolve os valores originais
+
+        Indicadores em memória do símbolo e o dispatcher do Telegram também
+        são descartados na entrada e na saída: nada do replay vaza para o
+        código ao vivo do mesmo processo (nem o contrário).
+        """
+        from telegram_alerts import close_dispatcher
+
+        c = self.config
+        saved = {name: getattr(c, name) for name in self.OVERRIDES}
+        close_dispatcher()  # um dispatcher já criado apontaria para o Telegram de verdade
+        drop_timeframes(self.symbol)
+        try:
+            c.SYMBOL = self.symbol
+            c.REST_URL = self.rest.url
+            c.TELEGRAM_API_URL = self.telegram.url
+            c.TELEGRAM_BOT_TOKEN, c.TELEGRAM_CHAT_ID = 'replay', 'replay'
+            # Limite do Telegram na mesma escala do relógio
+            c.TELEGRAM_RATE = c.TELEGRAM_RATE * self.speed if self.speed else 1e6
+            c.TELEGRAM_BURST = max(c.TELEGRAM_BURST, 1000)
+            if self.stream is not None:
+                c.WS_URL = self.stream.url
+            yield c
+        finally:
+            close_dispatcher(timeout=30)  # entrega o pendente ao stub
+            drop_timeframes(self.symbol)
+            for name, value in saved.items():
+                setattr(c, name, value)
+
+    def _pace(self, started, i):
+        """Segura o relógio real para manter ``speed`` x o tempo das velas"""
+        if self.speed:
+            ahead = started + i * self.step / 1000 / self.speed - time.perf_counter()
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def _quiet(self):
+        return contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    # --- modos ---
+    def run_monitor(self):
+        """monitor.main a cada fechamento de vela base (o cron, sem esperar o minuto)"""
+        import monitor
+
+        started = time.perf_counter()
+        for i, t in enumerate(self.open_time[self.first:]):
+            self.clock.set(t + self.step)
+            with self._quiet(), metrics.span('run'):
+                monitor.main()
+            self.played += 1
+            self._pace(started, i + 1)
+        self.wall = time.perf_counter() - started
+
+    def run_ingestor(self, timeout=60):
+        """ingestor.main com o stream falso; cada vela é publicada já fechada"""
+        import ingestor
+
+        stop = threading.Event()
+        errors = []
+
+        def play():
+            try:
+                if not self.stream.connected.wait(timeout):
+                    raise RuntimeError("ingestor não conectou ao stream")
+                processed = f"candles_processed{{timeframe={self.base}}}"
+                started = time.perf_counter()
+                cols = [self.candles[c].to_numpy() for c in ('open', 'high', 'low', 'close', 'volume')]
+                for i in range(self.first, len(self.open_time)):
+                    t = int(self.open_time[i])
+                    self.clock.set(t + self.step)
+                    self.stream.publish(self.symbol, self.base, t, *(col[i] for col in cols))
+                    self.played += 1
+                    self._pace(started, self.played)
+                # Espera o ingestor consumir tudo antes de encerrar
+                deadline = time.monotonic() + timeout
+                while metrics.registry.snapshot()['counters'].get(processed, 0) < self.played:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError("ingestor não processou todas as velas a tempo")
+                    time.sleep(0.01)
+                self.wall = time.perf_counter() - started
+            except Exception as e:
+                errors.append(e)
+            finally:
+                stop.set()
+
+        player = threading.Thread(target=play, name='replay', daemon=True)
+        player.start()
+        ingestor.main(stop=stop)
+        player.join()
+        if errors:
+            raise errors[0]
+
+    def run(self, mode='monitor'):
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(self.rest)
+            stack.enter_context(self.telegram)
+            if mode == 'ingestor':
+                self.stream = stack.enter_context(KlineStreamStub())
+            stack.enter_context(self._configure())
+            with self.clock.install():
+                self.run_monitor() if mode == 'monitor' else self.run_ingestor()
+
+    # --- relatório ---
+    def report(self, conn):
+        simulated = self.played * self.step / 1000
+        print(f"\n▶️ {self.played} velas {self.base} ({simulated / 3600:.1f}h simuladas) em {self.wall:.2f}s: "
+              f"{self.played / max(self.wall, 1e-9):,.0f} velas/s, {simulated / max(self.wall, 1e-9):,.0f}x")
+        latency = metrics.registry.snapshot()['latency']
+        print(f"\n{'etapa':<14} {'n':>7} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for key, s in sorted(latency.items()):
+            if key.startswith('stage_seconds'):
+                stage = key.split('stage=')[1].rstrip('}')
+                print(f"{stage:<14} {s['count']:>7} " + ' '.join(f"{s[q] * 1e3:7.3f}ms" for q in ('p50', 'p95', 'p99')))
+        actions = dict(conn.execute('SELECT action, COUNT(*) FROM signals GROUP BY action').fetchall())
+        stats = trade_stats(conn, self.symbol)
+        print(f"\n📒 Sinais: {actions} | Trades: {stats['trades']} | PnL: {stats['pnl']:.2%}")
+        print(f"📱 Alertas: {len(self.telegram.messages)} mensagens entregues ao Telegram falso")
+        print(f"🔁 REST: {len(self.rest.requests)} requisições | Livro de sinais: {ledger_digest(conn)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay do monitor/ingestor com velas gravadas")
+    parser.add_argument('symbol', nargs='?', default=Config.SYMBOL)
+    parser.add_argument('start', help="YYYY-MM-DD[ HH:MM] (primeira vela reproduzida)")
+    parser.add_argument('end', help="YYYY-MM-DD[ HH:MM] (exclusivo)")
+    parser.add_argument('--mode', choices=('monitor', 'ingestor'), default='monitor')
+    parser.add_argument('--speed', type=float, default=1000.0, help="Aceleração do relógio (0 = sem espera)")
+    parser.add_argument('--db', default='trading_data.db', help="Banco com as velas gravadas")
+    parser.add_argument('--archive', default=None, help="Raiz do arquivo colunar (archive.py) em vez do banco")
+    parser.add_argument('--csv', default=None, help="CSV com timestamp,open,high,low,close,volume")
+    parser.add_argument('--workdir', default=None, help="Onde gravar banco/snapshot do replay (padrão: temporário)")
+    parser.add_argument('--verbose', action='store_true', help="Mostra a saída de cada rodada do monitor")
+    args = parser.parse_args()
+
+    start_ms = int(pd.Timestamp(args.start).timestamp() * 1000)
+    end_ms = int(pd.Timestamp(args.end).timestamp() * 1000)
+    candles = load_recorded(args.symbol, start_ms, end_ms, db=args.db,
+                            archive_root=args.archive and os.path.abspath(args.archive), csv=args.csv)
+    replay = Replay(args.symbol, candles, start_ms, args.speed, verbose=args.verbose)
+    if replay.first >= len(candles):
+        parser.error(f"nenhuma vela {Config.BASE_TIMEFRAME} de {args.symbol} no período")
+    print(f"🎬 Replay {args.mode} {args.symbol}: {len(candles) - replay.first} velas "
+          f"(+{replay.first} de histórico) a {args.speed:g}x")
+
+    with contextlib.ExitStack() as stack:
+        workdir = args.workdir or stack.enter_context(tempfile.TemporaryDirectory(prefix='replay_'))
+        os.makedirs(workdir, exist_ok=True)
+        cwd = os.getcwd()
+        os.chdir(workdir)  # monitor/ingestor usam trading_data.db e o snapshot do diretório atual
+        stack.callback(os.chdir, cwd)
+        replay.run(args.mode)
+        conn = init_db()
+        try:
+            replay.report(conn)
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Timeframes maiores derivados das velas base (1m).
+
+Em vez de baixar 1m, 5m e 1h separadamente (três vezes o peso de API e
+últimas velas desalinhadas entre si), só o fluxo base é buscado/assinado;
+5m, 15m, 1h... são agregados dele. ``Resampler`` atualiza a vela aberta de
+cada timeframe a cada vela base que chega; ``TimeframeSet`` liga isso aos
+motores de indicators.py, de modo que os três frames entregues à
+strategy.py são sempre o mesmo instante.
+"""
+import json
+import os
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from database import interval_ms
+from indicators import IndicatorEngine, drop_engines, get_engine, register_engine
+
+WEEK_MS = 604_800_000
+WEEK_OFFSET_MS = 4 * 86_400_000  # velas semanais da Binance começam na segunda-feira
+SNAPSHOT_VERSION = 2  # 2: estado explícito em JSON (1 era pickle)
+
+
+def bucket_start(open_time, step):
+    """Início (ms) da vela de ``step`` ms que contém ``open_time`` (int ou array)"""
+    offset = WEEK_OFFSET_MS if step % WEEK_MS == 0 else 0
+    return open_time - (open_time - offset) % step
+
+
+def history_start(now_ms, intervals, bars):
+    """Primeira vela base necessária para ter ``bars`` velas do maior timeframe"""
+    step = max(interval_ms(i) for i in intervals)
+    return int(bucket_start(now_ms, step)) - (bars - 1) * step
+
+
+def resample_frame(df, interval):
+    """Agrega um DataFrame OHLCV de velas base (crescente) em ``interval``, de uma vez
+
+    A última vela pode estar incompleta (em formação), como na API.
+    """
+    if df.empty:
+        return df.copy()
+    open_time = df['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64')
+    bucket = bucket_start(open_time, interval_ms(interval))
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(df)] - 1
+    return pd.DataFrame({
+        'timestamp': bucket[starts].astype('datetime64[ms]').astype(df['timestamp'].dtype),
+        'open': df['open'].to_numpy()[starts],
+        'high': np.maximum.reduceat(df['high'].to_numpy(), starts),
+        'low': np.minimum.reduceat(df['low'].to_numpy(), starts),
+        'close': df['close'].to_numpy()[ends],
+        'volume': np.add.reduceat(df['volume'].to_numpy(), starts),
+    })
+
+
+class Resampler:
+    """Agrega velas base em timeframes maiores, vela a vela.
+
+    Uma vela base com o mesmo open_time da última é revisão da vela em
+    formação; um open_time novo confirma a anterior (como no IndicatorEngine).
+    """
+
+    def __init__(self, intervals, base='1m'):
+        self.base = base
+        self.base_step = interval_ms(base)
+        self.steps = {}
+        for interval in dict.fromkeys(intervals):
+            step = interval_ms(interval)
+            if step % self.base_step:
+                raise ValueError(f"Timeframe {interval} não é múltiplo de {base}")
+            self.steps[interval] = step
+        self.closed = {}      # interval -> [bucket, o, h, l, c, v] das velas base confirmadas
+        self.current = None   # última vela base (open_time, o, h, l, c, v)
+
+    @property
+    def last_open_time(self):
+        return self.current[0] if self.current else None
+
+    def _commit(self):
+        t, o, h, l, c, v = self.current
+        for interval, step in self.steps.items():
+            bucket = bucket_start(t, step)
+            agg = self.closed.get(interval)
+            if agg is None or agg[0] != bucket:
+                self.closed[interval] = [bucket, o, h, l, c, v]
+            else:
+                agg[2] = max(agg[2], h)
+                agg[3] = min(agg[3], l)
+                agg[4] = c
+                agg[5] += v
+
+    def update(self, open_time, open_, high, low, close, volume):
+        """Aplica uma vela base; retorna {interval: (início ms, o, h, l, c, v)} das velas abertas"""
+        open_time = int(open_time)
+        if self.current is not None:
+            if open_time < self.current[0]:
+                raise ValueError(f"Vela fora de ordem: {open_time}")
+            if open_time > self.current[0]:
+                self._commit()
+        o, h, l, c, v = float(open_), float(high), float(low), float(close), float(volume)
+        self.current = (open_time, o, h, l, c, v)
+
+        bars = {}
+        for interval, step in self.steps.items():
+            bucket = bucket_start(open_time, step)
+            agg = self.closed.get(interval)
+            if agg is None or agg[0] != bucket:
+                bars[interval] = (bucket, o, h, l, c, v)
+            else:
+                bars[interval] = (bucket, agg[1], max(agg[2], h), min(agg[3], l), c, agg[5] + v)
+        return bars
+
+    def closing(self, open_time):
+        """Timeframes cuja vela fecha junto com a vela base de ``open_time``"""
+        end = int(open_time) + self.base_step
+        return [i for i, step in self.steps.items() if bucket_start(end, step) == end]
+
+    def state(self):
+        """Agregados das velas confirmadas + última vela base, em tipos simples"""
+        return {'closed': {i: list(agg) for i, agg in self.closed.items()},
+                'current': list(self.current) if self.current else None}
+
+    def restore(self, state):
+        """Volta ao estado de ``state()``; ValueError se não bater com os timeframes deste"""
+        closed = {}
+        for interval, agg in state['closed'].items():
+            if interval not in self.steps or len(agg) != 6:
+                raise ValueError(f"Agregado inválido para {interval}: {agg}")
+            closed[interval] = [int(agg[0])] + [float(x) for x in agg[1:]]
+        current = state['current']
+        if current is not None:
+            if len(current) != 6:
+                raise ValueError(f"Vela base inválida: {current}")
+            current = (int(current[0]),) + tuple(float(x) for x in current[1:])
+        self.closed, self.current = closed, current
+
+
+class TimeframeSet:
+    """Todos os Config.TIMEFRAMES de um símbolo alimentados por um só fluxo de velas base"""
+
+    def __init__(self, symbol, config=Config, maxlen=100):
+        self.symbol = symbol
+        self.config = config
+        self.maxlen = maxlen  # linhas guardadas por timeframe (motores novos)
+        self.base = config.BASE_TIMEFRAME
+        self.resampler = Resampler(config.TIMEFRAMES.values(), self.base)
+
+    def engine(self, interval):
+        return get_engine(self.symbol, interval, self.config, self.maxlen)
+
+    @property
+    def intervals(self):
+        return list(self.resampler.steps)
+
+    @property
+    def last_open_time(self):
+        return self.resampler.last_open_time
+
+    def update(self, open_time, open_, high, low, close, volume):
+        """Aplica uma vela base em todos os timeframes"""
+        bars = self.resampler.update(open_time, open_, high, low, close, volume)
+        for interval, (bucket, *ohlcv) in bars.items():
+            self.engine(interval).update(pd.Timestamp(bucket, unit='ms'), *ohlcv)
+        return bars
+
+    def seed(self, df):
+        """Alimenta com velas base (DataFrame OHLCV crescente); só as novas são processadas"""
+        if df.empty:
+            return self
+        open_time = df['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64')
+        if self.last_open_time is None:
+            # Carga inicial vetorizada; o resampler só precisa das velas dos buckets abertos
+            for interval in self.intervals:
+                self.engine(interval).seed(resample_frame(df, interval))
+            start = min(bucket_start(int(open_time[-1]), step) for step in self.resampler.steps.values())
+            rows = np.flatnonzero(open_time >= start)
+            apply = self.resampler.update
+        else:
+            rows = np.flatnonzero(open_time >= self.last_open_time)
+            apply = self.update
+        cols = [df[c].to_numpy() for c in ('open', 'high', 'low', 'close', 'volume')]
+        for i in rows:
+            apply(open_time[i], *(col[i] for col in cols))
+        return self
+
+    def closing(self, open_time):
+        return self.resampler.closing(open_time)
+
+    def frames(self):
+        """Snapshot de cada timeframe (mesmo formato de enrich_dataframe), todos no mesmo instante"""
+        return {name: self.engine(interval).to_frame()
+                for name, interval in self.config.TIMEFRAMES.items()}
+
+    def rows(self, n=3):
+        """Últimas ``n`` linhas (dicts) de cada timeframe, sem montar DataFrames (ver StrategyRuntime)"""
+        out = {}
+        for name, interval in self.config.TIMEFRAMES.items():
+            rows = self.engine(interval).rows
+            out[name] = list(islice(rows, max(len(rows) - n, 0), None))
+        return out
+
+    # --- estado entre execuções ---
+    def _fingerprint(self):
+        """Tudo de que o estado salvo depende; se mudar, o snapshot é descartado"""
+        c = self.config
+        return {'version': SNAPSHOT_VERSION, 'symbol': self.symbol, 'base': self.base,
+                'intervals': list(self.intervals), 'maxlen': self.maxlen,
+                'params': [c.BB_LENGTH, c.BB_STD, c.RSI_LENGTH, c.MACD_FAST, c.MACD_SLOW, c.MACD_SIGNAL]}
+
+    def save_state(self, path):
+        """Grava resampler + motores (EMAs, janelas, últimas linhas) em JSON versionado"""
+        if self.last_open_time is None:
+            return
+        state = {'key': self._fingerprint(), 'resampler': self.resampler.state(),
+                 'engines': {i: self.engine(i).state() for i in self.intervals}}
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(state, f)  # NaN/inf saem como no módulo json (NaN, Infinity)
+        os.replace(tmp, path)  # nunca deixa um snapshot pela metade
+
+    def load_state(self, path, min_open_time=None):
+        """Restaura o que save_state gravou; False se não houver snapshot compatível
+
+        Com ``min_open_time``, um snapshot cuja última vela é anterior a ele
+        (parado há mais tempo que o histórico necessário) também é recusado.
+        Snapshot ilegível ou malformado é apagado (a rodada recalcula do zero).
+        """
+        try:
+            with open(path) as f:
+                state = json.load(f)
+            if not isinstance(state, dict) or state.get('key') != json.loads(json.dumps(self._fingerprint())):
+                return False
+            resampler = Resampler(self.intervals, self.base)
+            resampler.restore(state['resampler'])
+            engines = {i: IndicatorEngine.from_state(self.config, state['engines'][i], self.maxlen)
+                       for i in self.intervals}
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"⚠️ Snapshot '{path}' inválido ({e}); apagando e recalculando do zero")
+            discard_state(path)
+            return False
+        if resampler.last_open_time is None:
+            return False
+        if min_open_time is not None and resampler.last_open_time < min_open_time:
+            return False
+        self.resampler = resampler
+        for interval, engine in engines.items():
+            register_engine(self.symbol, interval, engine)
+        return True
+
+
+def discard_state(path):
+    """Apaga um snapshot (ex.: a rodada que o restaurou falhou)"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+_sets = {}
+
+
+def get_timeframes(symbol, config=Config):
+    """Retorna (criando se preciso) o TimeframeSet de um símbolo"""
+    if symbol not in _sets:
+        _sets[symbol] = TimeframeSet(symbol, config)
+    return _sets[symbol]
+
+
+def drop_timeframes(symbol):
+    """Descarta o TimeframeSet e os motores de um símbolo (próximo uso recomeça do zero)"""
+    _sets.pop(symbol, None)
+    drop_engines(symbol)
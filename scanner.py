@@ -0,0 +1,173 @@
+"""
+Scanner multi-símbolo: varre centenas de pares USDT por ciclo.
+
+Busca as klines com concorrência limitada (conexões reaproveitadas e
+contabilidade do peso da API), empilha os candles de todos os símbolos em
+matrizes e calcula indicadores e filtros da estratégia de uma só vez.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+from indicators import enrich_matrix
+from klines import FIELDS, decode_klines
+from monitor import kline_weight, record_api_usage
+from strategy import scan_entries
+
+
+class WeightBudget:
+    """Controla o peso de API usado no minuto corrente (thread-safe)"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.total = 0
+        self.minute = int(time.time() // 60)
+        self.lock = threading.Lock()
+
+    def _roll(self, now):
+        minute = int(now // 60)
+        if minute != self.minute:
+            self.minute = minute
+            self.used = 0
+
+    def acquire(self, weight, deadline=None):
+        """Reserva peso; espera a virada do minuto se preciso. False se estourar o prazo"""
+        while True:
+            now = time.time()
+            with self.lock:
+                self._roll(now)
+                if self.used + weight <= self.limit:
+                    self.used += weight
+                    self.total += weight
+                    return True
+                wait_s = (self.minute + 1) * 60 - now
+            if deadline is not None and now + wait_s > deadline:
+                return False
+            time.sleep(min(wait_s, 1.0))
+
+    def observe(self, headers):
+        """Sincroniza com o peso informado pela Binance (X-MBX-USED-WEIGHT-1M)"""
+        value = headers.get('X-MBX-USED-WEIGHT-1M')
+        if value is not None:
+            with self.lock:
+                self._roll(time.time())
+                self.used = max(self.used, int(value))
+
+
+class Scanner:
+    def __init__(self, config=Config, limit=150):
+        self.config = config
+        self.limit = limit
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=config.SCAN_MAX_WORKERS)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.budget = WeightBudget(config.API_WEIGHT_LIMIT)
+
+    def discover_symbols(self, top_n):
+        """Top N pares USDT por volume em 24h"""
+        self.budget.acquire(80)
+        resp = self.session.get(f"{self.config.REST_URL}/api/v3/ticker/24hr", timeout=10)
+        record_api_usage(resp, 80)
+        resp.raise_for_status()
+        self.budget.observe(resp.headers)
+        tickers = [t for t in resp.json() if t['symbol'].endswith('USDT')
+                   and not t['symbol'].endswith(('UPUSDT', 'DOWNUSDT'))]
+        tickers.sort(key=lambda t: float(t['quoteVolume']), reverse=True)
+        return [t['symbol'] for t in tickers[:top_n]]
+
+    def fetch(self, symbol, interval, deadline):
+        """Klines de um símbolo como matriz (velas x [open, high, low, close, volume])"""
+        if not self.budget.acquire(kline_weight(self.limit), deadline):
+            raise TimeoutError("peso da API esgotado")
+        params = {'symbol': symbol, 'interval': interval, 'limit': self.limit}
+        resp = self.session.get(f"{self.config.REST_URL}/api/v3/klines", params=params,
+                                timeout=max(deadline - time.time(), 1))
+        record_api_usage(resp, kline_weight(self.limit))
+        self.budget.observe(resp.headers)
+        resp.raise_for_status()
+        data = decode_klines(resp.content)
+        return np.column_stack([data[f] for f in FIELDS[1:]])
+
+    def fetch_all(self, symbols, deadline):
+        """Busca todos os timeframes de todos os símbolos dentro do prazo"""
+        intervals = list(dict.fromkeys(self.config.TIMEFRAMES.values()))
+        data = {interval: {} for interval in intervals}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.config.SCAN_MAX_WORKERS) as pool:
+            futures = {pool.submit(self.fetch, symbol, interval, deadline): (symbol, interval)
+                       for symbol in symbols for interval in intervals}
+            done, pending = wait(futures, timeout=max(deadline - time.time(), 0))
+            for fut in pending:
+                fut.cancel()
+                errors[futures[fut][0]] = "⏱ Sem tempo"
+            for fut in done:
+                symbol, interval = futures[fut]
+                try:
+                    data[interval][symbol] = fut.result()
+                except Exception as e:
+                    errors[symbol] = f"❌ Erro: {e}"
+        return data, errors
+
+    def _snapshot(self, matrices, symbols, with_volume=False):
+        """Última vela de cada símbolo com os indicadores calculados"""
+        ohlcv = np.stack([matrices[s] for s in symbols], axis=1)  # velas x símbolos x 5
+        cols = enrich_matrix(ohlcv[:, :, 3], self.config)
+        snap = {name: values[-1] for name, values in cols.items()}
+        if with_volume:
+            snap['volume'] = ohlcv[-3:, :, 4].T
+        return snap
+
+    def run(self, symbols=None):
+        """Executa um ciclo e retorna o ranking como DataFrame"""
+        deadline = time.time() + self.config.SCAN_TIME_BUDGET
+        symbols = symbols or self.config.SYMBOLS or self.discover_symbols(self.config.SCAN_TOP_N)
+        data, errors = self.fetch_all(symbols, deadline)
+
+        for symbol in symbols:
+            if symbol not in errors and any(len(data[i].get(symbol, ())) < self.limit for i in data):
+                errors[symbol] = "❌ Histórico curto"
+        valid = [s for s in symbols if s not in errors]
+
+        rows = [{'symbol': s, 'signal': '', 'reason': errors[s], 'score': -1} for s in errors]
+        if valid:
+            tf = self.config.TIMEFRAMES
+            fast = self._snapshot(data[tf['fast']], valid, with_volume=True)
+            medium = self._snapshot(data[tf['medium']], valid)
+            slow = self._snapshot(data[tf['slow']], valid)
+            res = scan_entries(fast, medium, slow, self.config)
+            for i, symbol in enumerate(valid):
+                if res['long_ok'][i]:
+                    signal, reason = 'LONG', res['long_reason'][i]
+                elif res['short_ok'][i]:
+                    signal, reason = 'SHORT', res['short_reason'][i]
+                else:
+                    signal, reason = '', f"L {res['long_reason'][i]} | S {res['short_reason'][i]}"
+                rows.append({'symbol': symbol, 'price': fast['close'][i], 'rsi_5m': medium['RSI'][i],
+                             'signal': signal, 'reason': reason,
+                             'score': max(res['long_depth'][i], res['short_depth'][i])})
+
+        table = pd.DataFrame(rows, columns=['symbol', 'price', 'rsi_5m', 'signal', 'reason', 'score'])
+        table['has_signal'] = table['signal'] != ''
+        table = table.sort_values(['has_signal', 'score', 'symbol'], ascending=[False, False, True])
+        return table.drop(columns='has_signal').reset_index(drop=True)
+
+
+def main():
+    start = time.time()
+    scanner = Scanner(Config)
+    table = scanner.run()
+    print(table.to_string(index=False))
+    print(f"\n⏱ {time.time() - start:.1f}s | Peso API: {scanner.budget.total} | "
+          f"Sinais: {(table['signal'] != '').sum()}/{len(table)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Backend local dos dashboards: um só stream da Binance para N navegadores.
+
+Assina o fluxo de klines uma vez (ingestor.py), calcula indicadores e o
+estado dos sinais uma vez e distribui deltas compactos (preço, RSI por
+timeframe, linhas BB/EMA6, posição) por WebSocket a todos os clientes.
+
+    GET /              -> index.html  (também /index2.html)
+    GET /snapshot      -> estado completo + histórico (JSON)
+    WS  /ws            -> snapshot na conexão, depois deltas
+
+Os ticks são agrupados (Config.SERVER_PUSH_INTERVAL) e cada delta é
+serializado uma única vez para todos os clientes; cliente lento demais
+perde deltas, percebe o salto no ``seq`` e reconecta (novo snapshot).
+
+Uso:
+    python server.py                 # http://127.0.0.1:8765
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+from http import HTTPStatus
+
+import metrics
+from config import Config
+from database import get_order_state, init_db, interval_ms
+from ingestor import KlineIngestor
+from strategy import StrategyRuntime
+
+try:
+    from websockets.asyncio.server import broadcast, serve
+    from websockets.datastructures import Headers
+    from websockets.http11 import Response
+except ImportError:
+    serve = None
+
+try:
+    import orjson
+
+    def dumps(obj):
+        return orjson.dumps(obj)
+except ImportError:
+    def dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_FILES = {'/': 'index.html', '/index.html': 'index.html', '/index2.html': 'index2.html'}
+MAX_CLIENT_BUFFER = 256 * 1024  # bytes pendentes a partir dos quais o cliente perde deltas
+
+
+def _num(value):
+    """Float compacto para JSON (10 dígitos significativos; NaN -> null)"""
+    if value is None or math.isnan(value):
+        return None
+    return float(f"{value:.10g}")
+
+
+def bar_state(row):
+    """Campos de uma linha do motor de indicadores enviados aos clientes"""
+    return {
+        't': int(row['timestamp'].timestamp()),
+        'o': _num(row['open']), 'h': _num(row['high']), 'l': _num(row['low']), 'c': _num(row['close']),
+        'rsi': _num(row['RSI']), 'ema6': _num(row['EMA_6']),
+        'bbu': _num(row['BBU']), 'bbm': _num(row['BBM']), 'bbl': _num(row['BBL']),
+    }
+
+
+def diff(old, new):
+    """Só as chaves que mudaram (recursivo); vazio se nada mudou"""
+    out = {}
+    for key, value in new.items():
+        before = old.get(key)
+        if isinstance(value, dict) and isinstance(before, dict):
+            changed = diff(before, value)
+            if changed:
+                out[key] = changed
+        elif value != before:
+            out[key] = value
+    return out
+
+
+class DashboardHub:
+    """Estado calculado uma vez e distribuído a todos os clientes conectados"""
+
+    def __init__(self, ingestor, db_path='trading_data.db', push_interval=None):
+        self.ingestor = ingestor
+        self.config = ingestor.config
+        self.push_interval = push_interval if push_interval is not None else self.config.SERVER_PUSH_INTERVAL
+        self.db_path = db_path
+        self.runtime = StrategyRuntime(self.config)  # mesmas regras (e cache) do monitor/ingestor
+        self.clients = set()
+        self.state = {}
+        self.seq = 0
+        self.pos = self.read_pos()
+        self.signal = ''
+        self.changed = asyncio.Event()
+        ingestor.on_tick = self.on_tick
+        ingestor.on_close = self.on_close
+
+    # --- estado ---
+    def on_tick(self, ingestor):
+        self.changed.set()
+
+    def read_pos(self):
+        """Posição gravada pelo processo que opera (monitor/ingestor); aqui só é exibida"""
+        conn = init_db(self.db_path)
+        try:
+            return get_order_state(conn)
+        finally:
+            conn.close()
+
+    async def on_close(self, interval, ingestor):
+        if interval != self.config.TIMEFRAMES['fast']:
+            return
+        rows = ingestor.rows()
+        ok_l, msg_l = self.runtime.check('LONG', rows, ingestor.symbol)
+        ok_s, msg_s = self.runtime.check('SHORT', rows, ingestor.symbol)
+        self.signal = msg_l if ok_l else msg_s if ok_s else f"L {msg_l} | S {msg_s}"
+        self.pos = await asyncio.to_thread(self.read_pos)  # sqlite fora do event loop
+        self.changed.set()
+
+    def build_state(self):
+        tf = {}
+        for name, interval in self.config.TIMEFRAMES.items():
+            row = self.ingestor.engine(interval).latest()
+            if row is not None:
+                tf[name] = {'interval': interval, **bar_state(row)}
+        if 'fast' not in tf:
+            return {}
+        state = {'symbol': self.ingestor.symbol, 'price': tf['fast']['c'], 'pos': self.pos,
+                 'signal': self.signal, 'tf': tf}
+        slow = self.config.TIMEFRAMES['slow']
+        rows = self.ingestor.engine(slow).rows
+        day = max(86_400_000 // interval_ms(slow), 1)  # velas lentas em 24h
+        if len(rows) > day:
+            state['change_24h'] = _num(rows[-1]['close'] / rows[-1 - day]['close'] - 1)
+        return state
+
+    def snapshot(self):
+        history = {name: [bar_state(row) for row in self.ingestor.engine(interval).rows]
+                   for name, interval in self.config.TIMEFRAMES.items()}
+        return {'type': 'snapshot', 'seq': self.seq, 'data': self.state, 'history': history}
+
+    def publish(self):
+        """Calcula o delta desde o último envio e distribui a todos"""
+        new = self.build_state()
+        delta = diff(self.state, new)
+        self.state = new
+        if not delta:
+            return
+        self.seq += 1
+        message = dumps({'type': 'delta', 'seq': self.seq, 'data': delta})
+        ready = [ws for ws in self.clients if ws.transport.get_write_buffer_size() < MAX_CLIENT_BUFFER]
+        broadcast(ready, message, text=True)
+        metrics.inc('dashboard_deltas')
+        metrics.inc('dashboard_skipped', len(self.clients) - len(ready))
+
+    async def publish_loop(self):
+        while True:
+            await self.changed.wait()
+            self.changed.clear()
+            with metrics.span('dashboard_publish'):
+                self.publish()
+            await asyncio.sleep(self.push_interval)  # junta os ticks do intervalo
+
+    # --- rede ---
+    async def handler(self, ws):
+        self.clients.add(ws)
+        metrics.set_gauge('dashboard_clients', len(self.clients))
+        try:
+            await ws.send(dumps(self.snapshot()), text=True)
+            await ws.wait_closed()
+        finally:
+            self.clients.discard(ws)
+            metrics.set_gauge('dashboard_clients', len(self.clients))
+
+    def process_request(self, connection, request):
+        path = request.path.split('?', 1)[0]
+        if path == '/ws':
+            return None  # segue para o handshake WebSocket
+        if path == '/snapshot':
+            return _response(dumps(self.snapshot()), 'application/json')
+        if path in STATIC_FILES:
+            with open(os.path.join(ROOT, STATIC_FILES[path]), 'rb') as f:
+                return _response(f.read(), 'text/html; charset=utf-8')
+        return connection.respond(HTTPStatus.NOT_FOUND, "Not found\n")
+
+
+def _response(body, content_type):
+    headers = Headers([('Content-Type', content_type), ('Content-Length', str(len(body))),
+                       ('Cache-Control', 'no-store')])
+    return Response(HTTPStatus.OK.value, HTTPStatus.OK.phrase, headers, body)
+
+
+async def run(config=Config, host=None, port=None):
+    if serve is None:
+        raise RuntimeError("Pacote 'websockets' não instalado (pip install websockets)")
+    ingestor = KlineIngestor(config)
+    hub = DashboardHub(ingestor)
+    host, port = host or config.SERVER_HOST, port or config.SERVER_PORT
+    # Sem compressão: com centenas de clientes o deflate por conexão domina a CPU
+    async with serve(hub.handler, host, port, process_request=hub.process_request, compression=None):
+        logger.info(f"🌐 Dashboard em http://{host}:{port}")
+        await asyncio.gather(ingestor.run(), hub.publish_loop())
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,9 @@
+import re
+
+import numpy as np
+
+from database import interval_ms
+
 def is_uptrend(df_slow):
     if len(df_slow) < 2: return False
     return (df_slow['close'].iloc[-1] > df_slow['EMA_99'].iloc[-1] and
@@ -17,13 +23,13 @@ def check_long_entry(df_fast, df_medium, df_slow, config):
     if rsi < config.RSI_OVERSOLD: return False, f"❌ RSI {rsi:.1f}"
     
     ema6 = df_fast['EMA_6'].iloc[-1]
-    if abs(price - ema6) > ema6 * 0.002: return False, "❌ Longe EMA6"
+    if abs(price - ema6) > ema6 * config.EMA6_DISTANCE: return False, "❌ Longe EMA6"
     
     # Volume crescente nas últimas 3 velas
     vol = df_fast['volume'].iloc[-3:].values
     if not (vol[0] < vol[1] < vol[2]): return False, "❌ Volume"
     
-    if df_medium['BBP'].iloc[-1] > 0.95: return False, "❌ BB alta"
+    if df_medium['BBP'].iloc[-1] > config.BBP_UPPER: return False, "❌ BB alta"
     return True, f"🟢 LONG em {price}"
 
 def check_short_entry(df_fast, df_medium, df_slow, config):
@@ -35,10 +41,198 @@ def check_short_entry(df_fast, df_medium, df_slow, config):
     if rsi > config.RSI_OVERBOUGHT: return False, f"❌ RSI {rsi:.1f}"
     
     ema6 = df_fast['EMA_6'].iloc[-1]
-    if abs(price - ema6) > ema6 * 0.002: return False, "❌ Longe EMA6"
+    if abs(price - ema6) > ema6 * config.EMA6_DISTANCE: return False, "❌ Longe EMA6"
     
     vol = df_fast['volume'].iloc[-3:].values
     if not (vol[0] < vol[1] < vol[2]): return False, "❌ Volume"
     
-    if df_medium['BBP'].iloc[-1] < 0.05: return False, "❌ BB baixa"
+    if df_medium['BBP'].iloc[-1] < config.BBP_LOWER: return False, "❌ BB baixa"
     return True, f"🔴 SHORT em {price}"
+
+
+# --- regras declaradas (avaliação incremental) ---
+class Rule:
+    """Filtro de entrada: timeframe e colunas de que depende, teste e motivo da rejeição
+
+    ``test(rows, config)`` recebe as últimas ``window`` linhas (dicts) do
+    timeframe e diz se a vela passa; com menos linhas que isso, reprova.
+    """
+
+    def __init__(self, name, timeframe, columns, test, reason, window=1):
+        self.name = name
+        self.timeframe = timeframe
+        self.columns = columns
+        self.test = test
+        self.reason = reason
+        self.window = window
+
+    def message(self, rows, config):
+        return self.reason(rows, config) if callable(self.reason) else self.reason
+
+
+def _volume_up(rows, config):
+    return rows[-3]['volume'] < rows[-2]['volume'] < rows[-1]['volume']
+
+
+def _near_ema6(rows, config):
+    r = rows[-1]
+    return not abs(r['close'] - r['EMA_6']) > r['EMA_6'] * config.EMA6_DISTANCE
+
+
+NEAR_EMA6 = Rule('near_ema6', 'fast', ('close', 'EMA_6'), _near_ema6, "❌ Longe EMA6")
+VOLUME_UP = Rule('volume_up', 'fast', ('volume',), _volume_up, "❌ Volume", window=3)
+
+# Mesma ordem (e mesmos motivos) de check_long_entry/check_short_entry
+RULES = {
+    'LONG': [
+        Rule('uptrend', 'slow', ('close', 'EMA_99', 'MACD_hist'),
+             lambda rows, c: rows[-1]['close'] > rows[-1]['EMA_99'] and rows[-1]['MACD_hist'] >= 0,
+             "❌ Sem trend 1h", window=2),
+        Rule('above_ema6', 'medium', ('close', 'EMA_6'),
+             lambda rows, c: not rows[-1]['close'] < rows[-1]['EMA_6'], "❌ < EMA6 5m"),
+        Rule('rsi_long', 'medium', ('RSI',), lambda rows, c: not rows[-1]['RSI'] < c.RSI_OVERSOLD,
+             lambda rows, c: f"❌ RSI {rows[-1]['RSI']:.1f}"),
+        NEAR_EMA6,
+        VOLUME_UP,
+        Rule('bb_long', 'medium', ('BBP',), lambda rows, c: not rows[-1]['BBP'] > c.BBP_UPPER, "❌ BB alta"),
+    ],
+    'SHORT': [
+        Rule('downtrend', 'slow', ('close', 'EMA_99', 'MACD_hist'),
+             lambda rows, c: rows[-1]['close'] < rows[-1]['EMA_99'] and rows[-1]['MACD_hist'] <= 0,
+             "❌ Sem trend 1h", window=2),
+        Rule('below_ema6', 'medium', ('close', 'EMA_6'),
+             lambda rows, c: not rows[-1]['close'] > rows[-1]['EMA_6'], "❌ > EMA6 5m"),
+        Rule('rsi_short', 'medium', ('RSI',), lambda rows, c: not rows[-1]['RSI'] > c.RSI_OVERBOUGHT,
+             lambda rows, c: f"❌ RSI {rows[-1]['RSI']:.1f}"),
+        NEAR_EMA6,
+        VOLUME_UP,
+        Rule('bb_short', 'medium', ('BBP',), lambda rows, c: not rows[-1]['BBP'] < c.BBP_LOWER, "❌ BB baixa"),
+    ],
+}
+ENTRY_MESSAGES = {'LONG': "🟢 LONG em {}", 'SHORT': "🔴 SHORT em {}"}
+
+
+def frame_rows(df_fast, df_medium, df_slow, n=3):
+    """Últimas ``n`` linhas de cada frame como dicts (entrada do StrategyRuntime)"""
+    return {name: df.iloc[-n:].to_dict('records')
+            for name, df in (('fast', df_fast), ('medium', df_medium), ('slow', df_slow))}
+
+
+class StrategyRuntime:
+    """Avalia as regras de entrada a partir das últimas linhas dos motores.
+
+    As regras rodam na ordem declarada, cada uma no máximo uma vez por
+    entrada, e a primeira reprovada dá o motivo (como em
+    check_long_entry/check_short_entry). O resultado de uma regra só é
+    guardado quando a vela que ela lê já fechou, indexado pelo open_time
+    dessa vela: velas fechadas não mudam mais, velas em formação (o 5m/1h
+    entre fechamentos) são sempre reavaliadas.
+    """
+
+    def __init__(self, config, rules=None):
+        self.config = config
+        self.rules = rules or RULES
+        self.steps = {name: interval_ms(interval) for name, interval in config.TIMEFRAMES.items()}
+        self.cache = {}  # (símbolo, regra) -> (open_time da vela fechada, passou)
+        self.checks = 0
+        self.hits = 0
+
+    def _passed(self, rule, inputs, symbol, now_ms):
+        rows = inputs[rule.timeframe]
+        if len(rows) < rule.window:
+            return False
+        open_time = rows[-1]['timestamp'].value // 1_000_000
+        if open_time + self.steps[rule.timeframe] > now_ms:
+            return bool(rule.test(rows, self.config))  # vela em formação: sempre reavaliada
+        key = (symbol, rule.name)
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] == open_time:
+            self.hits += 1
+            return cached[1]
+        passed = bool(rule.test(rows, self.config))
+        self.cache[key] = (open_time, passed)
+        return passed
+
+    def check(self, side, inputs, symbol=None, now_ms=None):
+        """(ok, mensagem) de entrada em ``side`` ('LONG'/'SHORT').
+
+        ``inputs`` = {'fast'|'medium'|'slow': últimas linhas (dicts)}, ver
+        frame_rows e TimeframeSet.rows. ``now_ms`` decide quais velas já
+        fecharam; o padrão é o fim da última vela rápida (avaliação no
+        fechamento dela, como no ingestor), nunca o relógio: histórico
+        reavaliado depois continua vendo o 5m/1h em formação.
+        """
+        self.checks += 1
+        if now_ms is None:
+            now_ms = inputs['fast'][-1]['timestamp'].value // 1_000_000 + self.steps['fast']
+        for rule in self.rules[side]:
+            if not self._passed(rule, inputs, symbol, now_ms):
+                return False, rule.message(inputs[rule.timeframe], self.config)
+        return True, ENTRY_MESSAGES[side].format(inputs['fast'][-1]['close'])
+
+    def forget(self, symbol):
+        """Descarta o cache de um símbolo"""
+        for key in [k for k in self.cache if k[0] == symbol]:
+            del self.cache[key]
+
+
+def reason_key(msg):
+    """Motivo sem o valor numérico ("❌ RSI 28.3" -> "❌ RSI"), para contadores"""
+    return re.sub(r' -?\d+(\.\d+)?$', '', msg)
+
+def _run_filters(n, filters, with_reasons=True):
+    """Aplica filtros (máscara de rejeição, motivo) na ordem, como os early returns"""
+    ok = np.ones(n, dtype=bool)
+    reason = np.full(n, "", dtype=object) if with_reasons else None
+    depth = np.zeros(n, dtype=int)  # quantos filtros passaram
+    for fail, msg in filters:
+        if with_reasons:
+            idx = np.flatnonzero(ok & fail)
+            if len(idx):
+                reason[idx] = [msg(i) for i in idx] if callable(msg) else msg
+        ok &= ~fail
+        depth += ok
+    return ok, reason, depth
+
+def scan_entries(fast, medium, slow, config, with_reasons=True):
+    """Versão vetorizada de check_long_entry/check_short_entry para N símbolos.
+
+    Cada argumento é um dict coluna -> array com o valor da última vela de
+    cada símbolo; ``fast['volume']`` traz as 3 últimas velas (N x 3).
+    Retorna dict com ``long_ok``/``long_reason``/``long_depth`` e o mesmo
+    para ``short_``; ``*_depth`` é o número de filtros aprovados. Com
+    ``with_reasons=False`` os motivos não são montados (``*_reason`` = None).
+    """
+    price = fast['close']
+    n = len(price)
+    ema6 = fast['EMA_6']
+    far = np.abs(price - ema6) > ema6 * config.EMA6_DISTANCE
+    vol = fast['volume']
+    no_volume = ~((vol[:, 0] < vol[:, 1]) & (vol[:, 1] < vol[:, 2]))
+    rsi = medium['RSI']
+
+    uptrend = (slow['close'] > slow['EMA_99']) & (slow['MACD_hist'] >= 0)
+    long_ok, long_reason, long_depth = _run_filters(n, [
+        (~uptrend, "❌ Sem trend 1h"),
+        (medium['close'] < medium['EMA_6'], "❌ < EMA6 5m"),
+        (rsi < config.RSI_OVERSOLD, lambda i: f"❌ RSI {rsi[i]:.1f}"),
+        (far, "❌ Longe EMA6"),
+        (no_volume, "❌ Volume"),
+        (medium['BBP'] > config.BBP_UPPER, "❌ BB alta"),
+    ], with_reasons)
+    if with_reasons:
+        long_reason[long_ok] = [f"🟢 LONG em {float(p)}" for p in price[long_ok]]
+
+    downtrend = (slow['close'] < slow['EMA_99']) & (slow['MACD_hist'] <= 0)
+    short_ok, short_reason, short_depth = _run_filters(n, [
+        (~downtrend, "❌ Sem trend 1h"),
+        (medium['close'] > medium['EMA_6'], "❌ > EMA6 5m"),
+        (rsi > config.RSI_OVERBOUGHT, lambda i: f"❌ RSI {rsi[i]:.1f}"),
+        (far, "❌ Longe EMA6"),
+        (no_volume, "❌ Volume"),
+        (medium['BBP'] < config.BBP_LOWER, "❌ BB baixa"),
+    ], with_reasons)
+    if with_reasons:
+        short_reason[short_ok] = [f"🔴 SHORT em {float(p)}" for p in price[short_ok]]
+    return {'long_ok': long_ok, 'long_reason': long_reason, 'long_depth': long_depth,
+            'short_ok': short_ok, 'short_reason': short_reason, 'short_depth': short_depth}
@@ -0,0 +1,269 @@
+"""
+Servidores locais falsos para testar sem rede.
+
+TelegramStub imita o endpoint sendMessage: grava as mensagens recebidas e
+pode responder com falhas programadas (429 com retry_after, 5xx...).
+Aponte Config.TELEGRAM_API_URL (ou TELEGRAM_API_URL) para ``stub.url``.
+
+BinanceStub serve /api/v3/klines a partir de velas gravadas e
+KlineStreamStub publica klines no formato do stream combinado; os dois
+seguem um FakeClock (só existem as velas já fechadas no relógio falso).
+Aponte Config.REST_URL / Config.WS_URL para ``stub.url``. Ver replay.py.
+"""
+import asyncio
+import json
+import multiprocessing as mp
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import numpy as np
+
+from database import interval_ms
+
+
+class _Server:
+    """Servidor HTTP numa thread, porta livre escolhida pelo sistema"""
+
+    def __init__(self, handler):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.httpd.stub = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _TelegramHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        stub = self.server.stub
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with stub.lock:
+            stub.requests.append(body)
+            status, retry_after = stub.failures.pop(0) if stub.failures else (200, None)
+            if status == 200:
+                stub.messages.append(body)
+        if status == 200:
+            payload = {'ok': True, 'result': {'message_id': len(stub.messages)}}
+        else:
+            payload = {'ok': False, 'error_code': status, 'description': 'stub'}
+            if retry_after is not None:
+                payload['parameters'] = {'retry_after': retry_after}
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TelegramStub(_Server):
+    def __init__(self, failures=None):
+        super().__init__(_TelegramHandler)
+        self.lock = threading.Lock()
+        self.requests = []   # tudo o que chegou
+        self.messages = []   # só os aceitos (200)
+        self.failures = list(failures or [])  # [(status, retry_after), ...] antes de aceitar
+
+    def fail_next(self, status, retry_after=None, times=1):
+        with self.lock:
+            self.failures.extend([(status, retry_after)] * times)
+
+
+class FakeClock:
+    """Relógio controlado à mão (ms); ``install()`` põe time.time para lê-lo
+
+    Com ``shared=True`` o valor fica em memória compartilhada: passado a um
+    processo filho (spawn), ``patch`` faz o filho seguir o mesmo relógio.
+    """
+
+    def __init__(self, now_ms=0, shared=False):
+        self._shared = mp.get_context('spawn').Value('q', int(now_ms)) if shared else None
+        self._now_ms = int(now_ms)
+
+    @property
+    def now_ms(self):
+        return self._shared.value if self._shared is not None else self._now_ms
+
+    def time(self):
+        return self.now_ms / 1000
+
+    def set(self, now_ms):
+        if self._shared is not None:
+            self._shared.value = int(now_ms)
+        else:
+            self._now_ms = int(now_ms)
+
+    def patch(self):
+        """Troca time.time de vez (processo de trabalho dos testes, ver cluster.worker_main)"""
+        time.time = self.time
+
+    @contextmanager
+    def install(self):
+        # time.monotonic/perf_counter continuam reais: timeouts e latências medem o tempo de verdade
+        real, time.time = time.time, self.time
+        try:
+            yield self
+        finally:
+            time.time = real
+
+
+def _num(value):
+    return repr(float(value))  # volta ao mesmo float na decodificação
+
+
+class _BinanceHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        stub = self.server.stub
+        url = urlparse(self.path)
+        query = dict(parse_qsl(url.query))
+        with stub.lock:
+            stub.requests.append(query)
+        if url.path != '/api/v3/klines':
+            return self._reply(404, {'code': -1, 'msg': 'stub: endpoint não simulado'})
+        start, end = query.get('startTime'), query.get('endTime')
+        rows = stub.klines(query.get('symbol'), query.get('interval'), int(query.get('limit', 500)),
+                           int(start) if start else None, int(end) if end else None)
+        if rows is None:
+            return self._reply(400, {'code': -1121, 'msg': 'Invalid symbol.'})
+        self._reply(200, rows)
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload, separators=(',', ':')).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class BinanceStub(_Server):
+    """/api/v3/klines com velas gravadas, até a última fechada em ``clock``"""
+
+    def __init__(self, clock):
+        super().__init__(_BinanceHandler)
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.requests = []
+        self.candles = {}  # (symbol, interval) -> colunas (open_time crescente)
+
+    def add(self, symbol, interval, df):
+        """Registra velas (DataFrame OHLCV com timestamp)"""
+        open_time = df['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64')
+        self.candles[(symbol, interval)] = {
+            'open_time': open_time,
+            **{c: df[c].to_numpy(dtype=float) for c in ('open', 'high', 'low', 'close', 'volume')}}
+        return self
+
+    def klines(self, symbol, interval, limit, start_ms=None, end_ms=None):
+        data = self.candles.get((symbol, interval))
+        if data is None:
+            return None
+        t = data['open_time']
+        step = interval_ms(interval)
+        hi = int(np.searchsorted(t, self.clock.now_ms - step, side='right'))  # só velas já fechadas
+        if end_ms is not None:
+            hi = min(hi, int(np.searchsorted(t, end_ms, side='right')))
+        if start_ms is None:
+            lo = max(hi - limit, 0)
+        else:
+            lo = int(np.searchsorted(t, start_ms))
+            hi = min(hi, lo + limit)
+        return [[int(t[i]), _num(data['open'][i]), _num(data['high'][i]), _num(data['low'][i]),
+                 _num(data['close'][i]), _num(data['volume'][i]), int(t[i]) + step - 1,
+                 "0", 0, "0", "0", "0"] for i in range(lo, hi)]
+
+
+class KlineStreamStub:
+    """Stream de klines (formato combinado da Binance) num event loop próprio"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='KlineStreamStub', daemon=True)
+        self.clients = set()
+        self.connected = threading.Event()
+        self.server = None
+        self.sent = 0
+
+    @property
+    def url(self):
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"ws://{host}:{port}"
+
+    async def _handler(self, ws):
+        self.clients.add(ws)
+        self.connected.set()
+        try:
+            await ws.wait_closed()
+        finally:
+            self.clients.discard(ws)
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def start(self):
+        from websockets.asyncio.server import serve
+
+        async def start():
+            return await serve(self._handler, '127.0.0.1', 0, compression=None)
+        self.thread.start()
+        self.server = self._call(start())
+        return self
+
+    async def _send(self, message):
+        for ws in list(self.clients):
+            try:
+                await ws.send(message)  # espera o buffer esvaziar: cliente lento segura o replay
+            except Exception:
+                self.clients.discard(ws)
+
+    def publish(self, symbol, interval, open_time, o, h, l, c, v, closed=True):
+        """Envia uma kline a todos os conectados (bloqueia até ser entregue ao socket)"""
+        k = {'t': int(open_time), 'T': int(open_time) + interval_ms(interval) - 1, 's': symbol, 'i': interval,
+             'o': _num(o), 'h': _num(h), 'l': _num(l), 'c': _num(c), 'v': _num(v), 'x': closed}
+        message = json.dumps({'stream': f"{symbol.lower()}@kline_{interval}",
+                              'data': {'e': 'kline', 'E': int(time.time() * 1000), 's': symbol, 'k': k}},
+                             separators=(',', ':'))
+        self._call(self._send(message))
+        self.sent += 1
+
+    def stop(self):
+        if not self.thread.is_alive():
+            return  # já parado (ex.: o teste derrubou o stream antes do fim)
+
+        async def stop():
+            self.server.close()
+            await self.server.wait_closed()
+        self._call(stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
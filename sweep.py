@@ -0,0 +1,199 @@
+"""
+Varredura de parâmetros (grid search) em paralelo sobre o histórico.
+
+As velas base são carregadas uma vez e colocadas em memória compartilhada;
+cada processo só anexa os arrays (nada de DataFrames serializados por
+tarefa) e deriva deles os timeframes maiores (vela em formação, como em
+backtest.align). As combinações são agrupadas pelos parâmetros que mudam os
+indicadores, e dentro de cada processo as colunas que não dependem do
+parâmetro varrido (EMAs, ou BB quando só o RSI muda...) ficam em cache.
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from backtest import (align, evaluate_aligned, forming_bars, forming_bbp, forming_ema, forming_macd_hist,
+                      forming_rsi, load_base)
+
+# Parâmetros que alteram o cálculo dos indicadores
+INDICATOR_PARAMS = ('BB_LENGTH', 'BB_STD', 'RSI_LENGTH', 'MACD_FAST', 'MACD_SLOW', 'MACD_SIGNAL')
+
+DEFAULT_GRID = {
+    'BB_LENGTH': [14, 20, 26],
+    'BB_STD': [1.5, 2.0, 2.5],
+    'RSI_LENGTH': [9, 14],
+    'RSI_OVERSOLD': [30, 35, 40],
+    'RSI_OVERBOUGHT': [60, 65, 70],
+    'MACD_FAST': [8, 12],
+    'MACD_SLOW': [21, 26],
+    'MACD_SIGNAL': [9],
+    'EMA6_DISTANCE': [0.001, 0.002, 0.004],
+    'BBP_UPPER': [0.9, 0.95],
+    'BBP_LOWER': [0.05, 0.1],
+}
+
+TIMEFRAME_NAMES = ('fast', 'medium', 'slow')
+
+# Estado de cada processo do pool
+_shm = []
+_base = None
+_bars = {}
+_cache = {}
+
+
+def expand_grid(grid):
+    """Todas as combinações do grid (descarta MACD_FAST >= MACD_SLOW)"""
+    keys = list(grid)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    return [c for c in combos if c.get('MACD_FAST', Config.MACD_FAST) < c.get('MACD_SLOW', Config.MACD_SLOW)]
+
+
+def _share(df):
+    """Copia timestamp/close/volume das velas base para memória compartilhada"""
+    blocks, specs = [], {}
+    arrays = {'timestamp': df['timestamp'].to_numpy().astype('datetime64[ns]').view('int64'),
+              'close': df['close'].to_numpy(dtype=float),
+              'volume': df['volume'].to_numpy(dtype=float)}
+    for col, arr in arrays.items():
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[:] = arr
+        blocks.append(shm)
+        specs[col] = (shm.name, arr.shape, arr.dtype.str)
+    return blocks, specs
+
+
+def _init_worker(specs):
+    """Anexa os arrays compartilhados e agrega os timeframes (uma vez por processo)"""
+    global _base
+    arrays = {}
+    for col, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _shm.append(shm)
+        arrays[col] = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+    _base = pd.DataFrame({
+        'timestamp': arrays['timestamp'].view('datetime64[ns]'),
+        'close': arrays['close'],
+        'volume': arrays['volume'],
+    }, copy=False)
+    for name in TIMEFRAME_NAMES:
+        _bars[name] = forming_bars(_base, Config.TIMEFRAMES[name])
+
+
+def _cached(key, compute):
+    if key not in _cache:
+        _cache[key] = compute()
+    return _cache[key]
+
+
+def _columns(name, p):
+    """Colunas de indicadores de um timeframe, reaproveitando o cache por componente"""
+    x, k, bar_close = _bars[name]
+    return {
+        'close': x,
+        'bars': k,
+        'EMA_6': _cached((name, 'ema', 6), lambda: forming_ema(x, k, bar_close, 6)),
+        'EMA_99': _cached((name, 'ema', 99), lambda: forming_ema(x, k, bar_close, 99)),
+        'BBP': _cached((name, 'bb', p['BB_LENGTH'], p['BB_STD']),
+                       lambda: forming_bbp(x, k, bar_close, p['BB_LENGTH'], float(p['BB_STD']))),
+        'MACD_hist': _cached((name, 'macd', p['MACD_FAST'], p['MACD_SLOW'], p['MACD_SIGNAL']),
+                             lambda: forming_macd_hist(x, k, bar_close, p['MACD_FAST'], p['MACD_SLOW'],
+                                                       p['MACD_SIGNAL'])),
+        'RSI': _cached((name, 'rsi', p['RSI_LENGTH']), lambda: forming_rsi(x, k, bar_close, p['RSI_LENGTH'])),
+    }
+
+
+def _run_group(indicator_params, threshold_list, fee, warmup):
+    """Avalia todas as combinações de limiares para um conjunto de indicadores"""
+    base = {k: getattr(Config, k) for k in INDICATOR_PARAMS}
+    base.update(indicator_params)
+    columns = {name: _columns(name, base) for name in TIMEFRAME_NAMES}
+    fast, medium, slow, valid = align(_base, Config, warmup, columns)
+    results = []
+    for thresholds in threshold_list:
+        params = {**indicator_params, **thresholds}
+        config = type('SweepConfig', (Config,), params)
+        _, stats = evaluate_aligned(_base, fast, medium, slow, valid, config, fee)
+        results.append({**params, **stats})
+    return results
+
+
+def run_sweep(candles, grid=None, workers=None, fee=0.001, warmup=100):
+    """Executa o grid em paralelo sobre as velas base (DataFrame OHLCV de Config.BASE_TIMEFRAME)"""
+    combos = expand_grid(grid or DEFAULT_GRID)
+    groups = {}
+    for combo in combos:
+        key = tuple((k, combo[k]) for k in INDICATOR_PARAMS if k in combo)
+        groups.setdefault(key, []).append({k: v for k, v in combo.items() if k not in INDICATOR_PARAMS})
+
+    blocks, specs = _share(candles)
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                 initializer=_init_worker, initargs=(specs,)) as pool:
+            futures = [pool.submit(_run_group, dict(key), thresholds, fee, warmup)
+                       for key, thresholds in groups.items()]
+            for fut in as_completed(futures):
+                results.extend(fut.result())
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    table = pd.DataFrame(results)
+    if table.empty:
+        return table
+    return table.sort_values(['total_return', 'max_drawdown', 'trades'],
+                             ascending=[False, True, False]).reset_index(drop=True)
+
+
+def parse_grid(items):
+    """['BB_LENGTH=14,20', ...] -> grid só com esses parâmetros (sem itens: DEFAULT_GRID)
+
+    Os parâmetros fora do grid ficam nos valores de Config.
+    """
+    if not items:
+        return dict(DEFAULT_GRID)
+    grid = {}
+    for item in items:
+        key, values = item.split('=', 1)
+        cast = type(getattr(Config, key))
+        grid[key] = [cast(v) for v in values.split(',')]
+    return grid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grid search dos parâmetros da estratégia")
+    parser.add_argument('symbol', nargs='?', default=Config.SYMBOL)
+    parser.add_argument('start', nargs='?', default=None, help="YYYY-MM-DD (padrão: 90 dias atrás)")
+    parser.add_argument('end', nargs='?', default=None, help="YYYY-MM-DD (padrão: agora)")
+    parser.add_argument('--set', action='append', metavar='PARAM=V1,V2', help="Valores de um parâmetro")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--fee', type=float, default=0.001)
+    parser.add_argument('--db', default='trading_data.db')
+    parser.add_argument('--archive', default=None, help="Raiz do arquivo colunar (archive.py) em vez do banco")
+    parser.add_argument('--out', default='sweep_results.csv')
+    args = parser.parse_args()
+
+    end = pd.Timestamp(args.end) if args.end else pd.Timestamp.now(tz='UTC').tz_localize(None)
+    start = pd.Timestamp(args.start) if args.start else end - pd.Timedelta(days=90)
+    candles = load_base(args.symbol, start, end, args.db, args.archive)
+
+    grid = parse_grid(args.set)
+    t0 = time.perf_counter()
+    table = run_sweep(candles, grid, args.workers, args.fee)
+    elapsed = time.perf_counter() - t0
+
+    table.to_csv(args.out, index=False)
+    print(table.head(20).to_string(index=False))
+    print(f"\n⏱ {len(table)} combinações em {elapsed:.1f}s → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
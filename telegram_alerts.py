@@ -1,38 +1,257 @@
 """
-Telegram SYNC simples (requests) - sem asyncio complexo.
+Alertas Telegram sem bloquear o loop de sinais.
+
+Quem avalia a estratégia só enfileira a mensagem; uma thread de envio
+aplica o limite por chat (token bucket), junta mensagens acumuladas numa
+só e refaz o envio com backoff em 429/5xx, respeitando o retry_after.
 """
+import atexit
 import logging
+import queue
+import threading
+import time
+
 import requests
+
+import metrics
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+MAX_MESSAGE_CHARS = 4000  # Telegram aceita até 4096
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def ready_at(self, now):
+        """Momento em que haverá um token disponível"""
+        self._refill(now)
+        return now if self.tokens >= 1 else now + (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Batch:
+    """Mensagens pendentes de um (chat, parse_mode, silencioso)"""
+
+    def __init__(self):
+        self.texts = []
+        self.not_before = 0.0
+        self.attempts = 0
+
+
+def _chunk(texts):
+    """Quantas mensagens do início cabem juntas em MAX_MESSAGE_CHARS.
+
+    O corte é sempre entre mensagens: cortar no meio pode partir uma
+    entidade HTML/Markdown e o Telegram recusa o lote inteiro (400). Uma
+    mensagem maior que o limite sozinha segue inteira.
+    """
+    count, size = 0, -2
+    for text in texts:
+        size += len(text) + 2  # "\n\n" entre mensagens
+        if count and size > MAX_MESSAGE_CHARS:
+            break
+        count += 1
+    return count
+
+
+class AlertDispatcher:
+    def __init__(self, token=None, chat_id=None, base_url=None, maxsize=None,
+                 rate=None, burst=None, max_retries=5, timeout=10):
+        self.token = token or Config.TELEGRAM_BOT_TOKEN
+        self.chat_id = chat_id or Config.TELEGRAM_CHAT_ID
+        self.url = f"{base_url or Config.TELEGRAM_API_URL}/bot{self.token}/sendMessage"
+        self.rate = rate or Config.TELEGRAM_RATE
+        self.burst = burst or Config.TELEGRAM_BURST
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.queue = queue.Queue(maxsize=maxsize or Config.TELEGRAM_QUEUE_SIZE)
+        self.session = requests.Session()
+        self.stats = {'queued': 0, 'sent': 0, 'messages': 0, 'dropped': 0, 'failed': 0, 'retries': 0}
+        self._batches = {}
+        self._buckets = {}
+        self._waiters = []
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name='AlertDispatcher', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- API (nunca bloqueia) ---
+    def send(self, text, chat_id=None, parse_mode=None, silent=False):
+        """Enfileira um alerta; False se a fila estiver cheia (alerta descartado)"""
+        try:
+            self.queue.put_nowait(((chat_id or self.chat_id, parse_mode, silent), text))
+            self.stats['queued'] += 1
+            return True
+        except queue.Full:
+            self.stats['dropped'] += 1
+            metrics.inc('alerts', status='dropped')
+            logger.warning(f"⚠️ Fila de alertas cheia, descartado: {text[:50]}")
+            return False
+
+    def flush(self, timeout=None):
+        """Espera até tudo o que foi enfileirado ser enviado (ou desistido)"""
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=10):
+        """Hook de desligamento: tenta entregar o pendente e encerra a thread"""
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(timeout)
+
+    # --- thread de envio ---
+    def _next_wakeup(self, now):
+        times = [max(b.not_before, self._bucket(key).ready_at(now)) for key, b in self._batches.items()]
+        return min(times) - now if times else None
+
+    def _bucket(self, key):
+        chat = key[0]
+        if chat not in self._buckets:
+            self._buckets[chat] = TokenBucket(self.rate, self.burst)
+        return self._buckets[chat]
+
+    def _accept(self, item):
+        if item is None:
+            self._closing = True
+        elif isinstance(item, threading.Event):
+            self._waiters.append(item)
+        else:
+            key, text = item
+            self._batches.setdefault(key, _Batch()).texts.append(text)
+
+    def _run(self):
+        while True:
+            wait = self._next_wakeup(time.monotonic())
+            try:
+                if wait is not None and wait <= 0:
+                    item = self.queue.get_nowait()
+                else:
+                    item = self.queue.get(timeout=wait)
+                self._accept(item)
+                while True:  # Drena o que já chegou para juntar numa mensagem só
+                    self._accept(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            for key, batch in list(self._batches.items()):
+                bucket = self._bucket(key)
+                if batch.not_before <= now and bucket.ready_at(now) <= now:
+                    bucket.take(now)
+                    self._deliver(key, batch)
+                    if not batch.texts:
+                        del self._batches[key]
+
+            if not self._batches:
+                for waiter in self._waiters:
+                    waiter.set()
+                self._waiters = []
+                if self._closing:
+                    break
+
+    def _deliver(self, key, batch):
+        chat_id, parse_mode, silent = key
+        count = _chunk(batch.texts)
+        text = "\n\n".join(batch.texts[:count])
+
+        payload = {'chat_id': chat_id, 'text': text, 'disable_notification': silent}
+        if parse_mode:
+            payload['parse_mode'] = parse_mode
+        retry_after = None
+        try:
+            with metrics.span('telegram'):
+                resp = self.session.post(self.url, json=payload, timeout=self.timeout)
+            if resp.status_code == 200:
+                del batch.texts[:count]
+                batch.attempts = 0
+                self.stats['sent'] += 1
+                self.stats['messages'] += count
+                metrics.inc('alerts', count, status='sent')
+                return
+            if resp.status_code == 429:
+                try:
+                    retry_after = resp.json().get('parameters', {}).get('retry_after')
+                except ValueError:
+                    pass
+            elif resp.status_code < 500:
+                # Erro do pedido (4xx): reenviar não resolve
+                logger.error(f"❌ Telegram {resp.status_code}: {resp.text[:200]}")
+                del batch.texts[:count]
+                self.stats['failed'] += count
+                metrics.inc('alerts', count, status='failed')
+                return
+            error = f"HTTP {resp.status_code}"
+        except requests.RequestException as e:
+            error = str(e)
+
+        batch.attempts += 1
+        if batch.attempts > self.max_retries:
+            logger.error(f"❌ Telegram: desistindo após {self.max_retries} tentativas ({error})")
+            del batch.texts[:count]
+            batch.attempts = 0
+            self.stats['failed'] += count
+            metrics.inc('alerts', count, status='failed')
+            return
+        delay = retry_after if retry_after is not None else min(2 ** (batch.attempts - 1), 60)
+        batch.not_before = time.monotonic() + delay
+        self.stats['retries'] += 1
+        metrics.inc('alerts', status='retry')
+        logger.warning(f"⚠️ Telegram: {error}, nova tentativa em {delay}s")
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Dispatcher único do processo (criado no primeiro uso)"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = AlertDispatcher()
+        return _dispatcher
+
+
+def close_dispatcher(timeout=10):
+    """Entrega o pendente e descarta o dispatcher (o próximo uso cria outro com a Config atual)"""
+    global _dispatcher
+    with _dispatcher_lock:
+        dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher is not None:
+        dispatcher.close(timeout)
+
+
 class TelegramAlerts:
     def __init__(self):
         self.enabled = Config.is_telegram_enabled()
-        self.base_url = f"https://api.telegram.org/bot{Config.TELEGRAM_BOT_TOKEN}/sendMessage"
         if not self.enabled:
             logger.info("ℹ️ Telegram OFF")
-    
+
     def send_alert(self, message, alert_type="info"):
         if not self.enabled:
             emoji = {"entry_long": "🟢", "entry_short": "🔴", "exit": "🟡"}.get(alert_type, "ℹ️")
             logger.info(f"{emoji} {message}")
             return
-        
+
         emoji = {"entry_long": "🟢🚀", "entry_short": "🔴📉", "exit": "🟡💰"}.get(alert_type, "📊")
         full_msg = f"{emoji} <b>SOL Monitor</b>\n{escape_html(message)}"
-        
-        try:
-            requests.post(self.base_url, json={
-                'chat_id': Config.TELEGRAM_CHAT_ID,
-                'text': full_msg,
-                'parse_mode': 'HTML',
-                'disable_notification': alert_type not in ['entry_long', 'entry_short']
-            }).raise_for_status()
-            logger.info(f"✅ Telegram: {alert_type}")
-        except Exception as e:
-            logger.error(f"❌ Telegram: {e}")
+        get_dispatcher().send(full_msg, parse_mode='HTML',
+                              silent=alert_type not in ['entry_long', 'entry_short'])
+        logger.info(f"📨 Telegram enfileirado: {alert_type}")
 
 def escape_html(text):
     return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
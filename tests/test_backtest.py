@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import monitor
+from backtest import align, run_backtest, timeframe_columns
+from benchmarks import random_walk
+from config import Config
+from resampler import TimeframeSet, drop_timeframes
+from strategy import StrategyRuntime
+
+WARMUP = 30
+
+
+@pytest.fixture(scope='module')
+def candles():
+    return random_walk(6000, seed=3)
+
+
+@pytest.fixture
+def timeframes():
+    yield TimeframeSet('BT', Config)
+    drop_timeframes('BT')  # motores são do processo (indicators.get_engine)
+
+
+def test_forming_columns_match_live(candles, timeframes):
+    """Indicadores da vela em formação = os do TimeframeSet a cada fechamento de 1m"""
+    df = candles.iloc[:3000]
+    columns = {name: timeframe_columns(df, interval, Config) for name, interval in Config.TIMEFRAMES.items()}
+    for i, row in enumerate(df.itertuples(index=False)):
+        timeframes.update(int(row.timestamp.value // 1_000_000), *row[1:])
+        if i % 97 or i < 2500:
+            continue
+        for name, rows in timeframes.rows(1).items():
+            for col in ('close', 'EMA_6', 'EMA_99', 'MACD_hist', 'RSI', 'BBP'):
+                np.testing.assert_allclose(columns[name][col][i], rows[-1][col], rtol=1e-9, atol=1e-9,
+                                           err_msg=f"{name} {col} {i}")
+
+
+def test_backtest_matches_live_decisions(candles, timeframes, monkeypatch):
+    """Entradas/saídas do backtest = monitor.decide sobre as velas em formação, minuto a minuto"""
+    monkeypatch.setattr(monitor, 'runtime', StrategyRuntime(Config))
+    trades, stats = run_backtest(candles, Config, warmup=WARMUP)
+    valid = align(candles, Config, WARMUP)[3]
+
+    pos, events = 'IDLE', []
+    for i, row in enumerate(candles.itertuples(index=False)):
+        timeframes.update(int(row.timestamp.value // 1_000_000), *row[1:])
+        if not valid[i]:
+            continue
+        new, _, _ = monitor.decide(timeframes.rows(), pos, 'BT')
+        if new != pos:
+            events.append((i, new))
+            pos = new
+
+    expected = []
+    for trade in trades.itertuples():
+        expected.append((trade.entry_idx, trade.side))
+        if not trade.open:
+            expected.append((trade.exit_idx, 'IDLE'))
+    assert events and events == expected
+    assert stats['trades'] == len(trades)
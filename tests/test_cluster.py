@@ -0,0 +1,146 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import cluster
+from benchmarks import random_walk
+from config import Config
+from stubs import BinanceStub, FakeClock, KlineStreamStub
+
+SYMBOLS = ['AAAUSDT', 'BBBUSDT', 'CCCUSDT', 'DDDUSDT', 'EEEUSDT', 'FFFUSDT']
+BACKFILL = 1200  # velas no banco antes do stream (20h: começa numa hora cheia)
+PHASE = 4        # velas publicadas em cada fase do teste
+
+
+class Recorder(cluster.Coordinator):
+    """Coordenador que anota (símbolo, open_time, worker) de cada sinal aceito"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.accepted = []
+
+    def on_signal(self, wid, row, alert):
+        super().on_signal(wid, row, alert)
+        if self.last.get(row['symbol']) is row:
+            self.accepted.append((row['symbol'], row['time'], wid))
+
+
+@pytest.fixture
+def market(tmp_path, monkeypatch):
+    frames = {s: random_walk(BACKFILL + 3 * PHASE, seed=i, start='2024-03-01') for i, s in enumerate(SYMBOLS)}
+    open_time = frames[SYMBOLS[0]]['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64')
+    clock = FakeClock(open_time[BACKFILL], shared=True)
+    rest = BinanceStub(clock)
+    for symbol, df in frames.items():
+        rest.add(symbol, '1m', df)
+    monkeypatch.setattr(Config, 'TELEGRAM_BOT_TOKEN', None)
+    monkeypatch.setattr(cluster, 'RESTART_DELAY', 3600)  # reinício disparado pelo teste
+    with rest, KlineStreamStub() as stream, clock.install():
+        monkeypatch.setattr(Config, 'REST_URL', rest.url)
+        monkeypatch.setattr(Config, 'WS_URL', stream.url)
+        coordinator = Recorder(SYMBOLS, workers=3, db_path=str(tmp_path / 'cluster.db'), bars=20,
+                               heartbeat=0.2, worker_setup=clock.patch)
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_until_complete, args=(coordinator.run(),), daemon=True)
+        thread.start()
+
+        def shutdown():
+            """Para o stream e espera o coordenador encerrar workers e gravar tudo"""
+            if thread.is_alive():
+                coordinator.running = False
+                stream.stop()
+                thread.join(30)
+        try:
+            yield frames, open_time, clock, stream, coordinator, loop, shutdown
+        finally:
+            shutdown()
+            loop.close()
+
+
+def _query(loop, fn):
+    """Lê o estado do coordenador dentro do event loop dele"""
+    async def call():
+        return fn()
+    return asyncio.run_coroutine_threadsafe(call(), loop).result(10)
+
+
+def _wait(loop, predicate, what, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not _query(loop, predicate):
+        assert time.monotonic() < deadline, f"tempo esgotado esperando: {what}"
+        time.sleep(0.05)
+
+
+def _settled(c):
+    """Todo símbolo com o dono indicado pelo anel, sem transferência pendente"""
+    return not c.moving and all(c.owner.get(s) == c.ring.node(s) is not None for s in SYMBOLS)
+
+
+def _publish(market, start, stop):
+    frames, open_time, clock, stream, coordinator, loop, shutdown = market
+    for i in range(start, stop):
+        clock.set(open_time[i] + 60_000)
+        for symbol, df in frames.items():
+            row = df.iloc[i]
+            stream.publish(symbol, '1m', open_time[i], row['open'], row['high'], row['low'], row['close'],
+                           row['volume'])
+    last = int(open_time[stop - 1])
+    _wait(loop, lambda: all(coordinator.last.get(s, {}).get('time') == last for s in SYMBOLS),
+          f"sinais até {last}")
+
+
+def test_failover_and_release(market):
+    frames, open_time, clock, stream, coordinator, loop, shutdown = market
+    assert stream.connected.wait(30), "coordenador não conectou"
+    _wait(loop, lambda: _settled(coordinator) and len(coordinator.stats) == 3, "distribuição inicial")
+    _publish(market, BACKFILL, BACKFILL + PHASE)
+
+    # Mata o worker com mais símbolos: os símbolos dele vão para os outros
+    owners = _query(loop, lambda: dict(coordinator.owner))
+    victim = max(set(owners.values()), key=list(owners.values()).count)
+    moved = sorted(s for s, w in owners.items() if w == victim)
+    _query(loop, lambda: coordinator.procs[victim]).kill()
+    _wait(loop, lambda: victim not in coordinator.procs and _settled(coordinator), "redistribuição")
+    assert not {coordinator.owner[s] for s in moved} & {victim}
+    _publish(market, BACKFILL + PHASE, BACKFILL + 2 * PHASE)
+
+    # Volta o worker: cada símbolo é liberado pelo dono temporário e retomado no ponto em que parou
+    _query(loop, lambda: coordinator._restart(victim))
+    _publish(market, BACKFILL + 2 * PHASE, BACKFILL + 3 * PHASE)
+    _wait(loop, lambda: _settled(coordinator), "retorno dos símbolos")
+    assert {coordinator.owner[s] for s in moved} == {victim}
+
+    accepted = _query(loop, lambda: list(coordinator.accepted))
+    live = [int(t) for t in open_time[BACKFILL:BACKFILL + 3 * PHASE]]
+    phase = {t: i // PHASE for i, t in enumerate(live)}
+    for symbol in moved:
+        by = [{w for s, t, w in accepted if s == symbol and phase[t] == p} for p in range(3)]
+        assert by[0] == {victim} and victim not in by[1] and by[2] == {victim}, (symbol, by)
+
+    # Heartbeats trazem as contas de cada worker (o reiniciado começa do zero)
+    restarted = {w: sum(1 for s, t, wid in accepted if wid == w and (w != victim or phase[t] == 2))
+                 for w in range(3)}
+    _wait(loop, lambda: all(coordinator.stats[w]['evaluations'] == n for w, n in restarted.items()),
+          "heartbeats com as avaliações")
+    stats = _query(loop, lambda: dict(coordinator.stats))
+    for w in range(3):
+        assert stats[w]['symbols'] == sum(1 for s in SYMBOLS if coordinator.owner[s] == w)
+        assert stats[w]['klines'] >= stats[w]['evaluations']
+
+    # Livro de sinais: um sinal por vela publicada, sem lacunas nem repetições, posição encadeada
+    shutdown()
+    conn = sqlite3.connect(coordinator.db_path)
+    try:
+        for symbol in SYMBOLS:
+            rows = conn.execute('SELECT time, action, state FROM signals WHERE symbol = ? ORDER BY id',
+                                (symbol,)).fetchall()
+            assert [r[0] for r in rows] == live, symbol
+            pos = 'IDLE'
+            for _, action, state in rows:
+                assert action in (('REJECT', 'ENTRY') if pos == 'IDLE' else ('HOLD', 'EXIT')), (symbol, rows)
+                pos = state
+    finally:
+        conn.close()
@@ -0,0 +1,166 @@
+import sqlite3
+
+import pytest
+
+import database
+from benchmarks import random_walk
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'BUSY_TIMEOUT', 0.2)
+    path = str(tmp_path / 'trading.db')
+    conn = database.init_db(path)
+    database.set_order_state(conn, 'LONG')
+    conn.close()
+    return path
+
+
+def test_locked_database_is_not_replaced(db_path, tmp_path):
+    locker = sqlite3.connect(db_path, isolation_level=None)
+    locker.execute('PRAGMA locking_mode=EXCLUSIVE')
+    locker.execute('BEGIN EXCLUSIVE')
+    try:
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            database.init_db(db_path)
+    finally:
+        locker.execute('ROLLBACK')
+        locker.close()
+    assert not list(tmp_path.glob('*.corrupt*'))
+    assert database.get_order_state(database.init_db(db_path)) == 'LONG'
+
+
+def test_corrupt_file_is_set_aside(tmp_path):
+    path = tmp_path / 'trading.db'
+    path.write_text('não é um banco\n' * 100)
+    conn = database.init_db(str(path))
+    assert database.get_order_state(conn) == 'IDLE'
+    assert (tmp_path / 'trading.db.corrupt').read_text().startswith('não é um banco')
+
+
+def test_batch_writer_raises_when_db_cannot_open(tmp_path):
+    with pytest.raises(sqlite3.OperationalError):
+        database.BatchWriter(str(tmp_path / 'nao_existe' / 'x.db'))
+
+
+def test_batch_writer_raises_when_db_is_locked(db_path):
+    locker = sqlite3.connect(db_path, isolation_level=None)
+    locker.execute('PRAGMA locking_mode=EXCLUSIVE')
+    locker.execute('BEGIN EXCLUSIVE')
+    try:
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            database.BatchWriter(db_path)
+    finally:
+        locker.execute('ROLLBACK')
+        locker.close()
+
+
+def test_batch_writer_keeps_failed_batch(db_path):
+    writer = database.BatchWriter(db_path, max_delay=0.05)
+    locker = sqlite3.connect(db_path, isolation_level=None)
+    locker.execute('BEGIN EXCLUSIVE')
+    try:
+        writer.set_order_state('SHORT')
+        writer.save_candle('SOLUSDT', '1m', 0, 1.0, 2.0, 0.5, 1.5, 10.0)
+        assert writer.flush(timeout=5)
+        assert writer.stats()['pending'] == 2 and writer.rows_written == 0
+    finally:
+        locker.execute('ROLLBACK')
+        locker.close()
+    writer.save_candle('SOLUSDT', '1m', 60_000, 1.5, 2.0, 1.0, 1.8, 12.0)
+    assert writer.flush(timeout=5)
+    writer.close()
+    assert writer.rows_written == 3
+    conn = database.init_db(db_path)
+    assert database.get_order_state(conn) == 'SHORT'
+    assert conn.execute('SELECT COUNT(*) FROM candles').fetchone()[0] == 2
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    conn = database.init_db(str(tmp_path / 'ledger.db'))
+    decisions = [  # (símbolo, minuto, posição antes, depois, preço)
+        ('SOLUSDT', 0, 'IDLE', 'IDLE', 100.0),
+        ('SOLUSDT', 1, 'IDLE', 'LONG', 100.0),
+        ('SOLUSDT', 2, 'LONG', 'LONG', 104.0),
+        ('SOLUSDT', 3, 'LONG', 'IDLE', 110.0),    # +10%
+        ('BTCUSDT', 1, 'IDLE', 'SHORT', 200.0),
+        ('BTCUSDT', 4, 'SHORT', 'IDLE', 210.0),   # -5%
+        ('SOLUSDT', 5, 'IDLE', 'SHORT', 120.0),
+        ('SOLUSDT', 6, 'SHORT', 'IDLE', 108.0),   # +10%
+        ('ETHUSDT', 2, 'IDLE', 'LONG', 50.0),     # ainda aberta
+    ]
+    for symbol, minute, pos, new_pos, price in decisions:
+        database.record_signal(conn, symbol, minute * 60_000, pos, new_pos, price, 'teste', {'RSI': float('nan')})
+    yield conn
+    conn.close()
+
+
+def test_ledger_pnl_and_trade_stats(ledger):
+    exits = database.load_signals(ledger, 'SOLUSDT', action='EXIT')
+    assert list(exits['pnl'].round(12)) == [0.1, 0.1]
+    assert list(exits['entry_price']) == [100.0, 120.0]
+    hold = database.load_signals(ledger, 'SOLUSDT', action='HOLD').iloc[0]
+    assert hold['entry_price'] == 100.0 and hold['pnl'] is None
+    assert database.load_signals(ledger, 'SOLUSDT', limit=1)['time'].tolist() == [6 * 60_000]
+
+    stats = database.trade_stats(ledger)
+    assert stats['trades'] == 3 and stats['wins'] == 2
+    assert stats['win_rate'] == pytest.approx(2 / 3) and stats['pnl'] == pytest.approx(0.15)
+    assert stats['worst'] == pytest.approx(-0.05) and stats['best'] == pytest.approx(0.1)
+    sol = database.trade_stats(ledger, 'SOLUSDT', start_ms=4 * 60_000)
+    assert sol['trades'] == 1 and sol['pnl'] == pytest.approx(0.1)
+    empty = database.trade_stats(ledger, 'XRPUSDT')
+    assert empty == {'trades': 0, 'wins': 0, 'win_rate': None, 'pnl': 0.0, 'avg_pnl': None,
+                     'worst': None, 'best': None}
+
+
+def test_latest_signals(ledger):
+    latest = database.latest_signals(ledger)
+    assert latest['symbol'].tolist() == ['BTCUSDT', 'ETHUSDT', 'SOLUSDT']
+    assert latest['state'].tolist() == ['IDLE', 'LONG', 'IDLE']
+    assert latest['time'].tolist() == [4 * 60_000, 2 * 60_000, 6 * 60_000]
+    assert latest.set_index('symbol').loc['ETHUSDT', 'indicators'] == '{"RSI":null}'
+    for row in latest.to_dict('records'):
+        assert row['id'] == database.load_signals(ledger, row['symbol'], limit=1)['id'].iloc[0]
+
+
+def test_find_gaps(tmp_path):
+    conn = database.init_db(str(tmp_path / 'gaps.db'))
+    df = random_walk(100, seed=1)
+    kept = df.drop(index=[10, 11, 12, 50]).reset_index(drop=True)
+    database.save_candles(conn, 'SOLUSDT', '1m', kept)
+    database.save_candles(conn, 'BTCUSDT', '1m', df)  # outro símbolo não conta
+    t0 = int(df['timestamp'].iloc[0].value // 1_000_000)
+    minute = 60_000
+    assert database.find_gaps(conn, 'SOLUSDT', '1m') == [(t0 + 10 * minute, t0 + 13 * minute),
+                                                        (t0 + 50 * minute, t0 + 51 * minute)]
+    assert database.find_gaps(conn, 'SOLUSDT', '1m', start_ms=t0 + 20 * minute) == [
+        (t0 + 50 * minute, t0 + 51 * minute)]
+    assert database.find_gaps(conn, 'SOLUSDT', '1m', end_ms=t0 + 50 * minute) == [
+        (t0 + 10 * minute, t0 + 13 * minute)]
+    assert database.find_gaps(conn, 'BTCUSDT', '1m') == []
+    assert database.find_gaps(conn, 'SOLUSDT', '5m') == []
+    conn.close()
+
+
+def test_migrations_keep_v1_data(tmp_path, capsys):
+    path = str(tmp_path / 'legado.db')
+    legacy = sqlite3.connect(path)
+    legacy.executescript(database.MIGRATIONS[0])  # esquema original, sem user_version
+    legacy.execute("INSERT INTO state (key, value) VALUES ('pos', 'SHORT')")
+    legacy.execute("INSERT INTO history (timestamp, price, rsi) VALUES ('2024-01-01 00:00:00', 100.0, 55.0)")
+    legacy.commit()
+    legacy.close()
+
+    conn = database.init_db(path)
+    assert capsys.readouterr().out.count('Banco migrado') == len(database.MIGRATIONS)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == len(database.MIGRATIONS)
+    assert database.get_order_state(conn) == 'SHORT'
+    assert database.get_last_rsi(conn) == 55.0
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'history', 'state', 'candles', 'signals'} <= tables
+    conn.close()
+
+    database.init_db(path).close()  # já atualizado: nada a aplicar
+    assert 'Banco migrado' not in capsys.readouterr().out
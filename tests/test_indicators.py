@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from benchmarks import random_walk
+from config import Config
+from indicators import COLUMNS, IndicatorEngine, enrich_dataframe
+
+INDICATORS = COLUMNS[6:]
+
+
+def _assert_close(got, expected):
+    """Igual dentro da tolerância de ponto flutuante (não bit a bit: EMA/BB diferem ~1e-14)"""
+    scale = np.abs(expected['close'].to_numpy())
+    for col in INDICATORS:
+        a, b = got[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float)
+        # Desvio móvel do pandas é incremental: erro relativo ao preço nas bandas
+        atol = 1e-6 * scale if col in ('BBM', 'BBU', 'BBL') else 1e-9
+        assert np.allclose(a, b, rtol=1e-9, atol=atol, equal_nan=True), col
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_engine_matches_enrich_dataframe(seed):
+    df = random_walk(400, seed=seed)
+    engine = IndicatorEngine(Config).seed(df)
+    expected = enrich_dataframe(df.copy(), Config, backend='pandas').tail(len(engine.rows)).reset_index(drop=True)
+    _assert_close(engine.to_frame(), expected)
+
+
+def test_forming_candle_is_replaced():
+    df = random_walk(300, seed=2)
+    engine = IndicatorEngine(Config).seed(df.iloc[:-1])
+    last = df.iloc[-1]
+    engine.update(last['timestamp'], last['open'], last['high'], last['low'], last['close'] * 1.01,
+                  last['volume'])
+    engine.update(*last)
+    expected = enrich_dataframe(df.copy(), Config, backend='pandas').tail(len(engine.rows)).reset_index(drop=True)
+    _assert_close(engine.to_frame(), expected)
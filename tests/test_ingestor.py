@@ -0,0 +1,125 @@
+import asyncio
+import sqlite3
+import threading
+
+import numpy as np
+import pytest
+
+import ingestor
+from benchmarks import random_walk
+from config import Config
+from indicators import drop_engines
+from stubs import BinanceStub, FakeClock, KlineStreamStub
+
+SYMBOL = 'SOLUSDT'
+BACKFILL = 1200  # velas fechadas antes do stream (20h: começa numa hora cheia)
+LIVE = 90        # velas publicadas no stream (fecha uma vela de 1h e 18 de 5m)
+
+
+@pytest.fixture
+def market(monkeypatch):
+    df = random_walk(BACKFILL + LIVE, seed=5, start='2024-03-01')
+    open_time = df['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64')
+    clock = FakeClock(open_time[BACKFILL])
+    with BinanceStub(clock).add(SYMBOL, '1m', df) as rest, KlineStreamStub() as stream, clock.install():
+        monkeypatch.setattr(Config, 'SYMBOL', SYMBOL)
+        monkeypatch.setattr(Config, 'REST_URL', rest.url)
+        monkeypatch.setattr(Config, 'WS_URL', stream.url)
+        yield df, open_time, clock, rest, stream
+    drop_engines(SYMBOL)  # motores são do processo (indicators.get_engine)
+
+
+def _play(market, processed):
+    """Publica as velas ao vivo e devolve um Event que encerra o ingestor depois de tudo processado"""
+    df, open_time, clock, _, stream = market
+    stop = threading.Event()
+    errors = []
+
+    def play():
+        try:
+            assert stream.connected.wait(10), "ingestor não conectou"
+            cols = [df[c].to_numpy() for c in ('open', 'high', 'low', 'close', 'volume')]
+            for i in range(BACKFILL, BACKFILL + LIVE):
+                clock.set(open_time[i] + 60_000)
+                stream.publish(SYMBOL, '1m', open_time[i], *(col[i] for col in cols))
+            assert processed.wait(10), "ingestor não processou as velas"
+        except Exception as e:
+            errors.append(e)
+        finally:
+            stop.set()
+
+    thread = threading.Thread(target=play, daemon=True)
+    thread.start()
+    return stop, errors
+
+
+def test_backfill_then_stream(market):
+    df, _, _, rest, _ = market
+    closes = []
+    done = threading.Event()
+
+    def on_close(interval, ing):
+        closes.append(interval)
+        if closes.count('1m') == LIVE:
+            done.set()
+
+    ing = ingestor.KlineIngestor(Config, on_close=on_close, limit=10)
+    stop, errors = _play(market, done)
+    asyncio.run(ingestor.run_until(ing, stop))
+    assert not errors, errors
+
+    assert rest.requests and all(q['symbol'] == SYMBOL and q['interval'] == '1m' for q in rest.requests)
+    assert closes.count('1m') == LIVE and closes.count('5m') == LIVE // 5 and closes.count('1h') == 1
+
+    frames = ing.frames()
+    fast = frames['fast']
+    tail = df.iloc[-len(fast):].reset_index(drop=True)
+    for col in ('open', 'high', 'low', 'close', 'volume'):
+        np.testing.assert_allclose(fast[col].to_numpy(), tail[col].to_numpy(), err_msg=col)
+    # Vela de 1h fechada no stream = agregação das 60 velas de 1m publicadas
+    hour = df.iloc[BACKFILL:BACKFILL + 60]
+    slow = frames['slow'].iloc[-2]
+    assert slow['open'] == hour['open'].iloc[0] and slow['close'] == hour['close'].iloc[-1]
+    assert slow['high'] == hour['high'].max() and slow['low'] == hour['low'].min()
+    np.testing.assert_allclose(slow['volume'], hour['volume'].sum())
+
+
+def test_open_candle_does_not_close(market):
+    _, open_time, *_ = market
+    ing = ingestor.KlineIngestor(Config, limit=10)
+    ing._backfill()
+    raw = ('{"data":{"k":{"t":%d,"i":"1m","o":"1","h":"2","l":"0.5","c":"1.5","v":"10","x":false}}}'
+           % open_time[BACKFILL])
+    assert ing.handle_message(raw) == []
+    assert ing.rows()['fast'][-1]['close'] == 1.5
+    assert ing.handle_message(raw.replace('"x":false', '"x":true')) == ['1m']
+
+
+def test_main_records_signals_and_candles(market, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Config, 'TELEGRAM_BOT_TOKEN', None)
+    monkeypatch.setattr(Config, 'METRICS_PORT', None)
+    done = threading.Event()
+    real_dispatch = ingestor.KlineIngestor._dispatch
+    seen = []
+
+    async def dispatch(self, interval):
+        await real_dispatch(self, interval)
+        if interval == '1m':
+            seen.append(interval)
+            if len(seen) == LIVE:
+                done.set()
+    monkeypatch.setattr(ingestor.KlineIngestor, '_dispatch', dispatch)
+
+    stop, errors = _play(market, done)
+    ingestor.main(stop=stop)
+    assert not errors, errors
+
+    conn = sqlite3.connect(tmp_path / 'trading_data.db')
+    try:
+        assert conn.execute('SELECT COUNT(*) FROM signals WHERE symbol = ?', (SYMBOL,)).fetchone()[0] == LIVE
+        candles = conn.execute("SELECT COUNT(*) FROM candles WHERE symbol = ? AND timeframe = '1m'",
+                               (SYMBOL,)).fetchone()[0]
+        assert candles == BACKFILL + LIVE  # backfill (todo o histórico do stub) + stream
+    finally:
+        conn.close()
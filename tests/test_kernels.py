@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import kernels
+from benchmarks import random_walk_matrix
+from config import Config
+from indicators import enrich_matrix
+
+
+def _python_fused(close, *args):
+    """Laço do numba rodando em Python puro (confere a lógica sem o numba instalado)"""
+    out = np.empty((len(kernels.COLUMNS),) + close.shape)
+    kernels._fused(np.ascontiguousarray(close, dtype=np.float64), *args, out)
+    return dict(zip(kernels.COLUMNS, out))
+
+
+BACKENDS = {**kernels.BACKENDS, 'python': _python_fused}
+CASES = {'scanner': (150, 50), 'longa': (5000, 1), 'poucas velas': (10, 3)}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('shape', CASES.values(), ids=CASES.keys())
+@pytest.mark.parametrize('decimals', [None, 1], ids=['contínuo', 'arredondado'])
+def test_backend_matches_pandas(backend, shape, decimals):
+    if backend == 'python' and shape[0] > 1000:
+        pytest.skip("laço em Python puro só com séries curtas")
+    close = random_walk_matrix(*shape)[:, :, 3]
+    if decimals is not None:
+        close = np.round(close, decimals)  # janelas constantes, bandas nulas
+    assert kernels.check(BACKENDS[backend], close, Config) == {}
+
+
+@pytest.mark.parametrize('backend', kernels.BACKENDS)
+def test_enrich_matrix_backend(backend):
+    close = random_walk_matrix(150, 20, seed=4)[:, :, 3]
+    expected = enrich_matrix(close, Config, backend='pandas')
+    got = enrich_matrix(close, Config, backend=backend)
+    for col in ('EMA_6', 'EMA_99', 'MACD', 'MACD_signal', 'MACD_hist', 'RSI'):
+        np.testing.assert_allclose(got[col], expected[col], rtol=1e-9, atol=1e-9, err_msg=col)
+    for col in ('BBM', 'BBU', 'BBL'):
+        np.testing.assert_allclose(got[col], expected[col], rtol=1e-9, atol=1e-6 * close.max(), err_msg=col)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        kernels.get_kernel('fortran')
+
+
+def test_numba_backend_leaves_module_helpers_alone():
+    div, fused = kernels._div, kernels._fused
+    if 'numba' in kernels.BACKENDS:
+        kernels.numba_indicators(np.ones((3, 1)), *kernels.params(Config))
+    assert (kernels._div, kernels._fused) == (div, fused)
+    assert kernels._div(1.0, 0.0) == np.inf and np.isnan(kernels._div(0.0, 0.0))
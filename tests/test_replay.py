@@ -0,0 +1,43 @@
+import pytest
+
+from benchmarks import random_walk
+from config import Config
+from database import init_db
+from replay import Replay, ledger_digest
+
+SYMBOL = 'SOLUSDT'
+
+
+@pytest.fixture
+def candles():
+    return random_walk(1260, seed=9, start='2024-03-01')
+
+
+def _replay(candles, mode, workdir, monkeypatch):
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    start_ms = int(candles['timestamp'].iloc[1200].timestamp() * 1000)
+    replay = Replay(SYMBOL, candles, start_ms, speed=0)
+    replay.run(mode)
+    conn = init_db()
+    try:
+        return replay, ledger_digest(conn), conn.execute('SELECT COUNT(*) FROM signals').fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('mode', ['monitor', 'ingestor'])
+def test_replay_restores_config(candles, mode, tmp_path, monkeypatch):
+    before = {name: getattr(Config, name) for name in Replay.OVERRIDES}
+    digests = []
+    for run in range(2):
+        replay, digest, signals = _replay(candles, mode, tmp_path / str(run), monkeypatch)
+        assert replay.played == 60 and signals == 60
+        assert {name: getattr(Config, name) for name in Replay.OVERRIDES} == before
+        digests.append(digest)
+    assert digests[0] == digests[1]  # mesmo dado, mesma configuração, mesmo livro
+
+
+def test_modes_agree(candles, tmp_path, monkeypatch):
+    assert (_replay(candles, 'monitor', tmp_path / 'm', monkeypatch)[1]
+            == _replay(candles, 'ingestor', tmp_path / 'i', monkeypatch)[1])
@@ -0,0 +1,76 @@
+import json
+
+import pandas as pd
+import pytest
+
+import monitor
+from benchmarks import random_walk
+from config import Config
+from resampler import TimeframeSet, drop_timeframes
+
+SYMBOL = 'SNAP'
+
+
+@pytest.fixture
+def candles():
+    df = random_walk(1500, seed=4)
+    yield df
+    drop_timeframes(SYMBOL)
+
+
+def _feed(timeframes, df):
+    for row in df.itertuples(index=False):
+        timeframes.update(int(row.timestamp.value // 1_000_000), *row[1:])
+
+
+def test_state_round_trip(candles, tmp_path):
+    path = tmp_path / 'state.json'
+    timeframes = TimeframeSet(SYMBOL, Config).seed(candles.iloc[:1400])
+    timeframes.save_state(path)
+    json.loads(path.read_text())  # só valores, nada de objetos serializados
+    _feed(timeframes, candles.iloc[1400:])
+    ns = {'timestamp': 'datetime64[ns]'}  # JSON guarda o instante, não a resolução do Timestamp
+    expected = {name: frame.astype(ns) for name, frame in timeframes.frames().items()}
+
+    drop_timeframes(SYMBOL)
+    restored = TimeframeSet(SYMBOL, Config)
+    assert restored.load_state(path)
+    _feed(restored, candles.iloc[1400:])
+    for name, frame in restored.frames().items():
+        pd.testing.assert_frame_equal(frame.astype(ns), expected[name])
+
+
+def test_incompatible_state_is_ignored(candles, tmp_path, monkeypatch):
+    path = tmp_path / 'state.json'
+    TimeframeSet(SYMBOL, Config).seed(candles).save_state(path)
+    monkeypatch.setattr(Config, 'BB_LENGTH', Config.BB_LENGTH + 1)
+    assert not TimeframeSet(SYMBOL, Config).load_state(path)
+    assert path.exists()  # outra configuração: só recalcula (a rodada regrava)
+
+
+@pytest.mark.parametrize('corrupt', [
+    lambda state: 'not json {',
+    lambda state: json.dumps({**state, 'engines': {}}),
+    lambda state: json.dumps({**state, 'resampler': {'closed': {'1m': [1, 2]}, 'current': None}}),
+])
+def test_malformed_state_is_deleted(candles, tmp_path, corrupt):
+    path = tmp_path / 'state.json'
+    TimeframeSet(SYMBOL, Config).seed(candles).save_state(path)
+    path.write_text(corrupt(json.loads(path.read_text())))
+    drop_timeframes(SYMBOL)
+    assert not TimeframeSet(SYMBOL, Config).load_state(path)
+    assert not path.exists()
+
+
+def test_failed_run_deletes_snapshot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / 'state.json'
+    path.write_text('{}')
+    monkeypatch.setattr(Config, 'SNAPSHOT_FILE', str(path))
+    monkeypatch.setattr(Config, 'METRICS_FILE', None)
+
+    def fetch_rows(conn):
+        raise ValueError("estado restaurado inconsistente")
+    monkeypatch.setattr(monitor, 'fetch_rows', fetch_rows)
+    monitor.main()
+    assert not path.exists()
@@ -0,0 +1,92 @@
+import pytest
+
+from benchmarks import random_walk
+from config import Config
+from indicators import enrich_dataframe
+from monitor import kline_weight
+from resampler import resample_frame
+from scanner import Scanner, WeightBudget
+from strategy import check_long_entry, check_short_entry
+from stubs import BinanceStub, FakeClock
+
+SYMBOLS = [f"S{i}USDT" for i in range(8)]
+CANDLES = 150 * 60 + 30  # 150 velas de 1h fechadas + uma hora em formação (não servida)
+
+
+@pytest.fixture(scope='module')
+def history():
+    return {s: random_walk(CANDLES, seed=20 + i) for i, s in enumerate(SYMBOLS)}
+
+
+@pytest.fixture
+def market(history, monkeypatch):
+    last = history[SYMBOLS[0]]['timestamp'].iloc[-1]
+    clock = FakeClock(last.value // 1_000_000 + 60_000)
+    rest = BinanceStub(clock)
+    for symbol, df in history.items():
+        for interval in dict.fromkeys(Config.TIMEFRAMES.values()):
+            rest.add(symbol, interval, resample_frame(df, interval))
+    with rest, clock.install():
+        monkeypatch.setattr(Config, 'REST_URL', rest.url)
+        yield clock, rest
+
+
+def _expected(df, clock):
+    """check_long_entry/check_short_entry sobre as mesmas velas fechadas que o scanner recebe"""
+    frames = []
+    for name in ('fast', 'medium', 'slow'):
+        interval = Config.TIMEFRAMES[name]
+        bars = resample_frame(df, interval)
+        step = (bars['timestamp'].iloc[1] - bars['timestamp'].iloc[0]).value // 1_000_000
+        closed = bars[bars['timestamp'].astype('int64') // 10**6 + step <= clock.now_ms]
+        frames.append(enrich_dataframe(closed.tail(150).reset_index(drop=True), Config))
+    ok_l, msg_l = check_long_entry(*frames, Config)
+    ok_s, msg_s = check_short_entry(*frames, Config)
+    if ok_l:
+        return 'LONG', msg_l
+    if ok_s:
+        return 'SHORT', msg_s
+    return '', f"L {msg_l} | S {msg_s}"
+
+
+def test_ranking_matches_strategy(market, history):
+    clock, rest = market
+    scanner = Scanner(Config)
+    table = scanner.run(SYMBOLS)
+    assert sorted(table['symbol']) == SYMBOLS
+    for row in table.itertuples():
+        assert (row.signal, row.reason) == _expected(history[row.symbol], clock), row.symbol
+    # Com sinal primeiro, depois pelo número de filtros aprovados
+    keys = list(zip(table['signal'] == '', -table['score'], table['symbol']))
+    assert keys == sorted(keys)
+    assert len(rest.requests) == len(SYMBOLS) * 3
+    assert scanner.budget.total == len(rest.requests) * kline_weight(scanner.limit)
+
+
+def test_weight_budget_limits_requests(market, monkeypatch):
+    clock, rest = market
+    per_symbol = 3 * kline_weight(150)
+    monkeypatch.setattr(Config, 'API_WEIGHT_LIMIT', 3 * per_symbol)
+    monkeypatch.setattr(Config, 'SCAN_MAX_WORKERS', 1)  # ordem de pedido determinística
+    scanner = Scanner(Config)
+    table = scanner.run(SYMBOLS)
+
+    # Só cabem 3 símbolos no minuto; os demais estouram o prazo sem esperar a virada
+    assert scanner.budget.total == 3 * per_symbol and len(rest.requests) == 9
+    failed = table[table['score'] == -1]
+    assert len(failed) == len(SYMBOLS) - 3
+    assert failed['reason'].str.contains('peso da API esgotado').all()
+    assert list(table['symbol'][-len(failed):]) == list(failed['symbol'])  # falhas no fim do ranking
+
+
+def test_weight_budget_rolls_over_and_observes(market):
+    clock, _ = market
+    clock.set(60_000 * 1000)
+    budget = WeightBudget(10)
+    assert budget.acquire(8)
+    assert not budget.acquire(5, deadline=clock.time() + 1)
+    budget.observe({'X-MBX-USED-WEIGHT-1M': '9'})  # outro processo gastou mais
+    assert budget.used == 9 and not budget.acquire(2, deadline=clock.time() + 1)
+    clock.set(60_060 * 1000)  # minuto seguinte
+    assert budget.acquire(10) and budget.used == 10 and budget.total == 18
+    assert budget.minute == 1001
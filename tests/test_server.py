@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+import pytest
+from websockets.asyncio.client import connect
+from websockets.asyncio.server import serve
+
+import server
+from benchmarks import random_walk
+from config import Config
+from database import init_db, set_order_state
+from indicators import drop_engines
+from ingestor import KlineIngestor
+from strategy import check_long_entry, check_short_entry
+from stubs import BinanceStub, FakeClock, KlineStreamStub
+
+SYMBOL = 'SOLUSDT'
+BACKFILL = 1200
+LIVE = 12
+
+
+@pytest.fixture
+def market(monkeypatch):
+    df = random_walk(BACKFILL + LIVE, seed=6, start='2024-03-01')
+    open_time = df['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64')
+    clock = FakeClock(open_time[BACKFILL])
+    with BinanceStub(clock).add(SYMBOL, '1m', df) as rest, KlineStreamStub() as stream, clock.install():
+        monkeypatch.setattr(Config, 'SYMBOL', SYMBOL)
+        monkeypatch.setattr(Config, 'REST_URL', rest.url)
+        monkeypatch.setattr(Config, 'WS_URL', stream.url)
+        yield df, open_time, clock, stream
+    drop_engines(SYMBOL)
+
+
+def _set_pos(db_path, pos):
+    conn = init_db(db_path)
+    try:
+        set_order_state(conn, pos)
+    finally:
+        conn.close()
+
+
+def _apply(state, delta):
+    for key, value in delta.items():
+        if isinstance(value, dict) and isinstance(state.get(key), dict):
+            _apply(state[key], value)
+        else:
+            state[key] = value
+
+
+def test_snapshot_then_deltas(market, tmp_path):
+    df, open_time, clock, stream = market
+    db_path = str(tmp_path / 'dash.db')
+    _set_pos(db_path, 'LONG')
+
+    def publish(i):
+        clock.set(open_time[i] + 60_000)
+        row = df.iloc[i]
+        stream.publish(SYMBOL, '1m', open_time[i], row['open'], row['high'], row['low'], row['close'],
+                       row['volume'])
+
+    async def scenario():
+        ingestor = KlineIngestor(Config, limit=10)
+        hub = server.DashboardHub(ingestor, db_path, push_interval=0.01)
+        async with serve(hub.handler, '127.0.0.1', 0, process_request=hub.process_request,
+                         compression=None) as ws_server:
+            port = ws_server.sockets[0].getsockname()[1]
+            tasks = [asyncio.ensure_future(ingestor.run()), asyncio.ensure_future(hub.publish_loop())]
+            try:
+                assert await asyncio.to_thread(stream.connected.wait, 10), "ingestor não conectou"
+                async with connect(f"ws://127.0.0.1:{port}/ws") as ws:
+                    snap = json.loads(await ws.recv())
+                    assert snap['type'] == 'snapshot'
+                    assert all(snap['history'][name] for name in Config.TIMEFRAMES)
+                    state, seq, deltas = snap['data'], snap['seq'], 0
+
+                    for i in range(BACKFILL, BACKFILL + LIVE):
+                        if i == BACKFILL + LIVE // 2:
+                            await asyncio.to_thread(_set_pos, db_path, 'SHORT')
+                        await asyncio.to_thread(publish, i)
+                    # Até o servidor ficar quieto: cada delta vem com o seq seguinte
+                    while True:
+                        try:
+                            msg = json.loads(await asyncio.wait_for(ws.recv(), 1.0))
+                        except asyncio.TimeoutError:
+                            break
+                        assert msg['type'] == 'delta' and msg['seq'] == seq + 1
+                        seq, deltas = msg['seq'], deltas + 1
+                        _apply(state, msg['data'])
+                return hub, ingestor, state, seq, deltas
+            finally:
+                await ingestor.stop()
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    hub, ingestor, state, seq, deltas = asyncio.run(scenario())
+    assert deltas > 0 and seq == hub.seq
+    assert state == hub.state  # snapshot + deltas = estado do servidor
+    assert state['tf']['fast']['t'] == open_time[-1] // 1000
+    assert state['pos'] == 'SHORT'  # lido do banco a cada fechamento
+
+    # Sinal pela StrategyRuntime = caminho com DataFrames da strategy.py
+    frames = ingestor.frames()
+    args = (frames['fast'], frames['medium'], frames['slow'], Config)
+    (ok_l, msg_l), (ok_s, msg_s) = check_long_entry(*args), check_short_entry(*args)
+    assert state['signal'] == (msg_l if ok_l else msg_s if ok_s else f"L {msg_l} | S {msg_s}")
@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from benchmarks import random_walk
+from config import Config
+from resampler import TimeframeSet
+from strategy import StrategyRuntime, check_long_entry, check_short_entry
+
+CHECKS = {'LONG': check_long_entry, 'SHORT': check_short_entry}
+
+
+@pytest.fixture(scope='module')
+def ticks():
+    """(linhas, frames) a cada fechamento de 1m, com 5m/1h em formação"""
+    df = random_walk(2400, seed=3)
+    timeframes = TimeframeSet('TEST', Config).seed(df.iloc[:1800])
+    out = []
+    for row in df.iloc[1800:].itertuples(index=False):
+        open_time = int(row.timestamp.value // 1_000_000)
+        timeframes.update(open_time, *row[1:])
+        frames = timeframes.frames()
+        out.append((timeframes.rows(), [frames[n] for n in ('fast', 'medium', 'slow')]))
+    return out
+
+
+@pytest.mark.parametrize('side', CHECKS)
+def test_runtime_matches_check_entry(ticks, side):
+    runtime = StrategyRuntime(Config)
+    for rows, frames in ticks:
+        assert runtime.check(side, rows, 'TEST') == CHECKS[side](*frames, Config)
+
+
+def _rows(close_1h, minute=30):
+    """Entrada mínima: 1h em formação (aberta às 10:00) com ``close_1h``"""
+    t = pd.Timestamp('2024-01-01 10:00')
+    fast = [{'timestamp': t + pd.Timedelta(minutes=minute - 2 + i), 'close': 100.0, 'EMA_6': 100.0,
+             'volume': 1.0 + i} for i in range(3)]
+    medium = [{'timestamp': t + pd.Timedelta(minutes=25), 'close': 100.0, 'EMA_6': 99.0, 'RSI': 50.0,
+               'BBP': 0.5}]
+    slow = [{'timestamp': t - pd.Timedelta(hours=1), 'close': 90.0, 'EMA_99': 95.0, 'MACD_hist': 0.0},
+            {'timestamp': t, 'close': close_1h, 'EMA_99': 95.0, 'MACD_hist': 1.0}]
+    return {'fast': fast, 'medium': medium, 'slow': slow}
+
+
+def test_forming_bar_is_reevaluated():
+    runtime = StrategyRuntime(Config)
+    now_ms = pd.Timestamp('2024-01-01 10:31').value // 1_000_000
+    assert runtime.check('LONG', _rows(90.0), 'X', now_ms=now_ms) == (False, "❌ Sem trend 1h")
+    # Mesma vela de 1h (mesmo open_time), outro close: o filtro de tendência roda de novo
+    assert runtime.check('LONG', _rows(100.0), 'X', now_ms=now_ms)[0]
+
+
+def test_closed_bar_is_cached_by_open_time():
+    runtime = StrategyRuntime(Config)
+    now_ms = pd.Timestamp('2024-01-01 11:00').value // 1_000_000  # 1h das 10:00 já fechou
+    rows = _rows(100.0, minute=59)
+    assert runtime.check('LONG', rows, 'X', now_ms=now_ms)[0]
+    hits = runtime.hits
+    assert runtime.check('LONG', rows, 'X', now_ms=now_ms)[0]
+    assert runtime.hits > hits
+    runtime.forget('X')
+    assert not runtime.cache
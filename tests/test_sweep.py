@@ -0,0 +1,24 @@
+import pytest
+
+from backtest import run_backtest
+from benchmarks import random_walk
+from config import Config
+from sweep import DEFAULT_GRID, expand_grid, parse_grid, run_sweep
+
+
+def test_parse_grid_only_sweeps_given_params():
+    assert parse_grid(None) == DEFAULT_GRID
+    grid = parse_grid(['RSI_OVERSOLD=30,35', 'BB_STD=2,2.5'])
+    assert grid == {'RSI_OVERSOLD': [30, 35], 'BB_STD': [2.0, 2.5]}
+    assert len(expand_grid(grid)) == 4
+
+
+def test_sweep_holds_other_params_at_config():
+    candles = random_walk(6000, seed=3)
+    table = run_sweep(candles, parse_grid(['RSI_OVERSOLD=30,35']), workers=1, warmup=30)
+    assert sorted(table['RSI_OVERSOLD']) == [30, 35]
+    assert set(table.columns) == {'RSI_OVERSOLD', 'trades', 'win_rate', 'total_return', 'max_drawdown'}
+    row = table[table['RSI_OVERSOLD'] == Config.RSI_OVERSOLD].iloc[0]
+    _, stats = run_backtest(candles, Config, warmup=30)
+    for key, value in stats.items():
+        assert row[key] == pytest.approx(value), key
@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+import telegram_alerts
+from stubs import TelegramStub
+from telegram_alerts import MAX_MESSAGE_CHARS, AlertDispatcher
+
+
+@pytest.fixture
+def telegram():
+    with TelegramStub() as stub:
+        yield stub
+
+
+@pytest.fixture
+def dispatcher(telegram):
+    created = []
+
+    def make(**kwargs):
+        kwargs = {'token': 'test', 'chat_id': 'chat', 'base_url': telegram.url,
+                  'rate': 1000, 'burst': 1000, **kwargs}
+        created.append(AlertDispatcher(**kwargs))
+        return created[-1]
+    yield make
+    for d in created:
+        d.close()
+
+
+def _texts(stub):
+    return [t for m in stub.messages for t in m['text'].split('\n\n')]
+
+
+def test_delivers_in_order(telegram, dispatcher):
+    d = dispatcher()
+    for i in range(5):
+        assert d.send(f"alerta {i}", parse_mode='HTML')
+    assert d.flush(timeout=5)
+    assert _texts(telegram) == [f"alerta {i}" for i in range(5)]
+    assert all(m['parse_mode'] == 'HTML' and m['chat_id'] == 'chat' for m in telegram.messages)
+    assert d.stats['messages'] == 5 and d.stats['failed'] == 0
+
+
+def test_rate_limit_per_chat(telegram, dispatcher):
+    d = dispatcher(rate=10, burst=2)
+    started = time.monotonic()
+    for i in range(6):
+        d.send(f"alerta {i}")
+        d.flush(timeout=5)  # um envio por alerta: só o limite segura
+    elapsed = time.monotonic() - started
+    assert len(telegram.messages) == 6
+    assert elapsed >= (6 - 2) / 10 * 0.8
+
+
+def test_coalesces_while_rate_limited(telegram, dispatcher):
+    d = dispatcher(rate=2, burst=1)
+    for i in range(10):
+        d.send(f"alerta {i}")
+    assert d.flush(timeout=5)
+    assert len(telegram.messages) < 10
+    assert _texts(telegram) == [f"alerta {i}" for i in range(10)]
+    assert d.stats['sent'] == len(telegram.messages) and d.stats['messages'] == 10
+
+
+def test_retry_after_on_429(telegram, dispatcher):
+    telegram.fail_next(429, retry_after=0.3)
+    d = dispatcher()
+    started = time.monotonic()
+    d.send("alerta")
+    assert d.flush(timeout=5)
+    assert time.monotonic() - started >= 0.3
+    assert len(telegram.requests) == 2 and _texts(telegram) == ["alerta"]
+    assert d.stats['retries'] == 1
+
+
+def test_client_error_is_not_retried(telegram, dispatcher):
+    telegram.fail_next(400)
+    d = dispatcher()
+    d.send("alerta")
+    assert d.flush(timeout=5)
+    assert len(telegram.requests) == 1 and not telegram.messages
+    assert d.stats['failed'] == 1
+
+
+def test_batches_split_between_messages(telegram, dispatcher):
+    d = dispatcher(rate=2, burst=1)
+    texts = [f"<b>{i}</b> " + 'x' * 1500 for i in range(6)]
+    for text in texts:
+        d.send(text, parse_mode='HTML')
+    assert d.flush(timeout=10)
+    assert all(len(m['text']) <= MAX_MESSAGE_CHARS for m in telegram.messages)
+    assert _texts(telegram) == texts
+
+
+def test_oversized_message_is_not_cut(telegram, dispatcher):
+    d = dispatcher()
+    text = '<b>' + 'x' * MAX_MESSAGE_CHARS + '</b>'
+    d.send(text, parse_mode='HTML')
+    assert d.flush(timeout=5)
+    assert [m['text'] for m in telegram.messages] == [text]
+
+
+@pytest.mark.parametrize('sizes, count', [
+    ([10], 1),
+    ([MAX_MESSAGE_CHARS + 1, 10], 1),
+    ([1999, 1999], 2),   # 1999 + 2 + 1999 = 4000
+    ([1999, 2000], 1),
+    ([], 0),
+])
+def test_chunk(sizes, count):
+    assert telegram_alerts._chunk(['x' * n for n in sizes]) == count